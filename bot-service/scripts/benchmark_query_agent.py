@@ -0,0 +1,65 @@
+"""
+Compare LLM turns and latency of the query agent with and without the spending snapshot.
+
+Usage (from bot-service/, with the usual environment variables set):
+    python -m scripts.benchmark_query_agent --telegram-id 123456789
+"""
+import argparse
+from src.analytics import expense_analytics
+from src.database import db
+from src.metrics import metrics
+from src.query_agent import QueryAgent
+
+
+DEFAULT_QUESTIONS = [
+    "Where does most of my money go?",
+    "Did I spend more on food this week or on transportation?",
+    "What was my most expensive purchase recently?",
+    "¿En qué categoría gasté más este mes?",
+    "How much did I spend on food in the last 90 days compared to the last 30?",
+    "Give me a short summary of my spending",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--telegram-id", required=True, help="Whitelisted telegram_id to query as")
+    parser.add_argument("--question", action="append", help="Question to ask (repeatable)")
+    args = parser.parse_args()
+
+    user_id = db.get_user_id(args.telegram_id)
+    if not user_id:
+        raise SystemExit(f"User {args.telegram_id} not found")
+
+    questions = args.question or DEFAULT_QUESTIONS
+    metrics.reset()
+
+    for snapshot_mode in (False, True):
+        agent = QueryAgent(db, snapshot_mode=snapshot_mode, analytics=expense_analytics)
+        for question in questions:
+            agent.query(user_id, question)
+
+    summaries = metrics.snapshot()["summaries"]
+    print(f"\n{'mode':<10} {'queries':>8} {'avg turns':>10} {'max turns':>10} {'avg ms':>10}")
+    for mode in ("tools", "snapshot", "fast_path"):
+        turns = summaries.get(f"query_llm_turns{{mode={mode}}}")
+        latency = summaries.get(f"query_latency_ms{{mode={mode}}}")
+        if not turns:
+            continue
+        print(
+            f"{mode:<10} {turns['count']:>8} {turns['avg']:>10.2f} "
+            f"{turns['max']:>10.0f} {latency['avg']:>10.0f}"
+        )
+
+    counters = metrics.snapshot()["counters"]
+    prompt_tokens = counters.get("llm_prompt_tokens{call_site=query_agent}", 0)
+    completion_tokens = counters.get("llm_completion_tokens{call_site=query_agent}", 0)
+    calls = counters.get("llm_calls{call_site=query_agent}", 0)
+    print(f"\nquery_agent tokens: {prompt_tokens:.0f} prompt / {completion_tokens:.0f} completion over {calls:.0f} calls")
+    if calls and not prompt_tokens:
+        # The agent streams its LLM calls, which report no usage: TokenUsageCallback must count them
+        raise SystemExit("query_agent LLM calls reported no tokens")
+
+
+if __name__ == "__main__":
+    main()
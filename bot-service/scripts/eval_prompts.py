@@ -0,0 +1,93 @@
+"""
+Offline eval of the router and expense parser prompts: full vs compact mode.
+
+Runs every message of a labeled corpus through both prompt modes (LLM only, no
+fast paths) and reports accuracy and token usage.
+
+Usage (from bot-service/, with OPENAI_API_KEY set):
+    python -m scripts.eval_prompts [--corpus scripts/eval_corpus.jsonl]
+
+Corpus format (JSON lines):
+    {"message": "...", "type": "expense|query|other", "category": "Food", "amount": 20}
+"""
+import argparse
+import json
+import os
+from src.expense_parser import ExpenseParser
+from src.message_router import MessageRouter
+from src.metrics import metrics
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "eval_corpus.jsonl")
+
+
+def evaluate(corpus, compact: bool) -> dict:
+    """Evaluate one prompt mode on the corpus."""
+    router = MessageRouter(compact=compact)
+    parser = ExpenseParser(compact=compact)
+    results = {"type": 0, "expenses": 0, "category": 0, "amount": 0, "errors": []}
+
+    for example in corpus:
+        try:
+            message_type = router._invoke(example["message"], None).get("message_type")
+        except Exception as e:
+            message_type = f"error: {e}"
+        if message_type == example["type"]:
+            results["type"] += 1
+        else:
+            results["errors"].append(f"type    {example['message']!r}: {message_type} != {example['type']}")
+
+        if example["type"] != "expense":
+            continue
+        results["expenses"] += 1
+        info = parser.parse_message(example["message"])
+        if info and info.category == example["category"]:
+            results["category"] += 1
+        else:
+            got = info.category if info else None
+            results["errors"].append(f"category {example['message']!r}: {got} != {example['category']}")
+        if info and abs(info.amount - example["amount"]) < 0.005:
+            results["amount"] += 1
+        else:
+            got = info.amount if info else None
+            results["errors"].append(f"amount  {example['message']!r}: {got} != {example['amount']}")
+
+    counters = metrics.snapshot()["counters"]
+    for call_site in ("router", "expense_parser"):
+        results[f"{call_site}_prompt_tokens"] = counters.get(f"llm_prompt_tokens{{call_site={call_site}}}", 0)
+        results[f"{call_site}_completion_tokens"] = counters.get(f"llm_completion_tokens{{call_site={call_site}}}", 0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--verbose", action="store_true", help="Print every mismatch")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for compact in (False, True):
+        metrics.reset()
+        mode = "compact" if compact else "full"
+        results = evaluate(corpus, compact)
+        rows.append((mode, results))
+        if args.verbose:
+            for error in results["errors"]:
+                print(f"[{mode}] {error}")
+
+    total = len(corpus)
+    print(f"\n{'mode':<8} {'type acc':>9} {'cat acc':>8} {'amt acc':>8} {'router tok (p/c)':>17} {'parser tok (p/c)':>17}")
+    for mode, r in rows:
+        expenses = max(r["expenses"], 1)
+        print(
+            f"{mode:<8} {r['type'] / total:>9.1%} {r['category'] / expenses:>8.1%} {r['amount'] / expenses:>8.1%} "
+            f"{r['router_prompt_tokens']:>9.0f}/{r['router_completion_tokens']:<7.0f} "
+            f"{r['expense_parser_prompt_tokens']:>9.0f}/{r['expense_parser_completion_tokens']:<7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
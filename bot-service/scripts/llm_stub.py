@@ -0,0 +1,147 @@
+"""
+OpenAI-compatible stub that serves LLM responses recorded by traffic capture.
+
+Point the local bot-service at it with OPENAI_API_BASE so replays are
+deterministic and cost nothing. Each chat completion request is matched by
+llm_call_key (static system prompt, last user message, assistant turn) within
+the captured request named by its X-Replay-Id header (which a bot-service in
+TRAFFIC_REPLAY_MODE forwards), so every replayed request gets its own recorded
+responses even when several users sent the same message. Without a match there,
+calls with the same key in the whole capture are served their recorded
+responses in order ("unscoped", possibly another user's). Unmatched calls get
+a 500, which the bot-service handles like an LLM outage.
+
+Usage (from bot-service/):
+    python -m scripts.llm_stub capture.jsonl [--port 8099] [--latency 1.0]
+    OPENAI_API_BASE=http://localhost:8099/v1 TRAFFIC_REPLAY_MODE=true python -m src.main
+
+GET /stats returns the hit (scoped and unscoped) and miss counts.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.traffic_format import llm_call_key
+
+
+def load_responses(paths: List[str]) -> Tuple[Dict[str, List[Dict]], Dict[Tuple[str, str], List[Dict]]]:
+    """Recorded LLM calls in capture order, by key and by (record ID, key)."""
+    responses: Dict[str, List[Dict]] = defaultdict(list)
+    scoped: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    for call in record["llm_calls"]:
+                        responses[call["key"]].append(call)
+                        scoped[(record["id"], call["key"])].append(call)
+    return responses, scoped
+
+
+def stream_chunks(completion: Dict, message: Dict, finish_reason: str):
+    """Server-sent events of a streamed completion: the whole message as one delta, then the finish reason."""
+    delta = dict(message)
+    if delta.get("tool_calls"):
+        delta["tool_calls"] = [{**call, "index": i} for i, call in enumerate(delta["tool_calls"])]
+    for choice in (
+        {"index": 0, "delta": delta, "finish_reason": None},
+        {"index": 0, "delta": {}, "finish_reason": finish_reason},
+    ):
+        chunk = {**completion, "object": "chat.completion.chunk", "choices": [choice]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(
+    responses: Dict[str, List[Dict]],
+    scoped: Dict[Tuple[str, str], List[Dict]],
+    latency_factor: float
+) -> FastAPI:
+    """Build the stub app."""
+    app = FastAPI(title="LLM stub")
+    served: Dict[object, int] = defaultdict(int)
+    stats = {"hits": 0, "unscoped_hits": 0, "misses": 0}
+    lock = threading.Lock()
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        key = llm_call_key([(message["role"], message.get("content") or "") for message in body["messages"]])
+        served_key = (request.headers.get("X-Replay-Id"), key)
+        with lock:
+            calls = scoped.get(served_key)
+            if not calls:
+                served_key = key
+                calls = responses.get(key)
+            if not calls:
+                stats["misses"] += 1
+            else:
+                stats["hits"] += 1
+                if served_key == key:
+                    stats["unscoped_hits"] += 1
+                call = calls[served[served_key] % len(calls)]
+                served[served_key] += 1
+        if not calls:
+            print(f"[LLM_STUB] No recorded response for key {key[:12]}")
+            return JSONResponse(status_code=500, content={"error": {"message": "No recorded response", "type": "stub"}})
+
+        if latency_factor > 0:
+            await asyncio.sleep(call["latency_ms"] / 1000 * latency_factor)
+        message = call["message"]
+        finish_reason = "stop"
+        if message.get("tool_calls"):
+            finish_reason = "tool_calls"
+        elif message.get("function_call"):
+            finish_reason = "function_call"
+        completion = {
+            "id": f"chatcmpl-stub-{key[:12]}",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+        }
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(completion, message, finish_reason), media_type="text/event-stream")
+
+        usage = call.get("usage") or {}
+        return {
+            **completion,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", nargs="+", help="Traffic capture JSONL file(s)")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="Sleep this factor times each call's recorded latency (0 = answer immediately)"
+    )
+    args = parser.parse_args()
+
+    responses, scoped = load_responses(args.capture)
+    print(f"[LLM_STUB] Loaded {sum(len(calls) for calls in responses.values())} recorded calls ({len(responses)} keys)")
+    uvicorn.run(create_app(responses, scoped, args.latency), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
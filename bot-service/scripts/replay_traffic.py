@@ -0,0 +1,271 @@
+"""
+Replay captured /process-message traffic against a local bot-service and report regressions.
+
+Start the LLM stub (scripts/llm_stub.py) with the same capture and a local
+bot-service with OPENAI_API_BASE pointing at the stub and TRAFFIC_REPLAY_MODE=true,
+on a database seeded like the one the capture was taken from. The captured
+messages are then sent at their original pace (or --speed times faster; 0
+sends them one after another without waiting), with the captured users mapped
+onto local whitelisted Telegram IDs. Each message carries its capture ID
+(X-Replay-Id), which the bot-service forwards to the stub so its LLM calls get
+the responses recorded for that message.
+
+Reports latency distributions, database query and LLM call counts (from the
+X-DB-Queries / X-LLM-Calls headers) and the messages whose status or
+response changed, compared with the capture.
+
+Only the user's pseudonym is captured, not their data, so answers built from
+the database without an LLM call (fast-path queries, history-based expenses)
+depend on what the local users have stored, and several captured users mapped
+onto one local user share their data and rate limit. Changes in those
+messages are reported as non-comparable, apart from the comparable ones that
+--fail-on-diff checks. Give one --telegram-id per captured user to map them 1:1.
+
+--fresh-db deletes the expenses of the local users first and sends each user's
+messages in capture order, waiting for the previous one, so queries see
+exactly the expenses replayed before them. It needs one --telegram-id per
+captured user, the database settings of the bot-service, and a freshly
+started bot-service (its per-user category history is cached in memory).
+
+Usage (from bot-service/):
+    python -m scripts.replay_traffic capture.jsonl --telegram-id 123456789 [--speed 10]
+        [--url http://localhost:8000] [--stub-url http://localhost:8099] [--report replay.json]
+        [--fresh-db] [--fail-on-diff]
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+import httpx
+import numpy as np
+from src.traffic_format import scrub
+
+
+def load_capture(path: str, limit: Optional[int] = None) -> List[Dict]:
+    """Captured records in time order."""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record["time"])
+    return records[:limit] if limit else records
+
+
+def map_users(records: List[Dict], telegram_ids: List[str]) -> Dict[str, str]:
+    """Map captured pseudonymous users onto local Telegram IDs, round-robin by first appearance."""
+    mapping: Dict[str, str] = {}
+    for record in records:
+        if record["user"] not in mapping:
+            mapping[record["user"]] = telegram_ids[len(mapping) % len(telegram_ids)]
+    return mapping
+
+
+def shared_users(users: Dict[str, str]) -> Set[str]:
+    """Captured users mapped onto a local user together with another one."""
+    counts: Dict[str, int] = defaultdict(int)
+    for telegram_id in users.values():
+        counts[telegram_id] += 1
+    return {user for user, telegram_id in users.items() if counts[telegram_id] > 1}
+
+
+def comparable(record: Dict, shared: Set[str]) -> bool:
+    """Whether a replayed response can be compared with the capture (see the module docstring)."""
+    return record["user"] not in shared and len(record["llm_calls"]) > 0
+
+
+def _int_header(response: httpx.Response, name: str) -> Optional[int]:
+    value = response.headers.get(name)
+    return int(value) if value is not None else None
+
+
+async def send(client: httpx.AsyncClient, url: str, record: Dict, telegram_id: str, is_comparable: bool) -> Dict:
+    """Send one captured message and compare the outcome with the capture."""
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{url}/process-message",
+            json={"telegram_id": telegram_id, "message": record["message"]},
+            headers={"X-Replay-Id": record["id"]}
+        )
+        status = response.status_code
+        body = response.json()
+        text = body.get("message") if status < 400 else body.get("detail")
+    except httpx.HTTPError as e:
+        response, status, text = None, None, f"{type(e).__name__}: {e}"
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    text = scrub(text if isinstance(text, str) else json.dumps(text))
+    return {
+        "id": record["id"],
+        "message": record["message"],
+        "original_status": record["status"],
+        "status": status,
+        "original_response": record["response"],
+        "response": text,
+        "original_latency_ms": record["latency_ms"],
+        "latency_ms": round(latency_ms, 1),
+        "original_db_queries": record["db_queries"],
+        "db_queries": _int_header(response, "X-DB-Queries") if response is not None else None,
+        "original_llm_calls": len(record["llm_calls"]),
+        "llm_calls": _int_header(response, "X-LLM-Calls") if response is not None else None,
+        "changed": status != record["status"] or text != record["response"],
+        "comparable": is_comparable,
+    }
+
+
+async def replay(
+    records: List[Dict],
+    users: Dict[str, str],
+    url: str,
+    speed: float,
+    in_order: bool = False
+) -> List[Dict]:
+    """
+    Re-drive the captured stream at the original pace divided by speed (0 = sequentially).
+
+    With in_order, a user's message is not sent before the previous one was answered.
+    """
+    shared = shared_users(users)
+    async with httpx.AsyncClient(timeout=60) as client:
+
+        async def send_record(record: Dict) -> Dict:
+            return await send(client, url, record, users[record["user"]], comparable(record, shared))
+
+        if speed <= 0:
+            return [await send_record(record) for record in records]
+
+        first = records[0]["time"]
+        started = time.monotonic()
+
+        async def scheduled(record: Dict) -> Dict:
+            await asyncio.sleep(max(0.0, (record["time"] - first) / speed - (time.monotonic() - started)))
+            return await send_record(record)
+
+        if not in_order:
+            return await asyncio.gather(*(scheduled(record) for record in records))
+
+        by_user: Dict[str, List[Dict]] = defaultdict(list)
+        for record in records:
+            by_user[record["user"]].append(record)
+
+        async def user_stream(user_records: List[Dict]) -> List[Dict]:
+            return [await scheduled(record) for record in user_records]
+
+        streams = await asyncio.gather(*(user_stream(user_records) for user_records in by_user.values()))
+        order = {record["id"]: i for i, record in enumerate(records)}
+        return sorted((result for stream in streams for result in stream), key=lambda r: order[r["id"]])
+
+
+def latency_row(label: str, values: List[float]) -> str:
+    """One row of the latency table."""
+    if not values:
+        return f"{label:<10} {'-':>8}"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return (
+        f"{label:<10} {len(values):>8} {np.mean(values):>9.0f} {p50:>9.0f} "
+        f"{p90:>9.0f} {p99:>9.0f} {max(values):>9.0f}"
+    )
+
+
+def print_report(results: List[Dict], max_diffs: int) -> None:
+    """Print latencies, DB query and LLM call counts and output diffs."""
+    print(f"\n{'latency':<10} {'requests':>8} {'mean ms':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    print(latency_row("original", [r["original_latency_ms"] for r in results]))
+    print(latency_row("replay", [r["latency_ms"] for r in results if r["status"] is not None]))
+
+    measured = [r for r in results if r["db_queries"] is not None]
+    if measured:
+        for name in ("db_queries", "llm_calls"):
+            original = sum(r[f"original_{name}"] for r in measured)
+            replayed = sum(r[name] for r in measured)
+            more = sum(1 for r in measured if r[name] > r[f"original_{name}"])
+            fewer = sum(1 for r in measured if r[name] < r[f"original_{name}"])
+            print(
+                f"\n{name}: {original} -> {replayed} over {len(measured)} requests "
+                f"({more} with more, {fewer} with fewer)"
+            )
+    else:
+        print("\nNo X-DB-Queries headers: run the bot-service with TRAFFIC_REPLAY_MODE=true to count queries")
+
+    changed = [r for r in results if r["changed"] and r["comparable"]]
+    non_comparable = sum(1 for r in results if r["changed"] and not r["comparable"])
+    print(
+        f"\n{len(changed)}/{len(results)} messages with a different status or response "
+        f"(+{non_comparable} non-comparable: answered from local data or from a shared local user)"
+    )
+    for r in changed[:max_diffs]:
+        print(f"\n[{r['id']}] {r['message']!r}: status {r['original_status']} -> {r['status']}")
+        diff = difflib.unified_diff(
+            (r["original_response"] or "").splitlines(),
+            (r["response"] or "").splitlines(),
+            "captured", "replay", lineterm=""
+        )
+        for line in list(diff)[2:]:
+            print(f"    {line}")
+
+
+def clear_local_users(telegram_ids: List[str]) -> None:
+    """Delete the expenses of the local users (--fresh-db)."""
+    # Only this mode needs the database settings
+    from src.database import db
+    for telegram_id in telegram_ids:
+        user_id = db.get_user_id(telegram_id)
+        if not user_id:
+            raise SystemExit(f"User {telegram_id} not found")
+        print(f"Deleted {db.clear_user_expenses(user_id)} expenses of {telegram_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Traffic capture JSONL file")
+    parser.add_argument("--url", default="http://localhost:8000", help="Local bot-service URL")
+    parser.add_argument(
+        "--telegram-id", action="append", required=True,
+        help="Whitelisted Telegram ID to replay as (repeatable; captured users are spread over them)"
+    )
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace multiplier (0 = sequential, no waits)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N messages")
+    parser.add_argument("--stub-url", help="LLM stub URL, to report its hits and misses")
+    parser.add_argument("--report", help="Write per-message results to this JSON file")
+    parser.add_argument("--max-diffs", type=int, default=20, help="Output diffs to print")
+    parser.add_argument(
+        "--fresh-db", action="store_true",
+        help="Delete the local users' expenses first and send each user's messages in order (one --telegram-id per user)"
+    )
+    parser.add_argument("--fail-on-diff", action="store_true", help="Exit with status 1 if any comparable output changed")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture, args.limit)
+    if not records:
+        raise SystemExit("Empty capture")
+    users = map_users(records, args.telegram_id)
+    shared = shared_users(users)
+    if args.fresh_db:
+        if shared:
+            raise SystemExit(f"--fresh-db needs one --telegram-id per captured user ({len(users)})")
+        clear_local_users(sorted(set(users.values())))
+    elif shared:
+        print(f"{len(shared)} captured users share a local user: their changes are non-comparable")
+    pace = "sequentially" if args.speed <= 0 else f"at {args.speed:g}x speed"
+    print(f"Replaying {len(records)} messages from {len(users)} users {pace}")
+
+    results = asyncio.run(replay(records, users, args.url, args.speed, in_order=args.fresh_db))
+    print_report(results, args.max_diffs)
+
+    if args.stub_url:
+        stats = httpx.get(f"{args.stub_url}/stats").json()
+        print(
+            f"\nLLM stub: {stats['hits']} recorded responses served ({stats['unscoped_hits']} not recorded "
+            f"for the replayed message), {stats['misses']} misses"
+        )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Per-message results written to {args.report}")
+    if args.fail_on_diff and any(r["changed"] and r["comparable"] for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
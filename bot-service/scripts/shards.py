@@ -0,0 +1,68 @@
+"""
+Shard administration: cross-shard stats, moving users and rebalancing.
+
+Usage (from bot-service/, with DATABASE_SHARD_URLS set):
+    python -m scripts.shards stats [--days 30]
+    python -m scripts.shards move --telegram-id 123456789 --shard 1
+    python -m scripts.shards rebalance [--dry-run]
+"""
+import argparse
+import json
+from src.database import db
+
+
+def cmd_stats(args):
+    print(json.dumps(db.get_admin_summary(args.days), indent=2, default=str))
+
+
+def cmd_move(args):
+    user_id = args.user_id or db.get_user_id(args.telegram_id)
+    if not user_id:
+        raise SystemExit("User not found")
+    moved = db.move_user_to_shard(user_id, args.shard, settle_seconds=args.settle_seconds)
+    print(f"Moved {moved} rows")
+
+
+def cmd_rebalance(args):
+    misplaced = db.get_misplaced_users()
+    print(f"{len(misplaced)} user(s) not on their consistent-hash shard")
+    for user_id, current_shard, ring_shard in misplaced:
+        print(f"- user {user_id}: shard {current_shard} -> {ring_shard}")
+        if not args.dry_run:
+            db.move_user_to_shard(user_id, ring_shard, settle_seconds=args.settle_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stats = subparsers.add_parser("stats", help="Spending aggregated across all shards")
+    stats.add_argument("--days", type=int, default=30)
+    stats.set_defaults(func=cmd_stats)
+
+    settle_help = (
+        "Seconds to wait after switching the directory before deleting the old rows "
+        "(default: DIRECTORY_CACHE_TTL_SECONDS, so running workers see the move)"
+    )
+
+    move = subparsers.add_parser("move", help="Move one user to another shard")
+    user = move.add_mutually_exclusive_group(required=True)
+    user.add_argument("--user-id", type=int)
+    user.add_argument("--telegram-id")
+    move.add_argument("--shard", type=int, required=True)
+    move.add_argument("--settle-seconds", type=float, default=db.settings.directory_cache_ttl_seconds, help=settle_help)
+    move.set_defaults(func=cmd_move)
+
+    rebalance = subparsers.add_parser("rebalance", help="Move users to their consistent-hash shard (after adding shards)")
+    rebalance.add_argument("--dry-run", action="store_true")
+    rebalance.add_argument("--settle-seconds", type=float, default=db.settings.directory_cache_ttl_seconds, help=settle_help)
+    rebalance.set_defaults(func=cmd_rebalance)
+
+    args = parser.parse_args()
+    if not db.shards.enabled:
+        raise SystemExit("DATABASE_SHARD_URLS is not set")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Admission control: in-flight limits, per-user rate limits and request deadlines."""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from src.config import get_settings
+from src.metrics import metrics
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed because the worker is at capacity."""
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request runs past the deadline set by the caller.
+
+    Raised by AdmissionController.run, `work` is the future of the work, which
+    keeps running until its next LLM call or tool and may still succeed.
+    """
+
+    def __init__(self, *args, work: Optional[asyncio.Future] = None):
+        super().__init__(*args)
+        self.work = work
+
+
+class LLMUnavailable(Exception):
+    """Raised in strict mode when an LLM call fails, so the message can be retried later."""
+
+
+# Monotonic deadline of the request being processed (None = no deadline)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded if the current request is past its deadline."""
+    remaining = remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded()
+
+
+class DeadlineCallback(BaseCallbackHandler):
+    """Stops chains and agents before each LLM call or tool run once the deadline has passed."""
+
+    raise_error = True
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        check_deadline()
+
+    def on_tool_start(self, serialized, input_str, **kwargs: Any) -> None:
+        check_deadline()
+
+
+class RateLimiter:
+    """Per-user token buckets: `per_minute` messages on average, bursts of up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: int, max_users: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: int) -> float:
+        """
+        Take one token from a user's bucket.
+
+        Returns:
+            0 if allowed, otherwise the seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(user_id, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / self.rate
+            self._buckets[user_id] = (tokens, now)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class Ticket:
+    """An admitted request; holds one in-flight slot until released."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.kind: Optional[str] = None
+        self.released = False
+
+    def promote(self, kind: str) -> None:
+        """Declare the request's kind once classified; queries may be shed here."""
+        self.controller._promote(self, kind)
+
+    def release(self) -> None:
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Bounds the requests processed concurrently by this worker.
+
+    Every request takes one of `max_in_flight` slots before it is classified.
+    Queries are further limited to `max_in_flight_queries`, so the remaining
+    slots stay available for expense writes when queries pile up. Requests
+    that find no slot are shed immediately instead of queueing.
+
+    The work runs on a dedicated thread pool sized to the limit, and a slot is
+    only freed when its thread finishes, also when the caller already gave up.
+    """
+
+    def __init__(self, max_in_flight: int, max_in_flight_queries: int):
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_queries = min(max_in_flight_queries, max_in_flight)
+        self.in_flight = 0
+        self.in_flight_queries = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="request")
+
+    def admit(self) -> Ticket:
+        """
+        Take an in-flight slot.
+
+        Raises:
+            Overloaded: If all slots are taken
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                metrics.increment("requests_shed", reason="in_flight")
+                raise Overloaded()
+            self.in_flight += 1
+        return Ticket(self)
+
+    def _promote(self, ticket: Ticket, kind: str) -> None:
+        with self._lock:
+            if kind == "query":
+                if self.in_flight_queries >= self.max_in_flight_queries:
+                    metrics.increment("requests_shed", reason="queries_in_flight")
+                    raise Overloaded()
+                self.in_flight_queries += 1
+            ticket.kind = kind
+
+    def _release(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.in_flight -= 1
+            if ticket.kind == "query":
+                self.in_flight_queries -= 1
+
+    async def run(self, ticket: Ticket, deadline: Optional[float], func: Callable, *args) -> Any:
+        """
+        Run func(ticket, *args) on the request pool under a deadline, releasing the ticket when it finishes.
+
+        Args:
+            ticket: Ticket from admit()
+            deadline: Monotonic deadline, or None
+            func: Blocking function to run
+
+        Raises:
+            DeadlineExceeded: If the deadline passes first (the work stops at its next LLM
+                call or tool; await the exception's `work` for its outcome)
+        """
+        context = contextvars.copy_context()
+        context.run(_deadline.set, deadline)
+
+        def work():
+            try:
+                return context.run(func, ticket, *args)
+            finally:
+                ticket.release()
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, work)
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            metrics.increment("requests_shed", reason="deadline")
+            raise DeadlineExceeded(work=future)
+
+    def status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "in_flight_queries": self.in_flight_queries,
+            "max_in_flight": self.max_in_flight,
+            "max_in_flight_queries": self.max_in_flight_queries,
+        }
+
+
+def deadline_from_timeout_header(value: Optional[str]) -> float:
+    """
+    Monotonic deadline from an X-Request-Timeout-Ms header (the caller's remaining budget).
+
+    Without a valid header the deadline is REQUEST_TIMEOUT_SECONDS from now; the
+    header can only shorten it.
+    """
+    timeout = get_settings().request_timeout_seconds
+    try:
+        if value is not None:
+            timeout = min(timeout, max(float(value) / 1000, 0))
+    except ValueError:
+        pass
+    return time.monotonic() + timeout
+
+
+# Singleton instances
+_settings = get_settings()
+admission_controller = AdmissionController(
+    _settings.admission_max_in_flight,
+    _settings.admission_max_in_flight_queries
+)
+rate_limiter = RateLimiter(_settings.rate_limit_per_minute, _settings.rate_limit_burst)
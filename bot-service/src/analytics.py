@@ -0,0 +1,297 @@
+"""Per-user columnar expense analytics (NumPy): trends, averages, percentiles and outliers."""
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.database import Database
+from src.config import get_settings
+from src.metrics import metrics
+
+
+EPOCH = date(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+# Modified z-score (0.6745 * deviation / MAD) above which an expense is unusual
+OUTLIER_THRESHOLD = 3.5
+OUTLIER_MIN_HISTORY = 5
+
+
+def day_index(day: date) -> int:
+    """Days since the epoch."""
+    return (day - EPOCH).days
+
+
+class UserSeries:
+    """
+    One user's expenses as parallel arrays: timestamps (epoch seconds), amounts and category codes.
+
+    Arrays grow by doubling so new expenses are appended in place; readers take
+    a consistent view with columns().
+    """
+
+    def __init__(self, version: int, capacity: int = 64, history_start: Optional[int] = None):
+        self.version = version
+        # First fully loaded day (day index); None if the whole history is loaded
+        self.history_start = history_start
+        self.size = 0
+        self.categories: List[str] = []
+        self.descriptions: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._amounts = np.empty(capacity, dtype=np.float64)
+        self._category_codes = np.empty(capacity, dtype=np.int16)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, version: int, rows: List[Tuple], history_start: Optional[int] = None) -> "UserSeries":
+        """Build a series from Database.get_expense_series rows (chronological)."""
+        series = cls(version, capacity=max(64, len(rows) * 2), history_start=history_start)
+        for timestamp, amount, category, description in rows:
+            series._append(timestamp, amount, category, description)
+        return series
+
+    def code(self, category: Optional[str]) -> Optional[int]:
+        """Code of a category (case-insensitive), -1 if the user never used it, None for all categories."""
+        if category is None:
+            return None
+        with self._lock:
+            for name, code in self._codes.items():
+                if name.lower() == category.lower():
+                    return code
+        return -1
+
+    def append(self, version: int, timestamp: int, amount: float, category: str, description: str) -> bool:
+        """
+        Append one expense (newer than the others) saved as data version `version`.
+
+        Returns:
+            False if the series does not hold exactly the data before it (already
+            reloaded with the expense, or missing another one), in which case it
+            is left as is
+        """
+        with self._lock:
+            if self.version != version - 1:
+                return False
+            self._append(timestamp, amount, category, description)
+            self.version = version
+            return True
+
+    def _append(self, timestamp: int, amount: float, category: str, description: str) -> None:
+        if self.size == len(self._timestamps):
+            capacity = 2 * len(self._timestamps)
+            self._timestamps = np.resize(self._timestamps, capacity)
+            self._amounts = np.resize(self._amounts, capacity)
+            self._category_codes = np.resize(self._category_codes, capacity)
+        if category not in self._codes:
+            self._codes[category] = len(self.categories)
+            self.categories.append(category)
+        self._timestamps[self.size] = timestamp
+        self._amounts[self.size] = amount
+        self._category_codes[self.size] = self._codes[category]
+        self.descriptions.append(description)
+        self.size += 1
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(days since the epoch, amounts, category codes) of all expenses."""
+        with self._lock:
+            size = self.size
+            return (
+                self._timestamps[:size] // SECONDS_PER_DAY,
+                self._amounts[:size],
+                self._category_codes[:size],
+            )
+
+    def daily_totals(self, first_day: int, days: int, category: Optional[str] = None) -> np.ndarray:
+        """Total spent on each of `days` days starting at first_day (day indexes)."""
+        day, amounts, codes = self.columns()
+        mask = (day >= first_day) & (day < first_day + days)
+        code = self.code(category)
+        if code is not None:
+            mask &= codes == code
+        return np.bincount(day[mask] - first_day, weights=amounts[mask], minlength=days)[:days]
+
+    def trend(self, today: date, category: Optional[str] = None, days: int = 30, periods: int = 3) -> Optional[Dict]:
+        """
+        Compare the last `days` days with the `periods` windows of the same length before them.
+
+        Only windows entirely within the user's history (from the first expense,
+        and within the loaded history) count as usual spending: a partly covered
+        window would count days before the user started as days without spending.
+
+        Returns:
+            Dict with current/usual totals and daily averages, the change, per-window
+            totals (oldest first) and the 7-day rolling average; None without history
+        """
+        day, _, _ = self.columns()
+        if not len(day):
+            return None
+        end = day_index(today)
+        first_day = end - days * (periods + 1) + 1
+        daily = self.daily_totals(first_day, days * (periods + 1), category)
+        windows = daily.reshape(periods + 1, days).sum(axis=1)
+        covered_from = day.min() if self.history_start is None else max(day.min(), self.history_start)
+        window_starts = first_day + days * np.arange(periods + 1)
+        previous = windows[:-1][window_starts[:-1] >= covered_from]
+
+        current = float(windows[-1])
+        usual = float(previous.mean()) if len(previous) else None
+        rolling = np.convolve(daily[-days:], np.ones(7) / 7, mode="valid") if days >= 7 else daily[-days:]
+        return {
+            "days": days,
+            "current_total": current,
+            "current_daily_average": current / days,
+            "usual_total": usual,
+            "usual_daily_average": usual / days if usual is not None else None,
+            "change": current - usual if usual is not None else None,
+            "percent_change": (current - usual) / usual * 100 if usual else None,
+            "previous_totals": [float(total) for total in previous],
+            "rolling_7d_average": float(rolling[-1]),
+            "rolling_7d_max": float(rolling.max()),
+        }
+
+    def percentiles(self, today: date, category: Optional[str] = None, days: int = 90) -> Optional[Dict]:
+        """Distribution of individual expense amounts in the last `days` days (None if there are none)."""
+        day, amounts, codes = self.columns()
+        mask = day > day_index(today) - days
+        code = self.code(category)
+        if code is not None:
+            mask &= codes == code
+        selected = amounts[mask]
+        if not len(selected):
+            return None
+        p25, p50, p75, p90 = np.percentile(selected, [25, 50, 75, 90])
+        return {
+            "days": days,
+            "count": int(len(selected)),
+            "mean": float(selected.mean()),
+            "p25": float(p25),
+            "median": float(p50),
+            "p75": float(p75),
+            "p90": float(p90),
+            "max": float(selected.max()),
+        }
+
+    def outliers(self, today: date, category: Optional[str] = None, days: int = 30) -> List[Dict]:
+        """
+        Expenses of the last `days` days that are unusually large for their category.
+
+        Each category's amounts (over the whole loaded history) are scored with
+        the modified z-score, median and MAD based so the outliers themselves do
+        not hide each other. Categories with fewer than OUTLIER_MIN_HISTORY
+        expenses are skipped.
+
+        Returns:
+            List of dicts (largest score first) with description, amount,
+            category, date, the category's median and the score
+        """
+        day, amounts, codes = self.columns()
+        scores = np.zeros(len(amounts))
+        medians = np.zeros(len(amounts))
+        code = self.code(category)
+        for current in np.unique(codes) if code is None else [code]:
+            mask = codes == current
+            values = amounts[mask]
+            if len(values) < OUTLIER_MIN_HISTORY:
+                continue
+            median = np.median(values)
+            deviation = np.median(np.abs(values - median))
+            if deviation == 0:
+                # More than half the amounts are equal: score (x - median) / (1.2533 * mean absolute deviation)
+                deviation = 0.6745 * 1.2533 * np.mean(np.abs(values - median))
+            if deviation == 0:
+                continue
+            scores[mask] = 0.6745 * (values - median) / deviation
+            medians[mask] = median
+
+        flagged = np.flatnonzero((scores > OUTLIER_THRESHOLD) & (day > day_index(today) - days))
+        flagged = flagged[np.argsort(-scores[flagged])]
+        return [
+            {
+                "description": self.descriptions[i],
+                "amount": float(amounts[i]),
+                "category": self.categories[codes[i]],
+                "date": EPOCH + timedelta(days=int(day[i])),
+                "median": float(medians[i]),
+                "score": float(scores[i]),
+            }
+            for i in flagged
+        ]
+
+
+class ExpenseAnalytics:
+    """
+    Keeps users' expense histories in memory as UserSeries for vectorized analytics.
+
+    Series are loaded lazily (the last ANALYTICS_HISTORY_DAYS days), kept in an
+    LRU across users and appended to when an expense is added. A series is
+    reloaded when the user's data version moved past it, e.g. after another
+    worker saved an expense.
+    """
+
+    def __init__(self, database: Database):
+        """
+        Initialize the analytics engine.
+
+        Args:
+            database: Database instance for data operations
+        """
+        settings = get_settings()
+        self.db = database
+        self.history_days = settings.analytics_history_days
+        self.max_users = settings.analytics_max_users
+        self._series: "OrderedDict[int, UserSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def series(self, user_id: int) -> UserSeries:
+        """Get (loading or reloading if needed) a user's series."""
+        version = self.db.get_data_version(user_id)
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is not None and series.version == version:
+                self._series.move_to_end(user_id)
+                metrics.increment("analytics_series", outcome="hit")
+                return series
+
+        # The oldest loaded day is only partly loaded (the history starts N days before now)
+        history_start = day_index(date.today()) - self.history_days + 1
+        series = UserSeries.from_rows(*self.db.get_expense_series(user_id, self.history_days), history_start)
+        metrics.increment("analytics_series", outcome="load")
+
+        with self._lock:
+            self._series[user_id] = series
+            self._series.move_to_end(user_id)
+            while len(self._series) > self.max_users:
+                self._series.popitem(last=False)
+        return series
+
+    def record(self, user_id: int, version: int, amount: float, category: str, description: str) -> None:
+        """
+        Append a newly added expense to a user's series (if loaded).
+
+        Args:
+            version: Data version committed with the expense (Database.add_expense);
+                a series that does not end right before it is reloaded on next use
+        """
+        with self._lock:
+            series = self._series.get(user_id)
+        if series is not None:
+            timestamp = int((datetime.now() - datetime(1970, 1, 1)).total_seconds())
+            series.append(version, timestamp, amount, category, description)
+
+    def trend(self, user_id: int, category: Optional[str] = None, days: int = 30, periods: int = 3) -> Optional[Dict]:
+        """See UserSeries.trend."""
+        return self.series(user_id).trend(date.today(), category, days, periods)
+
+    def percentiles(self, user_id: int, category: Optional[str] = None, days: int = 90) -> Optional[Dict]:
+        """See UserSeries.percentiles."""
+        return self.series(user_id).percentiles(date.today(), category, days)
+
+    def outliers(self, user_id: int, category: Optional[str] = None, days: int = 30) -> List[Dict]:
+        """See UserSeries.outliers."""
+        return self.series(user_id).outliers(date.today(), category, days)
+
+
+# Singleton instance
+from src.database import db
+expense_analytics = ExpenseAnalytics(db)
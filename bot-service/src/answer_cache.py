@@ -0,0 +1,108 @@
+"""Versioned cache of query answers: repeated questions are answered without running the agent."""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+from src.database import Database
+from src.config import get_settings
+from src.metrics import metrics
+from src.query_intents import normalize_text
+
+
+# (user_id, normalized question, data version, date bucket)
+CacheKey = Tuple[int, str, int, date]
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache keyed by (user_id, normalized question, data version, day).
+
+    The data version is bumped in the same transaction as every added expense,
+    and the day covers relative periods ("this month", "last 7 days"), so an
+    entry is never served once the data or the date changes: stale entries are
+    simply no longer looked up and fall out of the in-memory LRU. The optional
+    shared tier (answer_cache table on the primary) is shared by all workers;
+    storing an answer there drops the user's entries for older versions or days.
+    """
+
+    def __init__(self, database: Database):
+        """
+        Initialize the answer cache.
+
+        Args:
+            database: Database instance for data operations
+        """
+        settings = get_settings()
+        self.db = database
+        self.enabled = settings.answer_cache_enabled
+        self.shared = settings.answer_cache_shared
+        self.max_entries = settings.answer_cache_max_entries
+        self._entries: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = {"memory": 0, "shared": 0}
+        self._misses = 0
+
+    def key(self, user_id: int, question: str, today: Optional[date] = None) -> CacheKey:
+        """Build the cache key of a question with the user's current data version."""
+        return (user_id, normalize_text(question), self.db.get_data_version(user_id), today or date.today())
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Look an answer up in memory, then in the shared tier."""
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is not None:
+                self._entries.move_to_end(key)
+                self._hits["memory"] += 1
+        if answer is not None:
+            metrics.increment("answer_cache", tier="memory", outcome="hit")
+            return answer
+
+        if self.shared:
+            try:
+                answer = self.db.get_cached_answer(*key)
+            except Exception as e:
+                print(f"Error reading shared answer cache: {e}")
+            if answer is not None:
+                self._remember(key, answer)
+                with self._lock:
+                    self._hits["shared"] += 1
+                metrics.increment("answer_cache", tier="shared", outcome="hit")
+                return answer
+
+        with self._lock:
+            self._misses += 1
+        metrics.increment("answer_cache", outcome="miss")
+        return None
+
+    def put(self, key: CacheKey, answer: str) -> None:
+        """Store an answer in both tiers."""
+        self._remember(key, answer)
+        if self.shared:
+            try:
+                self.db.put_cached_answer(*key, answer)
+            except Exception as e:
+                print(f"Error writing shared answer cache: {e}")
+
+    def _remember(self, key: CacheKey, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def status(self) -> Dict:
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self._hits["memory"],
+                "shared_hits": self._hits["shared"],
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Singleton instance
+from src.database import db
+answer_cache = AnswerCache(db)
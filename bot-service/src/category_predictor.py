@@ -0,0 +1,326 @@
+"""Per-user category prediction from expense history (no LLM)."""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from src.database import Database
+from src.config import get_settings
+from src.query_intents import CATEGORY_NAMES_ES, normalize_text
+
+
+STOPWORDS = {
+    "a", "an", "the", "to", "for", "on", "in", "at", "of", "and", "my", "with", "from", "paid", "bought",
+    "el", "la", "los", "las", "un", "una", "de", "del", "al", "en", "por", "para", "con", "y", "mi", "mis",
+    "pague", "compre", "gaste",
+}
+
+CURRENCY_WORDS = {
+    "usd", "dollar", "dollars", "buck", "bucks", "dolar", "dolares", "peso", "pesos",
+    "euro", "euros", "eur",
+}
+
+SPANISH_MARKERS = {
+    "el", "la", "los", "las", "del", "al", "de", "en", "por", "para", "con", "y", "mi",
+    "pague", "compre", "gaste", "dolar", "dolares", "peso", "pesos",
+}
+
+# Words next to a number that make it a count rather than an amount ("7 days", "x 2")
+COUNT_WORDS = {
+    "x", "day", "days", "week", "weeks", "month", "months", "year", "years", "hour", "hours",
+    "time", "times", "people", "person", "persons", "item", "items", "unit", "units", "pack", "packs",
+    "dia", "dias", "semana", "semanas", "mes", "meses", "ano", "anos", "hora", "horas",
+    "vez", "veces", "persona", "personas", "unidad", "unidades",
+}
+
+# Words that make a message something other than money spent
+NON_EXPENSE_WORDS = {
+    "refund", "refunded", "reimbursed", "reimbursement", "received", "got", "earned", "income",
+    "salary", "owe", "owes", "lent", "borrowed", "cancel", "cancelled", "canceled",
+    "reembolso", "devolucion", "devolvieron", "recibi", "cobre", "ingreso", "sueldo", "salario",
+    "debo", "presto", "preste", "cancelar", "cancele",
+}
+
+AMOUNT_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+PLAIN_AMOUNT_PATTERN = re.compile(r"^\d+(?:[.,]\d{1,2})?$")
+CURRENCY_SYMBOLS = "$€"
+YEAR_RANGE = range(1900, 2101)
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized word unigrams and bigrams, without stopwords, numbers and currency words."""
+    words = [
+        word for word in normalize_text(text).split()
+        if word not in STOPWORDS and word not in CURRENCY_WORDS and not word[0].isdigit()
+    ]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def detect_language(message: str) -> str:
+    """Language of a message: "es" if it looks Spanish, otherwise "en"."""
+    normalized_words = set(normalize_text(message).split())
+    spanish = bool(normalized_words & SPANISH_MARKERS) or any(ch in message.lower() for ch in "áéíóúñ¿¡")
+    return "es" if spanish else "en"
+
+
+def confirmation_message(category: str, language: str) -> str:
+    """Templated confirmation for a saved expense ("en" or "es")."""
+    if language == "es":
+        return f"Gasto de {CATEGORY_NAMES_ES.get(category, category)} agregado ✅"
+    return f"{category} expense added ✅"
+
+
+class CategoryPrediction(BaseModel):
+    """Predicted category for an expense description."""
+    category: str
+    confidence: float
+    support: int
+    coverage: float
+
+
+class QuickExpense(BaseModel):
+    """Expense extracted without the LLM."""
+    description: str
+    amount: float
+    category: str
+    confidence: float
+    confirmation_message: str
+
+
+class UserCategoryIndex:
+    """Token -> category counts for one user's past expenses (thread-safe)."""
+
+    def __init__(self):
+        self.token_categories: Dict[str, Counter] = defaultdict(Counter)
+        self.documents = 0
+        self._lock = threading.Lock()
+
+    def add(self, description: str, category: str) -> None:
+        """Add one (description, category) pair."""
+        tokens = set(tokenize(description))
+        with self._lock:
+            self.documents += 1
+            for token in tokens:
+                self.token_categories[token][category] += 1
+
+    def predict(self, text: str) -> Optional[CategoryPrediction]:
+        """
+        Predict a category with an IDF-weighted vote of the known tokens.
+
+        Confidence is the share of the vote won by the best category; support is
+        the number of past expenses that share a token with the text; coverage is
+        the fraction of the text's words seen before.
+        """
+        votes: Counter = Counter()
+        support = 0
+        tokens = set(tokenize(text))
+        words = [token for token in tokens if " " not in token]
+        known_words = 0
+        # learn() may be adding to the counters from another thread
+        with self._lock:
+            for token in tokens:
+                counts = self.token_categories.get(token)
+                if not counts:
+                    continue
+                if " " not in token:
+                    known_words += 1
+                occurrences = sum(counts.values())
+                weight = math.log(1 + self.documents / occurrences)
+                support = max(support, occurrences)
+                for category, count in counts.items():
+                    votes[category] += weight * count / occurrences
+
+        if not votes:
+            return None
+        category, score = votes.most_common(1)[0]
+        return CategoryPrediction(
+            category=category,
+            confidence=score / sum(votes.values()),
+            support=support,
+            coverage=known_words / len(words) if words else 0.0
+        )
+
+
+class CategoryPredictor:
+    """
+    Predicts expense categories from each user's own history.
+
+    Indexes are loaded lazily from the database, kept in an LRU across users and
+    updated incrementally when an expense is added. Each user's index is loaded
+    once at a time (concurrent requests wait for it), and expenses learned while
+    it loads are added once it is stored.
+    """
+
+    def __init__(self, database: Database):
+        """
+        Initialize the category predictor.
+
+        Args:
+            database: Database instance for data operations
+        """
+        settings = get_settings()
+        self.db = database
+        self.min_confidence = settings.category_prediction_min_confidence
+        self.min_support = settings.category_prediction_min_support
+        self.history_limit = settings.category_predictor_history_limit
+        self.max_users = settings.category_predictor_max_users
+        self._indexes: "OrderedDict[int, UserCategoryIndex]" = OrderedDict()
+        # user_id -> lock held while the user's index loads
+        self._load_locks: Dict[int, threading.Lock] = {}
+        # user_id -> (description, category) learned while the user's index loads
+        self._learned: Dict[int, List[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _cached_index(self, user_id: int) -> Optional[UserCategoryIndex]:
+        """A loaded index, marked as recently used (call with self._lock held)."""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+        return index
+
+    def _index(self, user_id: int) -> UserCategoryIndex:
+        """Get (loading if needed) a user's index."""
+        with self._lock:
+            index = self._cached_index(user_id)
+            if index is not None:
+                return index
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Loaded by the request we waited for
+                index = self._cached_index(user_id)
+                if index is not None:
+                    return index
+                self._learned[user_id] = []
+
+            try:
+                index = UserCategoryIndex()
+                for description, category in reversed(self.db.get_category_history(user_id, self.history_limit)):
+                    index.add(description, category)
+            except Exception:
+                with self._lock:
+                    self._learned.pop(user_id, None)
+                    self._load_locks.pop(user_id, None)
+                raise
+
+            with self._lock:
+                # May count an expense committed before the history query twice (a slightly stronger vote)
+                for description, category in self._learned.pop(user_id):
+                    index.add(description, category)
+                self._load_locks.pop(user_id, None)
+                self._indexes[user_id] = index
+                self._indexes.move_to_end(user_id)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def learn(self, user_id: int, description: str, category: str) -> None:
+        """Update a user's index with a newly added expense (if loaded or loading)."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                index.add(description, category)
+            elif user_id in self._learned:
+                self._learned[user_id].append((description, category))
+
+    def predict(self, user_id: int, text: str) -> Optional[CategoryPrediction]:
+        """
+        Predict the category of an expense description for a user.
+
+        Args:
+            user_id: The user's database ID
+            text: Expense description or raw message
+
+        Returns:
+            CategoryPrediction, or None if no past expense shares a token
+        """
+        return self._index(user_id).predict(text)
+
+    def confident_category(self, user_id: int, description: str) -> Optional[str]:
+        """Category the user's history predicts for a description, if confident enough to use."""
+        prediction = self.predict(user_id, description)
+        if (
+            not prediction
+            or prediction.confidence < self.min_confidence
+            or prediction.support < self.min_support
+        ):
+            return None
+        return prediction.category
+
+    def quick_parse(self, user_id: int, message: str) -> Optional[QuickExpense]:
+        """
+        Extract an expense without the LLM when the message is unambiguous.
+
+        The message must be "<description> <amount>" with exactly one plain
+        amount (e.g. "15", "15.50", "15,50"), optionally marked with a currency
+        symbol or word. The amount can only come first when it is marked
+        ("$15 pizza"), and is rejected when it looks like a year ("Netflix
+        2024") or a count ("uber 7 days"). Every word of the description must
+        appear in the user's history, which must predict its category with high
+        confidence; descriptions ending in a stopword ("pizza for 2") and
+        refunds or income are left to the LLM.
+
+        Args:
+            user_id: The user's database ID
+            message: The raw message
+
+        Returns:
+            QuickExpense, or None if the LLM should handle the message
+        """
+        if "?" in message:
+            return None
+        amounts = list(AMOUNT_PATTERN.finditer(message))
+        if len(amounts) != 1 or not PLAIN_AMOUNT_PATTERN.match(amounts[0].group()):
+            return None
+        match = amounts[0]
+        amount = float(match.group().replace(",", "."))
+        if amount <= 0 or ("." not in match.group() and "," not in match.group() and int(amount) in YEAR_RANGE):
+            return None
+
+        before = message[:match.start()]
+        after = message[match.end():]
+        before_words = normalize_text(before).split()
+        after_words = normalize_text(after).split()
+        marked = before.rstrip().endswith(tuple(CURRENCY_SYMBOLS)) or after.lstrip().startswith(tuple(CURRENCY_SYMBOLS))
+        if after_words and after_words[0] in CURRENCY_WORDS:
+            marked = True
+            after_words = after_words[1:]
+        if after_words and (not marked or after_words[0] in COUNT_WORDS):
+            # Only a currency-marked amount can come before the description
+            return None
+        if before_words and before_words[-1] in COUNT_WORDS:
+            return None
+
+        description = (before + " " + after).translate({ord(ch): " " for ch in CURRENCY_SYMBOLS})
+        words = [word for word in description.split() if normalize_text(word) not in CURRENCY_WORDS]
+        description = " ".join(words).strip(" -:,.")
+        normalized = normalize_text(description).split()
+        if (
+            not normalized
+            or normalized[-1] in STOPWORDS
+            or any(word in NON_EXPENSE_WORDS for word in normalized)
+        ):
+            return None
+
+        prediction = self.predict(user_id, description)
+        if (
+            not prediction
+            or prediction.confidence < self.min_confidence
+            or prediction.support < self.min_support
+            or prediction.coverage < 1.0
+        ):
+            return None
+
+        return QuickExpense(
+            description=description[0].upper() + description[1:],
+            amount=amount,
+            category=prediction.category,
+            confidence=prediction.confidence,
+            confirmation_message=confirmation_message(prediction.category, detect_language(message))
+        )
+
+# Singleton instance
+from src.database import db
+category_predictor = CategoryPredictor(db)
@@ -1,8 +1,26 @@
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import List, Dict, Optional
+from datetime import date, datetime
+from functools import partial
+from typing import Callable, List, Dict, Optional, Tuple
 from src.config import get_settings
+from src.metrics import metrics
+from src.replicas import ReplicaRouter
+from src.sharding import ShardRouter, TTLCache, NOT_WHITELISTED
+from src.query_counter import CountingConnection
+
+
+# Report period -> length (as a Postgres interval)
+REPORT_PERIODS = {"week": "1 week", "month": "1 month"}
+
+# Advisory lock class of a user's expenses on a shard: shared by writers,
+# exclusive while move_user_to_shard copies and deletes them
+USER_MOVE_LOCK = 4242
 
 
 class Database:
@@ -10,17 +28,36 @@ class Database:
     
     def __init__(self):
         self.settings = get_settings()
+        self.replicas = ReplicaRouter(
+            self.settings.replica_urls,
+            max_lag_seconds=self.settings.replica_max_lag_seconds,
+            retry_seconds=self.settings.replica_retry_seconds,
+            read_your_writes_seconds=self.settings.read_your_writes_seconds,
+            catchup_timeout_ms=self.settings.replica_catchup_timeout_ms
+        )
+        self.shards = ShardRouter(
+            self.settings.shard_urls,
+            pool_min_connections=self.settings.shard_pool_min_connections,
+            pool_max_connections=self.settings.shard_pool_max_connections,
+            directory_ttl_seconds=self.settings.directory_cache_ttl_seconds
+        )
+        # telegram_id -> user_id (or NOT_WHITELISTED)
+        self.user_cache = TTLCache(self.settings.directory_cache_ttl_seconds)
     
-    @contextmanager
-    def get_connection(self):
-        """Context manager for database connections."""
-        conn = psycopg2.connect(
+    def _connect_primary(self):
+        """Open a connection to the primary."""
+        return psycopg2.connect(
             host=self.settings.database_host,
             port=self.settings.database_port,
             database=self.settings.database_name,
             user=self.settings.database_user,
-            password=self.settings.database_password
+            password=self.settings.database_password,
+            connection_factory=CountingConnection
         )
+    
+    @contextmanager
+    def _managed(self, conn):
+        """Commit on success, rollback on error, always close."""
         try:
             yield conn
             conn.commit()
@@ -30,26 +67,85 @@ class Database:
         finally:
             conn.close()
     
+    @contextmanager
+    def get_connection(self):
+        """Context manager for database connections (primary)."""
+        with self._managed(self._connect_primary()) as conn:
+            yield conn
+    
+    @contextmanager
+    def get_read_connection(self, user_id: Optional[int] = None):
+        """
+        Context manager for read-only connections.
+        
+        Uses a healthy replica when configured, falling back to the primary.
+        If the user wrote recently, only a replica that has replayed that
+        write is used.
+        """
+        conn = self.replicas.connect(user_id) if self.replicas.enabled else None
+        if self.replicas.enabled:
+            metrics.increment("db_reads", target="replica" if conn else "primary")
+        if conn is None:
+            conn = self._connect_primary()
+        with self._managed(conn) as conn:
+            yield conn
+    
+    @contextmanager
+    def get_expense_connection(self, user_id: int, read_only: bool = False):
+        """
+        Context manager for connections to the database holding a user's expenses.
+        
+        With sharding enabled this is the user's shard; otherwise the primary
+        (or a replica for read-only access).
+        """
+        if self.shards.enabled:
+            shard_id = self.shards.resolve(user_id, self.get_connection)
+            with self.shards.connection(shard_id) as conn:
+                yield conn
+        elif read_only:
+            with self.get_read_connection(user_id) as conn:
+                yield conn
+        else:
+            with self.get_connection() as conn:
+                yield conn
+    
+    def _expense_databases(self) -> List[Tuple[str, Callable]]:
+        """(name, connection factory) of every database storing expenses."""
+        if self.shards.enabled:
+            return [
+                (f"shard_{shard_id}", partial(self.shards.connection, shard_id))
+                for shard_id in self.shards.shard_ids
+            ]
+        return [("primary", self.get_connection)]
+    
     def is_user_whitelisted(self, telegram_id: str) -> bool:
         """Check if a user is in the whitelist."""
-        with self.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT id FROM users WHERE telegram_id = %s",
-                    (telegram_id,)
-                )
-                return cursor.fetchone() is not None
+        return self.get_user_id(telegram_id) is not None
     
     def get_user_id(self, telegram_id: str) -> Optional[int]:
-        """Get user ID from telegram_id."""
-        with self.get_connection() as conn:
+        """Get user ID from telegram_id (cached)."""
+        cached = self.user_cache.get(telegram_id)
+        if cached is not None:
+            return None if cached == NOT_WHITELISTED else cached
+        
+        with self.get_read_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     "SELECT id FROM users WHERE telegram_id = %s",
                     (telegram_id,)
                 )
                 result = cursor.fetchone()
-                return result[0] if result else None
+        
+        if result:
+            self.user_cache.set(telegram_id, result[0])
+            return result[0]
+        # Unknown users are cached briefly so newly whitelisted users get in quickly
+        self.user_cache.set(
+            telegram_id,
+            NOT_WHITELISTED,
+            ttl_seconds=min(self.settings.directory_cache_ttl_seconds, 10)
+        )
+        return None
     
     def add_expense(
         self, 
@@ -57,22 +153,83 @@ class Database:
         description: str, 
         amount: float, 
         category: str
-    ) -> bool:
-        """Add an expense to the database."""
+    ) -> Optional[int]:
+        """
+        Add an expense to the database.
+
+        Returns:
+            The user's data version including the expense (see get_data_version),
+            or None if it could not be saved
+        """
         try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        INSERT INTO expenses (user_id, description, amount, category)
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (user_id, description, amount, category)
-                    )
-            return True
+            # A write racing a shard move is redirected to the user's new shard
+            for _ in range(3):
+                with self.get_expense_connection(user_id) as conn:
+                    with conn.cursor() as cursor:
+                        moved_to = self._fence_user_write(cursor, user_id)
+                        if moved_to is not None:
+                            self.shards.directory.set(user_id, moved_to)
+                            continue
+                        cursor.execute(
+                            """
+                            INSERT INTO expenses (user_id, description, amount, category)
+                            VALUES (%s, %s, %s, %s)
+                            """,
+                            (user_id, description, amount, category)
+                        )
+                        # Invalidates the user's cached answers (see get_data_version)
+                        cursor.execute(
+                            """
+                            INSERT INTO user_data_versions (user_id, version) VALUES (%s, 1)
+                            ON CONFLICT (user_id) DO UPDATE
+                            SET version = user_data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+                            RETURNING version
+                            """,
+                            (user_id,)
+                        )
+                        version = cursor.fetchone()[0]
+                    conn.commit()
+                    
+                    if self.replicas.enabled and not self.shards.enabled:
+                        # Read-your-writes: remember the WAL position after the commit
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT pg_current_wal_lsn()")
+                            self.replicas.record_write(user_id, cursor.fetchone()[0])
+                return version
+            raise RuntimeError(f"User {user_id} keeps moving between shards")
         except Exception as e:
             print(f"Error adding expense: {e}")
-            return False
+            return None
+    
+    def _fence_user_write(self, cursor, user_id: int) -> Optional[int]:
+        """
+        Fence a write to a user's expenses against move_user_to_shard (call first in the transaction).
+
+        Takes the user's move lock in shared mode, so a move waits for the write
+        to commit and the write waits for a move in progress.
+
+        Returns:
+            The shard the user moved to if the user no longer lives on this one
+        """
+        if not self.shards.enabled:
+            return None
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, %s)", (USER_MOVE_LOCK, user_id))
+        cursor.execute("SELECT shard_id FROM moved_users WHERE user_id = %s", (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+    
+    def get_data_version(self, user_id: int) -> int:
+        """
+        Get a user's data version, bumped in the same transaction as every added expense.
+
+        Returns:
+            The version (0 for users who never added an expense through the bot)
+        """
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT version FROM user_data_versions WHERE user_id = %s", (user_id,))
+                result = cursor.fetchone()
+        return result[0] if result else 0
     
     def get_total_by_category(
         self, 
@@ -91,7 +248,7 @@ class Database:
         Returns:
             Total amount spent
         """
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor() as cursor:
                 if category:
                     cursor.execute(
@@ -100,7 +257,8 @@ class Database:
                         FROM expenses
                         WHERE user_id = %s 
                           AND category = %s
-                          AND added_at >= NOW() - INTERVAL '%s days'
+                          AND added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                          AND added_at <= LOCALTIMESTAMP
                         """,
                         (user_id, category, days)
                     )
@@ -110,7 +268,8 @@ class Database:
                         SELECT COALESCE(SUM(CAST(amount AS NUMERIC)), 0) as total
                         FROM expenses
                         WHERE user_id = %s 
-                          AND added_at >= NOW() - INTERVAL '%s days'
+                          AND added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                          AND added_at <= LOCALTIMESTAMP
                         """,
                         (user_id, days)
                     )
@@ -128,7 +287,7 @@ class Database:
         Returns:
             List of {category, total, count} dicts
         """
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     """
@@ -138,7 +297,8 @@ class Database:
                         SUM(CAST(amount AS NUMERIC)) as total
                     FROM expenses
                     WHERE user_id = %s 
-                      AND added_at >= NOW() - INTERVAL '%s days'
+                      AND added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                      AND added_at <= LOCALTIMESTAMP
                     GROUP BY category
                     ORDER BY total DESC
                     """,
@@ -157,7 +317,7 @@ class Database:
         Returns:
             List of expense dicts
         """
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     """
@@ -182,7 +342,7 @@ class Database:
         Returns:
             List of matching expense dicts
         """
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     """
@@ -208,7 +368,7 @@ class Database:
         Returns:
             List of expense dicts for the specified category
         """
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     """
@@ -216,16 +376,638 @@ class Database:
                     FROM expenses
                     WHERE user_id = %s 
                       AND category = %s
-                      AND added_at >= NOW() - INTERVAL '%s days'
+                      AND added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                      AND added_at <= LOCALTIMESTAMP
                     ORDER BY added_at DESC
                     """,
                     (user_id, category, days)
                 )
                 return [dict(row) for row in cursor.fetchall()]
     
+    def get_category_history(self, user_id: int, limit: int = 500) -> List[Tuple[str, str]]:
+        """
+        Get the user's most recent (description, category) pairs.
+
+        Args:
+            user_id: User ID
+            limit: Maximum number of pairs to return
+
+        Returns:
+            List of (description, category) tuples, newest first
+        """
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT description, category
+                    FROM expenses
+                    WHERE user_id = %s
+                    ORDER BY added_at DESC
+                    LIMIT %s
+                    """,
+                    (user_id, limit)
+                )
+                return cursor.fetchall()
+
+    def get_expense_series(self, user_id: int, days: int = 365) -> Tuple[int, List[Tuple]]:
+        """
+        Get a user's expenses of the last N days in chronological order, with the data version they reflect.
+
+        Args:
+            user_id: User ID
+            days: Number of days to look back
+
+        Returns:
+            Tuple of (data version, list of (epoch seconds, amount, category, description))
+        """
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor() as cursor:
+                # Version first: a concurrent insert can only make the rows newer than it
+                cursor.execute("SELECT version FROM user_data_versions WHERE user_id = %s", (user_id,))
+                result = cursor.fetchone()
+                cursor.execute(
+                    """
+                    SELECT EXTRACT(EPOCH FROM added_at)::BIGINT, CAST(amount AS NUMERIC)::FLOAT8,
+                           category, description
+                    FROM expenses
+                    WHERE user_id = %s
+                      AND added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                    ORDER BY added_at
+                    """,
+                    (user_id, days)
+                )
+                return (result[0] if result else 0), cursor.fetchall()
+    
+    def get_spending_snapshot(self, user_id: int, recent_limit: int = 10) -> Dict:
+        """
+        Get a compact spending snapshot in a single round-trip.
+
+        Args:
+            user_id: User ID
+            recent_limit: Number of recent expenses to include
+
+        Returns:
+            Dict with 'categories' (per-category totals and counts for the
+            last 7/30/90 days, ordered by 30-day total) and 'recent'
+            (most recent expenses)
+        """
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    WITH windowed AS (
+                        SELECT category, CAST(amount AS NUMERIC) AS amount, added_at
+                        FROM expenses
+                        WHERE user_id = %s
+                          AND added_at >= LOCALTIMESTAMP - INTERVAL '90 days'
+                          AND added_at <= LOCALTIMESTAMP
+                    ),
+                    totals AS (
+                        SELECT
+                            category,
+                            COALESCE(SUM(amount) FILTER (WHERE added_at >= LOCALTIMESTAMP - INTERVAL '7 days'), 0) AS total_7d,
+                            COUNT(*) FILTER (WHERE added_at >= LOCALTIMESTAMP - INTERVAL '7 days') AS count_7d,
+                            COALESCE(SUM(amount) FILTER (WHERE added_at >= LOCALTIMESTAMP - INTERVAL '30 days'), 0) AS total_30d,
+                            COUNT(*) FILTER (WHERE added_at >= LOCALTIMESTAMP - INTERVAL '30 days') AS count_30d,
+                            SUM(amount) AS total_90d,
+                            COUNT(*) AS count_90d
+                        FROM windowed
+                        GROUP BY category
+                    ),
+                    recent AS (
+                        SELECT description, CAST(amount AS NUMERIC) AS amount, category, added_at
+                        FROM expenses
+                        WHERE user_id = %s
+                        ORDER BY added_at DESC
+                        LIMIT %s
+                    )
+                    SELECT
+                        (SELECT COALESCE(json_agg(t ORDER BY t.total_30d DESC, t.total_90d DESC), '[]'::json)
+                         FROM totals t) AS categories,
+                        (SELECT COALESCE(json_agg(r ORDER BY r.added_at DESC), '[]'::json)
+                         FROM recent r) AS recent
+                    """,
+                    (user_id, user_id, recent_limit)
+                )
+                return dict(cursor.fetchone())
+
+    def _expense_databases_for(self, user_ids: Optional[List[int]]) -> List[Tuple[Callable, Optional[List[int]]]]:
+        """(connection factory, user IDs) per database; all databases with None when user_ids is None."""
+        if user_ids is None:
+            return [(connection, None) for _, connection in self._expense_databases()]
+        if not self.shards.enabled:
+            return [(self.get_connection, list(user_ids))]
+        by_shard: Dict[int, List[int]] = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[self.shards.resolve(user_id, self.get_connection)].append(user_id)
+        return [
+            (partial(self.shards.connection, shard_id), shard_user_ids)
+            for shard_id, shard_user_ids in by_shard.items()
+        ]
+
+    def refresh_spending_reports(
+        self,
+        period: str,
+        period_start: date,
+        user_ids: Optional[List[int]] = None,
+        top_items: int = 5
+    ) -> int:
+        """
+        Recompute the weekly or monthly reports of one period in a single set-based statement per database.
+
+        Each report holds the period's total and expense count, the per-category
+        breakdown, the largest expenses and the previous period's total.
+
+        Args:
+            period: "week" or "month"
+            period_start: First day of the period
+            user_ids: Only refresh these users (all users with expenses in the period or the previous one when None)
+            top_items: Number of largest expenses to keep
+
+        Returns:
+            Number of reports written
+        """
+        params = {
+            "period": period,
+            "start": period_start,
+            "interval": REPORT_PERIODS[period],
+            "top_items": top_items,
+        }
+        written = 0
+        for connection, ids in self._expense_databases_for(user_ids):
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        WITH current_expenses AS (
+                            SELECT user_id, description, CAST(amount AS NUMERIC) AS amount, category, added_at
+                            FROM expenses
+                            WHERE added_at >= %(start)s::timestamp
+                              AND added_at < %(start)s::timestamp + %(interval)s::interval
+                              AND (%(user_ids)s::integer[] IS NULL OR user_id = ANY(%(user_ids)s::integer[]))
+                        ),
+                        totals AS (
+                            SELECT user_id, SUM(amount) AS total, COUNT(*) AS expense_count
+                            FROM current_expenses
+                            GROUP BY user_id
+                        ),
+                        categories AS (
+                            SELECT
+                                user_id,
+                                jsonb_agg(
+                                    jsonb_build_object('category', category, 'total', total, 'count', count)
+                                    ORDER BY total DESC
+                                ) AS categories
+                            FROM (
+                                SELECT user_id, category, SUM(amount) AS total, COUNT(*) AS count
+                                FROM current_expenses
+                                GROUP BY user_id, category
+                            ) per_category
+                            GROUP BY user_id
+                        ),
+                        top_items AS (
+                            SELECT
+                                user_id,
+                                jsonb_agg(
+                                    jsonb_build_object(
+                                        'description', description, 'amount', amount,
+                                        'category', category, 'added_at', added_at
+                                    )
+                                    ORDER BY amount DESC, added_at DESC
+                                ) AS top_items
+                            FROM (
+                                SELECT *, row_number() OVER (PARTITION BY user_id ORDER BY amount DESC, added_at DESC) AS rank
+                                FROM current_expenses
+                            ) ranked
+                            WHERE rank <= %(top_items)s
+                            GROUP BY user_id
+                        ),
+                        previous AS (
+                            SELECT user_id, SUM(CAST(amount AS NUMERIC)) AS total
+                            FROM expenses
+                            WHERE added_at >= %(start)s::timestamp - %(interval)s::interval
+                              AND added_at < %(start)s::timestamp
+                              AND (%(user_ids)s::integer[] IS NULL OR user_id = ANY(%(user_ids)s::integer[]))
+                            GROUP BY user_id
+                        )
+                        INSERT INTO spending_reports (
+                            user_id, period, period_start, period_end, total, expense_count,
+                            previous_total, categories, top_items, generated_at
+                        )
+                        SELECT
+                            user_id,
+                            %(period)s,
+                            %(start)s::date,
+                            (%(start)s::date + %(interval)s::interval - INTERVAL '1 day')::date,
+                            COALESCE(totals.total, 0),
+                            COALESCE(totals.expense_count, 0),
+                            COALESCE(previous.total, 0),
+                            COALESCE(categories.categories, '[]'::jsonb),
+                            COALESCE(top_items.top_items, '[]'::jsonb),
+                            CURRENT_TIMESTAMP
+                        FROM totals
+                        FULL JOIN previous USING (user_id)
+                        LEFT JOIN categories USING (user_id)
+                        LEFT JOIN top_items USING (user_id)
+                        ON CONFLICT (user_id, period, period_start) DO UPDATE SET
+                            period_end = EXCLUDED.period_end,
+                            total = EXCLUDED.total,
+                            expense_count = EXCLUDED.expense_count,
+                            previous_total = EXCLUDED.previous_total,
+                            categories = EXCLUDED.categories,
+                            top_items = EXCLUDED.top_items,
+                            generated_at = EXCLUDED.generated_at
+                        """,
+                        {**params, "user_ids": ids}
+                    )
+                    written += cursor.rowcount
+        return written
+
+    def get_spending_report(self, user_id: int, period: str, period_start: date) -> Optional[Dict]:
+        """
+        Get a user's precomputed report, regenerating it first if missing or older than the period's latest expense.
+
+        Args:
+            user_id: User ID
+            period: "week" or "month"
+            period_start: First day of the period
+
+        Returns:
+            Report dict (see refresh_spending_reports), or None if the user has
+            no expenses in the period nor the previous one
+        """
+        query = """
+            SELECT period, period_start, period_end, total, expense_count, previous_total,
+                   categories, top_items, generated_at
+            FROM spending_reports
+            WHERE user_id = %(user_id)s AND period = %(period)s AND period_start = %(start)s
+              AND generated_at >= COALESCE(
+                  (SELECT MAX(added_at) FROM expenses
+                   WHERE user_id = %(user_id)s
+                     AND added_at >= %(start)s::timestamp
+                     AND added_at < %(start)s::timestamp + %(interval)s::interval),
+                  '-infinity'
+              )
+        """
+        params = {"user_id": user_id, "period": period, "start": period_start, "interval": REPORT_PERIODS[period]}
+
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                report = cursor.fetchone()
+        if report:
+            return dict(report)
+
+        metrics.increment("spending_report_misses", period=period)
+        self.refresh_spending_reports(period, period_start, user_ids=[user_id])
+        with self.get_expense_connection(user_id) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                report = cursor.fetchone()
+        return dict(report) if report else None
+
+    def claim_unsent_reports(self, period: str, period_start: date) -> List[Dict]:
+        """
+        Mark the non-empty reports of a period that were not sent yet as sent, and return them.
+
+        Claiming before sending makes concurrent workers send each report at most once.
+
+        Returns:
+            Report dicts including user_id
+        """
+        claimed = []
+        for _, connection in self._expense_databases():
+            with connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE spending_reports
+                        SET sent_at = CURRENT_TIMESTAMP
+                        WHERE period = %s AND period_start = %s
+                          AND sent_at IS NULL AND expense_count > 0
+                        RETURNING user_id, period, period_start, period_end, total, expense_count,
+                                  previous_total, categories, top_items, generated_at
+                        """,
+                        (period, period_start)
+                    )
+                    claimed.extend(dict(row) for row in cursor.fetchall())
+        return claimed
+
+    def claim_report_push(self, period: str, period_start: date) -> bool:
+        """
+        Record a period as the last one whose reports were pushed (report_pushes).
+
+        The first call for a kind of period only records it, so a service that
+        starts mid-period doesn't push the period before.
+
+        Returns:
+            True if an earlier period was recorded, i.e. a boundary was crossed
+            since the last push and this caller should push this period's reports
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    WITH last_push AS (SELECT period_start FROM report_pushes WHERE period = %(period)s)
+                    INSERT INTO report_pushes (period, period_start) VALUES (%(period)s, %(start)s)
+                    ON CONFLICT (period) DO UPDATE
+                    SET period_start = EXCLUDED.period_start, pushed_at = CURRENT_TIMESTAMP
+                    WHERE report_pushes.period_start < EXCLUDED.period_start
+                    RETURNING (SELECT period_start FROM last_push)
+                    """,
+                    {"period": period, "start": period_start}
+                )
+                result = cursor.fetchone()
+        return result is not None and result[0] is not None
+
+    def get_current_date(self) -> date:
+        """Today on the database's clock (the date of LOCALTIMESTAMP, which expense timestamps use)."""
+        with self.get_read_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT CURRENT_DATE")
+                return cursor.fetchone()[0]
+
+    def get_telegram_ids(self, user_ids: List[int]) -> Dict[int, str]:
+        """Map user IDs to Telegram IDs."""
+        with self.get_read_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, telegram_id FROM users WHERE id = ANY(%s)",
+                    (list(user_ids),)
+                )
+                return dict(cursor.fetchall())
+
+    def enqueue_inbound_message(self, user_id: int, telegram_id: str, message: str, lease_seconds: float) -> int:
+        """
+        Persist an incoming message that is being processed right away (first attempt).
+
+        The row is leased for lease_seconds: if this worker dies before completing
+        or releasing it, queue workers pick it up once the lease expires.
+
+        Returns:
+            Inbound message ID
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO inbound_messages (user_id, telegram_id, message, status, attempts, locked_until)
+                    VALUES (%s, %s, %s, 'processing', 1, LOCALTIMESTAMP + make_interval(secs => %s))
+                    RETURNING id
+                    """,
+                    (user_id, telegram_id, message, lease_seconds)
+                )
+                return cursor.fetchone()[0]
+
+    def claim_inbound_messages(self, limit: int, lease_seconds: float) -> List[Dict]:
+        """
+        Lease up to N queued messages that are due (or whose lease expired).
+
+        Uses FOR UPDATE SKIP LOCKED, so concurrent workers never claim the same row.
+
+        Returns:
+            Claimed rows (id, user_id, telegram_id, message, attempts), oldest first
+        """
+        with self.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    UPDATE inbound_messages
+                    SET status = 'processing',
+                        attempts = attempts + 1,
+                        locked_until = LOCALTIMESTAMP + make_interval(secs => %s)
+                    WHERE id IN (
+                        SELECT id FROM inbound_messages
+                        WHERE (status = 'pending' AND available_at <= LOCALTIMESTAMP)
+                           OR (status = 'processing' AND locked_until < LOCALTIMESTAMP)
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, user_id, telegram_id, message, attempts
+                    """,
+                    (lease_seconds, limit)
+                )
+                return sorted((dict(row) for row in cursor.fetchall()), key=lambda row: row["id"])
+
+    def finish_inbound_message(
+        self,
+        message_id: int,
+        attempts: int,
+        status: str,
+        response: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Mark an inbound message as 'done' or 'failed'.
+
+        Only applies while the claim that made attempt number `attempts` still
+        holds it, so a worker whose lease expired cannot finish a message
+        another worker reclaimed.
+
+        Returns:
+            True if the message was updated
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE inbound_messages
+                    SET status = %s, response = %s, last_error = %s,
+                        locked_until = NULL, processed_at = LOCALTIMESTAMP
+                    WHERE id = %s AND status = 'processing' AND attempts = %s
+                    """,
+                    (status, response, error, message_id, attempts)
+                )
+                return cursor.rowcount == 1
+
+    def release_inbound_message(self, message_id: int, attempts: int, error: str, delay_seconds: float) -> bool:
+        """
+        Put an inbound message back in the queue, due again after delay_seconds.
+
+        Like finish_inbound_message, only applies to the claim of attempt `attempts`.
+
+        Returns:
+            True if the message was updated
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE inbound_messages
+                    SET status = 'pending', last_error = %s, locked_until = NULL,
+                        available_at = LOCALTIMESTAMP + make_interval(secs => %s)
+                    WHERE id = %s AND status = 'processing' AND attempts = %s
+                    """,
+                    (error, delay_seconds, message_id, attempts)
+                )
+                return cursor.rowcount == 1
+
+    def extend_inbound_lease(self, message_id: int, attempts: int, lease_seconds: float) -> bool:
+        """
+        Renew the lease of a claimed inbound message for another lease_seconds.
+
+        Returns:
+            False if the claim of attempt `attempts` no longer holds the message
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE inbound_messages
+                    SET locked_until = LOCALTIMESTAMP + make_interval(secs => %s)
+                    WHERE id = %s AND status = 'processing' AND attempts = %s
+                    """,
+                    (lease_seconds, message_id, attempts)
+                )
+                return cursor.rowcount == 1
+
+    def purge_inbound_messages(self, older_than_hours: int) -> int:
+        """Delete finished inbound messages older than N hours. Returns the number deleted."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM inbound_messages
+                    WHERE status IN ('done', 'failed')
+                      AND processed_at < LOCALTIMESTAMP - make_interval(hours => %s)
+                    """,
+                    (older_than_hours,)
+                )
+                return cursor.rowcount
+
+    def get_inbound_queue_stats(self) -> Dict[str, int]:
+        """Number of inbound messages per status."""
+        with self.get_read_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT status, COUNT(*) FROM inbound_messages GROUP BY status")
+                return dict(cursor.fetchall())
+
+    def get_cached_answer(self, user_id: int, question: str, data_version: int, bucket: date) -> Optional[str]:
+        """Get an answer from the shared answer cache."""
+        with self.get_read_connection(user_id) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT answer FROM answer_cache
+                    WHERE user_id = %s AND question = %s AND data_version = %s AND bucket = %s
+                    """,
+                    (user_id, question, data_version, bucket)
+                )
+                result = cursor.fetchone()
+        return result[0] if result else None
+
+    def put_cached_answer(self, user_id: int, question: str, data_version: int, bucket: date, answer: str) -> None:
+        """Store an answer in the shared answer cache, dropping the user's entries for older versions or days."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM answer_cache WHERE user_id = %s AND (data_version < %s OR bucket < %s)",
+                    (user_id, data_version, bucket)
+                )
+                cursor.execute(
+                    """
+                    INSERT INTO answer_cache (user_id, question, data_version, bucket, answer)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (user_id, question, data_version, bucket) DO UPDATE
+                    SET answer = EXCLUDED.answer, created_at = CURRENT_TIMESTAMP
+                    """,
+                    (user_id, question, data_version, bucket, answer)
+                )
+
+    def ensure_expense_partitions(self, months_ahead: int = 3) -> int:
+        """
+        Create the monthly expense partitions from the current month up to N months ahead.
+
+        Runs on every database storing expenses (each shard when sharding is enabled).
+
+        Args:
+            months_ahead: Number of future months to pre-create
+
+        Returns:
+            Number of partitions created
+        """
+        created = 0
+        for _, connection in self._expense_databases():
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT ensure_expense_partitions(%s)", (months_ahead,))
+                    created += cursor.fetchone()[0]
+        return created
+
+    def archive_expense_partitions(self, keep_months: int) -> List[str]:
+        """
+        Move monthly partitions older than N months from expenses to expenses_archive.
+
+        Archived partitions are frozen right away, so autovacuum skips them from then on.
+        Runs on every database storing expenses.
+
+        Args:
+            keep_months: Number of past months (besides the current one) to keep in expenses
+
+        Returns:
+            Names of the archived partitions (prefixed with the shard name when sharded)
+        """
+        archived_all = []
+        for name, connection in self._expense_databases():
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT archive_expense_partitions(%s)", (keep_months,))
+                    archived = [row[0] for row in cursor.fetchall()]
+                conn.commit()
+
+                if archived:
+                    # VACUUM cannot run inside a transaction block
+                    conn.autocommit = True
+                    try:
+                        with conn.cursor() as cursor:
+                            for partition in archived:
+                                cursor.execute(
+                                    sql.SQL("VACUUM (FREEZE, ANALYZE) {}").format(sql.Identifier(partition))
+                                )
+                    finally:
+                        conn.autocommit = False
+
+            if self.shards.enabled:
+                archived = [f"{name}.{partition}" for partition in archived]
+            archived_all.extend(archived)
+        return archived_all
+
+    def get_archived_expenses(
+        self,
+        user_id: int,
+        start: datetime,
+        end: datetime
+    ) -> List[Dict]:
+        """
+        Get archived expenses for a user in a date range (on-demand access to old data).
+
+        Args:
+            user_id: User ID
+            start: Range start (inclusive)
+            end: Range end (exclusive)
+
+        Returns:
+            List of expense dicts
+        """
+        with self.get_expense_connection(user_id, read_only=True) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT id, description, amount, category, added_at
+                    FROM expenses_archive
+                    WHERE user_id = %s
+                      AND added_at >= %s
+                      AND added_at < %s
+                    ORDER BY added_at DESC
+                    """,
+                    (user_id, start, end)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
     def get_user_expenses(self, user_id: int) -> List[Dict]:
         """Get all expenses for a user."""
-        with self.get_connection() as conn:
+        with self.get_expense_connection(user_id, read_only=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     """
@@ -238,6 +1020,282 @@ class Database:
                 )
                 return [dict(row) for row in cursor.fetchall()]
 
+    def get_admin_summary(self, days: int = 30) -> Dict:
+        """
+        Aggregate spending across all users (and all shards, queried in parallel).
+
+        Args:
+            days: Number of days to look back
+
+        Returns:
+            Dict with per-database totals and the merged per-category breakdown
+        """
+        def summarize(target: Tuple[str, Callable]) -> Tuple[str, List[Dict]]:
+            name, connection = target
+            with connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    cursor.execute(
+                        """
+                        SELECT
+                            category,
+                            COUNT(*) AS count,
+                            COUNT(DISTINCT user_id) AS users,
+                            SUM(CAST(amount AS NUMERIC)) AS total
+                        FROM expenses
+                        WHERE added_at >= LOCALTIMESTAMP - INTERVAL '%s days'
+                          AND added_at <= LOCALTIMESTAMP
+                        GROUP BY category
+                        """,
+                        (days,)
+                    )
+                    return name, [dict(row) for row in cursor.fetchall()]
+
+        targets = self._expense_databases()
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            results = list(executor.map(summarize, targets))
+
+        databases = []
+        categories: Dict[str, Dict] = {}
+        for name, rows in results:
+            databases.append({
+                "database": name,
+                "count": sum(row["count"] for row in rows),
+                "total": float(sum(row["total"] for row in rows)),
+            })
+            for row in rows:
+                merged = categories.setdefault(
+                    row["category"],
+                    {"category": row["category"], "count": 0, "users": 0, "total": 0.0}
+                )
+                merged["count"] += row["count"]
+                # Each user lives on exactly one shard, so per-shard user counts add up
+                merged["users"] += row["users"]
+                merged["total"] += float(row["total"])
+
+        return {
+            "days": days,
+            "databases": databases,
+            "categories": sorted(categories.values(), key=lambda c: c["total"], reverse=True),
+        }
+
+    def clear_user_expenses(self, user_id: int) -> int:
+        """
+        Delete all of a user's expenses and reports (replays from an empty history).
+
+        The data version is bumped so cached answers and analytics series of
+        the old data are not reused.
+
+        Returns:
+            Number of expenses deleted
+        """
+        with self.get_expense_connection(user_id) as conn:
+            with conn.cursor() as cursor:
+                if self._fence_user_write(cursor, user_id) is not None:
+                    raise RuntimeError(f"User {user_id} is moving to another shard")
+                cursor.execute("DELETE FROM expenses WHERE user_id = %s", (user_id,))
+                deleted = cursor.rowcount
+                cursor.execute("DELETE FROM expenses_archive WHERE user_id = %s", (user_id,))
+                deleted += cursor.rowcount
+                cursor.execute("DELETE FROM spending_reports WHERE user_id = %s", (user_id,))
+                cursor.execute(
+                    """
+                    INSERT INTO user_data_versions (user_id, version) VALUES (%s, 1)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET version = user_data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    (user_id,)
+                )
+        return deleted
+
+    def move_user_to_shard(self, user_id: int, target_shard: int, settle_seconds: Optional[float] = None) -> int:
+        """
+        Move a user's expenses to another shard.
+
+        Steps, under the user's move lock on the old shard (add_expense takes it
+        in shared mode, so no expense is written there meanwhile):
+        1. Copy the rows (archived ones included) to the target, into its
+           expenses_archive for months the target has archived and its live
+           expenses otherwise, replacing leftovers of a failed move
+        2. Record the move in the old shard's moved_users, which redirects the
+           writes of workers whose directory cache still points there
+        3. Switch the directory entry
+        4. Wait settle_seconds for other workers' directory caches to expire
+           (they still read the old shard), then delete the copied rows from the
+           old shard, failing if any other row of the user is left there
+
+        A failed move can be run again: it resumes after the copy if the move
+        was already recorded.
+
+        Args:
+            user_id: User ID
+            target_shard: Destination shard ID
+            settle_seconds: Wait before deleting the old rows (default: the
+                directory cache TTL)
+
+        Returns:
+            Number of rows moved
+        """
+        if not self.shards.enabled:
+            raise ValueError("Sharding is not enabled")
+        if target_shard not in self.shards.shard_ids:
+            raise ValueError(f"Unknown shard {target_shard}")
+        if settle_seconds is None:
+            settle_seconds = self.settings.directory_cache_ttl_seconds
+
+        self.shards.directory.delete(user_id)
+        source_shard = self.shards.resolve(user_id, self.get_connection)
+        if source_shard == target_shard:
+            return 0
+
+        def select_ids(cursor) -> List[int]:
+            cursor.execute(
+                """
+                SELECT id FROM expenses WHERE user_id = %s
+                UNION ALL
+                SELECT id FROM expenses_archive WHERE user_id = %s
+                """,
+                (user_id, user_id)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        with self.shards.connection(source_shard) as source:
+            with source.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (USER_MOVE_LOCK, user_id))
+                cursor.execute("SELECT shard_id FROM moved_users WHERE user_id = %s", (user_id,))
+                recorded = cursor.fetchone()
+                if recorded is not None and recorded[0] != target_shard:
+                    raise ValueError(f"User {user_id} is already moving to shard {recorded[0]}")
+
+                if recorded is None:
+                    cursor.execute(
+                        """
+                        SELECT id, user_id, description, CAST(amount AS NUMERIC), category, added_at
+                        FROM expenses WHERE user_id = %s
+                        UNION ALL
+                        SELECT id, user_id, description, CAST(amount AS NUMERIC), category, added_at
+                        FROM expenses_archive WHERE user_id = %s
+                        """,
+                        (user_id, user_id)
+                    )
+                    rows = cursor.fetchall()
+                    self._copy_user_rows(user_id, target_shard, rows)
+                    cursor.execute(
+                        "INSERT INTO moved_users (user_id, shard_id) VALUES (%s, %s)",
+                        (user_id, target_shard)
+                    )
+                    copied_ids = [row[0] for row in rows]
+                else:
+                    # Resumed: the copy committed and no row was written here since
+                    copied_ids = select_ids(cursor)
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE user_shards
+                    SET shard_id = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE user_id = %s
+                    """,
+                    (target_shard, user_id)
+                )
+        self.shards.directory.set(user_id, target_shard)
+
+        if settle_seconds > 0:
+            time.sleep(settle_seconds)
+
+        with self.shards.connection(source_shard) as source:
+            with source.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (USER_MOVE_LOCK, user_id))
+                cursor.execute("DELETE FROM expenses WHERE user_id = %s AND id = ANY(%s)", (user_id, copied_ids))
+                cursor.execute("DELETE FROM expenses_archive WHERE user_id = %s AND id = ANY(%s)", (user_id, copied_ids))
+                left = select_ids(cursor)
+                if left:
+                    raise RuntimeError(f"User {user_id} has {len(left)} uncopied row(s) on shard {source_shard}")
+                # Reports are regenerated on the target shard
+                cursor.execute("DELETE FROM spending_reports WHERE user_id = %s", (user_id,))
+                cursor.execute("DELETE FROM user_data_versions WHERE user_id = %s RETURNING version", (user_id,))
+                result = cursor.fetchone()
+
+        # The version continues past the source shard's so no cached answer is reused
+        with self.shards.connection(target_shard) as target:
+            with target.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO user_data_versions (user_id, version) VALUES (%s, %s)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET version = GREATEST(user_data_versions.version + 1, EXCLUDED.version),
+                        updated_at = CURRENT_TIMESTAMP
+                    """,
+                    (user_id, (result[0] if result else 0) + 1)
+                )
+
+        print(f"[SHARDS] Moved user {user_id} from shard {source_shard} to {target_shard} ({len(copied_ids)} rows)")
+        return len(copied_ids)
+
+    def _copy_user_rows(self, user_id: int, target_shard: int, rows: List[Tuple]) -> None:
+        """
+        Replace a user's rows on a shard (leftovers of a failed move) with copies of `rows`.
+
+        Each row goes where the shard keeps its month: expenses_archive if the
+        month's partition was archived there, otherwise expenses (creating the
+        partition, so no row lands in expenses_default).
+        """
+        months = sorted({row[5].replace(day=1).date() for row in rows})
+        with self.shards.connection(target_shard) as target:
+            with target.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (USER_MOVE_LOCK, user_id))
+                cursor.execute("DELETE FROM expenses WHERE user_id = %s", (user_id,))
+                cursor.execute("DELETE FROM expenses_archive WHERE user_id = %s", (user_id,))
+                # Moving back: writes are no longer redirected away from this shard
+                cursor.execute("DELETE FROM moved_users WHERE user_id = %s", (user_id,))
+                cursor.execute(
+                    """
+                    SELECT partition.relname
+                    FROM pg_inherits i
+                    JOIN pg_class partition ON partition.oid = i.inhrelid
+                    WHERE i.inhparent = 'expenses_archive'::regclass
+                      AND partition.relname = ANY(%s)
+                    """,
+                    ([f"expenses_{month:%Y_%m}" for month in months],)
+                )
+                archived = {name for name, in cursor.fetchall()}
+                rows_by_table: Dict[str, List[Tuple]] = defaultdict(list)
+                for row in rows:
+                    month = row[5].replace(day=1).date()
+                    rows_by_table["expenses_archive" if f"expenses_{month:%Y_%m}" in archived else "expenses"].append(row[1:])
+                for month in months:
+                    if f"expenses_{month:%Y_%m}" not in archived:
+                        cursor.execute("SELECT create_expense_partition(%s)", (month,))
+                for table, table_rows in rows_by_table.items():
+                    execute_values(
+                        cursor,
+                        sql.SQL(
+                            """
+                            INSERT INTO {} (user_id, description, amount, category, added_at)
+                            VALUES %s
+                            """
+                        ).format(sql.Identifier(table)).as_string(cursor),
+                        table_rows
+                    )
+
+    def get_misplaced_users(self) -> List[Tuple[int, int, int]]:
+        """
+        Users whose directory shard differs from their consistent-hash placement.
+
+        Returns:
+            List of (user_id, current_shard, ring_shard)
+        """
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT user_id, shard_id FROM user_shards ORDER BY user_id")
+                rows = cursor.fetchall()
+        misplaced = []
+        for user_id, shard_id in rows:
+            ring_shard = self.shards.ring.shard_for(user_id)
+            if ring_shard != shard_id:
+                misplaced.append((user_id, shard_id, ring_shard))
+        return misplaced
+
 
 # Singleton instance
 db = Database()
@@ -1,10 +1,17 @@
-from typing import Optional, Dict
+from typing import Literal, Optional, Dict
 import json
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.utils.function_calling import convert_to_openai_function
+from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
 from pydantic import BaseModel, Field
 from src.config import get_settings
+from src.metrics import metrics
+from src.llm_usage import TokenUsageCallback
+from src.traffic_capture import traffic_recorder
+from src.admission import DeadlineCallback, DeadlineExceeded, LLMUnavailable
+from src.category_predictor import category_predictor, confirmation_message, detect_language
 
 
 class ExpenseInfo(BaseModel):
@@ -16,6 +23,21 @@ class ExpenseInfo(BaseModel):
     confirmation_message: str
 
 
+class ExpenseExtraction(BaseModel):
+    """Record the analysis of a chat message sent to an expense tracker."""
+    is_expense: bool
+    description: str = ""
+    amount: float = 0
+    category: str = "Other"
+    language: Literal["en", "es"] = "en"
+
+
+COMPACT_SYSTEM_PROMPT = """Extract expenses from messages sent to an expense tracker.
+is_expense is true only when the message reports money spent with an amount; greetings, questions and other text are not expenses.
+description: brief, in the user's language ("Uber al trabajo $15" -> "Uber al trabajo"). language: en or es.
+Categories: {categories}"""
+
+
 class ExpenseParser:
     """Parse user messages to extract expense information using LLM."""
     
@@ -33,12 +55,21 @@ class ExpenseParser:
         "Other"
     ]
     
-    def __init__(self):
+    def __init__(self, compact: Optional[bool] = None):
+        """
+        Initialize the expense parser.
+        
+        Args:
+            compact: Use the trimmed prompt with function-calling output and
+                templated confirmations (defaults to the LLM_COMPACT_PROMPTS setting)
+        """
         settings = get_settings()
+        self.compact = settings.llm_compact_prompts if compact is None else compact
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            **traffic_recorder.llm_client_kwargs()
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -79,24 +110,92 @@ IMPORTANT:
 """),
             ("user", "{message}")
         ])
+        
+        self.compact_prompt = ChatPromptTemplate.from_messages([
+            ("system", COMPACT_SYSTEM_PROMPT),
+            ("user", "{message}")
+        ])
+        extraction_function = convert_to_openai_function(ExpenseExtraction)
+        self.compact_llm = self.llm.bind(
+            functions=[extraction_function],
+            function_call={"name": extraction_function["name"]}
+        )
     
-    def parse_message(self, message: str) -> Optional[ExpenseInfo]:
+    def _invoke(self, message: str, user_id: Optional[int]) -> Dict:
+        """Run the LLM extraction and return the parsed JSON."""
+        inputs = {
+            "message": message,
+            "categories": ", ".join(self.VALID_CATEGORIES)
+        }
+        config = {"callbacks": [TokenUsageCallback("expense_parser", user_id), DeadlineCallback()]}
+        if self.compact:
+            chain = self.compact_prompt | self.compact_llm | JsonOutputFunctionsParser()
+            response_data = chain.invoke(inputs, config=config)
+            category = response_data.get("category", "Other")
+            response_data["confirmation_message"] = confirmation_message(
+                category if category in self.VALID_CATEGORIES else "Other",
+                response_data.get("language", "en")
+            )
+            return response_data
+        
+        # Create chain with string output parser
+        chain = self.prompt | self.llm | StrOutputParser()
+        response_str = chain.invoke(inputs, config=config)
+        try:
+            return json.loads(response_str.strip())
+        except json.JSONDecodeError:
+            print(f"LLM response: {response_str}")
+            raise
+    
+    def _apply_history_category(self, expense_info: ExpenseInfo, user_id: int, message: str) -> None:
+        """Use the category the user's history predicts for the extracted description, if confident."""
+        try:
+            category = category_predictor.confident_category(user_id, expense_info.description)
+        except Exception as e:
+            print(f"Error predicting category from history: {e}")
+            return
+        metrics.increment("expense_category", source="history" if category else "llm")
+        if category and category != expense_info.category:
+            expense_info.category = category
+            expense_info.confirmation_message = confirmation_message(category, detect_language(message))
+    
+    def parse_message(
+        self,
+        message: str,
+        user_id: Optional[int] = None,
+        strict: bool = False
+    ) -> Optional[ExpenseInfo]:
         """
         Parse a user message to extract expense information.
         
+        When user_id is given, unambiguous "<description> <amount>" messages
+        whose category the user's own history predicts with high confidence are
+        parsed without the LLM, and the category of an expense the LLM
+        extracted follows the user's history when it is confident.
+        With strict, LLM errors raise LLMUnavailable instead of returning None.
+        
         Returns:
             ExpenseInfo if the message is about an expense, None otherwise
         """
+        if user_id is not None:
+            try:
+                quick = category_predictor.quick_parse(user_id, message)
+            except Exception as e:
+                print(f"Error predicting category from history: {e}")
+                quick = None
+            if quick:
+                metrics.increment("expense_parse", path="history")
+                return ExpenseInfo(
+                    is_expense=True,
+                    description=quick.description,
+                    amount=quick.amount,
+                    category=quick.category,
+                    confirmation_message=quick.confirmation_message
+                )
+        
+        metrics.increment("expense_parse", path="llm")
         try:
-            # Create chain with string output parser
-            chain = self.prompt | self.llm | StrOutputParser()
-            
-            response_str = chain.invoke({
-                "message": message,
-                "categories": ", ".join(self.VALID_CATEGORIES)
-            })
-
-            response_data = json.loads(response_str.strip())
+            response_data = self._invoke(message, user_id)
             
             if not response_data.get("is_expense", False):
                 return None
@@ -112,14 +211,20 @@ IMPORTANT:
             if expense_info.category not in self.VALID_CATEGORIES:
                 expense_info.category = "Other"
             
+            if user_id is not None:
+                self._apply_history_category(expense_info, user_id, message)
+            
             return expense_info
             
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON from LLM: {e}")
-            print(f"LLM response: {response_str if 'response_str' in locals() else 'N/A'}")
             return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error parsing message: {e}")
+            if strict:
+                raise LLMUnavailable(str(e)) from e
             return None
 
 
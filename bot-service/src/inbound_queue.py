@@ -0,0 +1,242 @@
+"""Durable inbound message queue: messages that could not be processed right away are retried in the background."""
+import asyncio
+import math
+import time
+from typing import Dict, Optional, Set
+from src.database import Database
+from src.config import get_settings
+from src.metrics import metrics
+from src.admission import AdmissionController, DeadlineExceeded, Overloaded, Ticket
+from src.services.message_service import MessageService
+from src.telegram import send_telegram_message, telegram_enabled
+
+
+# attempts of a message enqueued by /process-message (its inline attempt)
+INLINE_ATTEMPT = 1
+
+QUEUED_MESSAGE = "Got it! I'm a bit busy right now, I'll process your message and reply here shortly ⏳"
+FAILED_MESSAGE = "Sorry, I couldn't process your message \"{message}\". Please send it again."
+
+
+class InboundQueue:
+    """
+    Postgres-backed queue (inbound_messages) for incoming messages.
+
+    With the queue enabled, /process-message persists every message before
+    processing it inline. Messages whose inline attempt fails because the LLM
+    is unavailable, the worker is overloaded or the deadline passed stay in the
+    queue and the user gets an acknowledgement. Queue workers (one per service
+    worker, coordinating through SKIP LOCKED) retry them with exponential
+    backoff at INBOUND_QUEUE_DRAIN_PER_SECOND and reply on Telegram.
+
+    An attempt that outlives its deadline keeps running until its next LLM call
+    or tool, so it is only retried once it has stopped without a result: an
+    expense it saved late must not be saved again.
+
+    Workers claim one message at a time and renew its lease while a late
+    attempt is still running. A message is only finished or released by the
+    claim that holds it (same attempt number), so a worker whose lease expired
+    cannot overwrite the outcome of the worker that reclaimed it.
+    """
+
+    def __init__(self, database: Database, service: MessageService, controller: AdmissionController):
+        """
+        Initialize the inbound queue.
+
+        Args:
+            database: Database instance for data operations
+            service: MessageService that processes the messages
+            controller: AdmissionController whose slots the retries share with live traffic
+        """
+        settings = get_settings()
+        self.db = database
+        self.service = service
+        self.controller = controller
+        self.enabled = settings.inbound_queue_enabled
+        self.drain_per_second = settings.inbound_queue_drain_per_second
+        self.max_attempts = settings.inbound_queue_max_attempts
+        self.retry_seconds = settings.inbound_queue_retry_seconds
+        self.lease_seconds = settings.inbound_queue_lease_seconds
+        self.retention_hours = settings.inbound_queue_retention_hours
+        self.poll_seconds = settings.inbound_queue_poll_seconds
+        self.timeout_seconds = settings.request_timeout_seconds
+        # 0 (or less) drains without pacing
+        self.batch_size = max(1, math.ceil(self.drain_per_second)) if self.drain_per_second > 0 else 10
+        self._late: Set[asyncio.Task] = set()
+
+    def enqueue(self, user_id: int, telegram_id: str, message: str) -> int:
+        """Persist a message about to be processed inline. Returns its queue ID."""
+        return self.db.enqueue_inbound_message(user_id, telegram_id, message, self.lease_seconds)
+
+    def complete(self, message_id: int, response: Optional[str]) -> None:
+        """Mark a message processed inline as done."""
+        if not self.db.finish_inbound_message(message_id, INLINE_ATTEMPT, "done", response=response):
+            self._lost_lease(message_id)
+
+    def defer(self, message_id: int, reason: str) -> None:
+        """Leave a message whose inline attempt failed for the queue workers."""
+        if self.db.release_inbound_message(message_id, INLINE_ATTEMPT, reason, self.retry_seconds):
+            metrics.increment("inbound_messages", outcome="queued")
+        else:
+            self._lost_lease(message_id)
+
+    def defer_running(self, message_id: int, telegram_id: str, work: asyncio.Future) -> None:
+        """
+        Leave a message whose inline attempt outlived the request for the attempt itself to finish.
+
+        The attempt's result completes the message and is sent on Telegram; the
+        message is only left for the queue workers if the attempt fails.
+
+        Args:
+            message_id: Queue ID of the message
+            telegram_id: Telegram ID to reply to
+            work: DeadlineExceeded.work of the attempt
+        """
+        metrics.increment("inbound_messages", outcome="queued")
+        task = asyncio.create_task(self._finish_late(message_id, telegram_id, work))
+        self._late.add(task)
+        task.add_done_callback(self._late.discard)
+
+    async def _finish_late(self, message_id: int, telegram_id: str, work: asyncio.Future) -> None:
+        try:
+            success, response, status_code = await self._hold_lease(message_id, INLINE_ATTEMPT, work)
+            if status_code and status_code >= 500:
+                raise RuntimeError(response)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if not await asyncio.to_thread(self.db.release_inbound_message, message_id, INLINE_ATTEMPT, error, self.retry_seconds):
+                self._lost_lease(message_id)
+            return
+        if not await asyncio.to_thread(self.db.finish_inbound_message, message_id, INLINE_ATTEMPT, "done", response=response):
+            self._lost_lease(message_id)
+            return
+        metrics.increment("inbound_messages", outcome="processed_late")
+        if status_code != 403 and response:
+            await asyncio.to_thread(self._reply, telegram_id, response)
+
+    async def _hold_lease(self, message_id: int, attempts: int, work: asyncio.Future):
+        """Wait for a running attempt, renewing the message's lease until it finishes."""
+        while True:
+            done, _ = await asyncio.wait({work}, timeout=self.lease_seconds / 2)
+            if done:
+                return work.result()
+            if not await asyncio.to_thread(self.db.extend_inbound_lease, message_id, attempts, self.lease_seconds):
+                self._lost_lease(message_id)
+
+    def _lost_lease(self, message_id: int) -> None:
+        print(f"[INBOUND_QUEUE] Lease on message {message_id} expired and it was reclaimed; outcome dropped")
+        metrics.increment("inbound_messages", outcome="lease_lost")
+
+    def _backoff_seconds(self, attempts: int) -> float:
+        return self.retry_seconds * 2 ** (attempts - 1)
+
+    def _process(self, ticket: Ticket, row: Dict):
+        return self.service.process_message(
+            telegram_id=row["telegram_id"],
+            user_id=row["user_id"],
+            message=row["message"],
+            ticket=ticket,
+            strict=True
+        )
+
+    def _reply(self, telegram_id: str, text: str) -> None:
+        if not telegram_enabled():
+            print(f"[INBOUND_QUEUE] TELEGRAM_BOT_TOKEN not set, reply to {telegram_id} dropped")
+            return
+        send_telegram_message(telegram_id, text)
+
+    async def process(self, row: Dict) -> None:
+        """Retry one claimed message, then complete, reschedule or fail it."""
+        try:
+            ticket = self.controller.admit()
+            deadline = time.monotonic() + self.timeout_seconds
+            try:
+                result = await self.controller.run(ticket, deadline, self._process, row)
+            except DeadlineExceeded as e:
+                # Wait for the attempt to stop: it may still save the expense
+                result = await self._hold_lease(row["id"], row["attempts"], e.work)
+            success, response, status_code = result
+            if status_code and status_code >= 500:
+                raise RuntimeError(response)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if row["attempts"] >= self.max_attempts:
+                print(f"[INBOUND_QUEUE] Giving up on message {row['id']} after {row['attempts']} attempts: {error}")
+                if not await asyncio.to_thread(self.db.finish_inbound_message, row["id"], row["attempts"], "failed", error=error):
+                    self._lost_lease(row["id"])
+                    return
+                metrics.increment("inbound_messages", outcome="failed")
+                await asyncio.to_thread(self._reply, row["telegram_id"], FAILED_MESSAGE.format(message=row["message"]))
+            else:
+                delay = self._backoff_seconds(row["attempts"])
+                if isinstance(e, Overloaded):
+                    delay = self.retry_seconds
+                if await asyncio.to_thread(self.db.release_inbound_message, row["id"], row["attempts"], error, delay):
+                    metrics.increment("inbound_messages", outcome="retried")
+                else:
+                    self._lost_lease(row["id"])
+            return
+
+        if not await asyncio.to_thread(self.db.finish_inbound_message, row["id"], row["attempts"], "done", response=response):
+            self._lost_lease(row["id"])
+            return
+        metrics.increment("inbound_messages", outcome="processed")
+        if status_code != 403 and response:
+            await asyncio.to_thread(self._reply, row["telegram_id"], response)
+
+    async def drain_once(self) -> int:
+        """
+        Process up to batch_size due messages at the configured drain rate (0 = unpaced).
+
+        Each message is claimed right before its attempt, so its lease covers
+        that attempt only, not the ones queued ahead of it.
+        """
+        processed = 0
+        while processed < self.batch_size:
+            if self.controller.in_flight >= self.controller.max_in_flight:
+                # Live traffic comes first
+                break
+            rows = await asyncio.to_thread(self.db.claim_inbound_messages, 1, self.lease_seconds)
+            if not rows:
+                break
+            row = rows[0]
+            started = time.monotonic()
+            try:
+                await self.process(row)
+            except Exception as e:
+                # The lease expires and another attempt is made
+                print(f"Error processing inbound message {row['id']}: {e}")
+            processed += 1
+            if self.drain_per_second > 0:
+                await asyncio.sleep(max(0.0, 1 / self.drain_per_second - (time.monotonic() - started)))
+        return processed
+
+    async def run_forever(self) -> None:
+        """Drain the queue, polling when it is empty, and purge old finished messages hourly."""
+        if not telegram_enabled():
+            print("[INBOUND_QUEUE] TELEGRAM_BOT_TOKEN is not set: queued messages are processed without a reply")
+        last_purge = 0.0
+        while True:
+            processed = 0
+            try:
+                if time.monotonic() - last_purge >= 3600:
+                    purged = await asyncio.to_thread(self.db.purge_inbound_messages, self.retention_hours)
+                    if purged:
+                        print(f"[INBOUND_QUEUE] Purged {purged} finished message(s)")
+                    last_purge = time.monotonic()
+                processed = await self.drain_once()
+            except Exception as e:
+                print(f"Error draining inbound queue: {e}")
+            if not processed:
+                await asyncio.sleep(self.poll_seconds)
+
+    def status(self) -> Dict[str, int]:
+        return self.db.get_inbound_queue_stats()
+
+
+# Singleton instance
+from src.database import db
+from src.admission import admission_controller
+from src.services.message_service import message_service
+
+inbound_queue = InboundQueue(db, message_service, admission_controller)
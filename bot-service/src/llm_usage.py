@@ -0,0 +1,192 @@
+"""Per-call LLM token accounting by call site, with the heaviest users tracked in bounded memory."""
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from src.config import get_settings
+from src.metrics import metrics
+
+
+# Tokens OpenAI adds per chat message and to prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of a text with the cl100k_base encoding (about 4 characters per token if tiktoken is unavailable)."""
+    global _encoding
+    if not text:
+        return 0
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # No tiktoken or its encoding file cannot be downloaded: don't retry on every call
+                print(f"Token counting falls back to an estimate: {e}")
+                _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Content and function/tool call arguments of a message, as sent to the API."""
+    parts = [message.content if isinstance(message.content, str) else str(message.content)]
+    function_call = message.additional_kwargs.get("function_call")
+    if function_call:
+        parts += [function_call.get("name") or "", function_call.get("arguments") or ""]
+    for call in message.additional_kwargs.get("tool_calls") or []:
+        parts += [call["function"].get("name") or "", call["function"].get("arguments") or ""]
+    return "".join(parts)
+
+
+def count_prompt_tokens(messages: List[BaseMessage], invocation_params: Optional[Dict] = None) -> int:
+    """Prompt tokens of a chat request: its messages plus the tool/function schemas (approximately)."""
+    tokens = sum(count_tokens(_message_text(message)) + TOKENS_PER_MESSAGE for message in messages) + TOKENS_PER_REPLY
+    for name in ("tools", "functions"):
+        if (invocation_params or {}).get(name):
+            tokens += count_tokens(json.dumps(invocation_params[name]))
+    return tokens
+
+
+def token_usage(
+    response: LLMResult,
+    messages: Optional[List[BaseMessage]] = None,
+    invocation_params: Optional[Dict] = None
+) -> Dict:
+    """
+    Token usage of an LLM call.
+
+    Non-streamed calls report it in llm_output; streamed calls (the query agent)
+    report none, so it is counted locally from the prompt and the generated message.
+
+    Args:
+        response: Result passed to on_llm_end
+        messages: Prompt messages of the call (from on_chat_model_start)
+        invocation_params: Invocation parameters of the call (tool schemas)
+
+    Returns:
+        Dict with prompt_tokens, completion_tokens, total_tokens, cached_tokens
+        and estimated (True if counted locally)
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage.get("prompt_tokens") or usage.get("completion_tokens"):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": usage.get("total_tokens") or prompt_tokens + completion_tokens,
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+            "estimated": False,
+        }
+
+    prompt_tokens = count_prompt_tokens(messages, invocation_params) if messages else 0
+    completion_tokens = 0
+    for generation in response.generations[0] if response.generations else []:
+        message = getattr(generation, "message", None)
+        completion_tokens += count_tokens(_message_text(message) if message is not None else generation.text)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cached_tokens": 0,
+        "estimated": True,
+    }
+
+
+class UserTokenUsage:
+    """
+    Token totals of the heaviest users, in at most `capacity` entries (Space-Saving).
+
+    When the table is full a new user replaces the one with the fewest tokens
+    and inherits its total as an overcount bound (`error`), so users that keep
+    spending tokens rise to the top without one entry per user ever seen.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._users: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, prompt_tokens: int, completion_tokens: int) -> None:
+        """Add one call's tokens to a user's total."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = {"tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "error": 0}
+                if len(self._users) >= self.capacity:
+                    evicted = min(self._users, key=lambda user: self._users[user]["tokens"])
+                    entry["tokens"] = entry["error"] = self._users.pop(evicted)["tokens"]
+                self._users[user_id] = entry
+            entry["tokens"] += prompt_tokens + completion_tokens
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+
+    def top(self, limit: int = 20) -> List[Dict]:
+        """Heaviest users first: user_id, tokens (upper bound), error, prompt and completion tokens since tracked."""
+        with self._lock:
+            entries = [{"user_id": user_id, **entry} for user_id, entry in self._users.items()]
+        return sorted(entries, key=lambda entry: entry["tokens"], reverse=True)[:limit]
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Records prompt, completion and cached prompt tokens of every LLM call.
+
+    Metrics: llm_prompt_tokens, llm_completion_tokens, llm_cached_prompt_tokens
+    and llm_calls, labeled by call_site; per-user totals go to user_token_usage.
+    Calls whose tokens had to be counted locally (streamed) are counted in
+    llm_estimated_usage.
+    """
+
+    def __init__(self, call_site: str, user_id: Optional[int] = None):
+        self.call_site = call_site
+        self.user_id = user_id
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._prompts: Dict[UUID, Tuple[List[BaseMessage], Optional[Dict]]] = {}
+
+    def on_chat_model_start(self, serialized, messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompts[run_id] = (messages[0], kwargs.get("invocation_params"))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompts.pop(run_id, None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        usage = token_usage(response, *self._prompts.pop(run_id, (None, None)))
+        prompt_tokens = usage["prompt_tokens"]
+        completion_tokens = usage["completion_tokens"]
+        cached_tokens = usage["cached_tokens"]
+
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_prompt_tokens += cached_tokens
+
+        metrics.increment("llm_calls", call_site=self.call_site)
+        metrics.increment("llm_prompt_tokens", prompt_tokens, call_site=self.call_site)
+        metrics.increment("llm_completion_tokens", completion_tokens, call_site=self.call_site)
+        metrics.increment("llm_cached_prompt_tokens", cached_tokens, call_site=self.call_site)
+        if usage["estimated"]:
+            metrics.increment("llm_estimated_usage", call_site=self.call_site)
+        if self.user_id is not None:
+            user_token_usage.add(self.user_id, prompt_tokens, completion_tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+# Singleton instance
+user_token_usage = UserTokenUsage(get_settings().llm_usage_top_users)
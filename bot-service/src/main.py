@@ -1,5 +1,8 @@
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from src.config import get_settings
@@ -14,9 +17,23 @@ if settings.langchain_tracing_v2 == "true" and settings.langchain_api_key:
 
 # Now import modules that use LLMs (they will pick up the env vars)
 from src.models import MessageRequest, MessageResponse
-from src.message_router import message_router
-from src.services.expense_service import expense_service
-from src.services.query_service import query_service
+from src.services.message_service import message_service
+from src.metrics import metrics
+from src.llm_usage import user_token_usage
+from src.partition_maintenance import partition_maintenance
+from src.reports import report_scheduler
+from src.admission import (
+    DeadlineExceeded,
+    LLMUnavailable,
+    Overloaded,
+    Ticket,
+    admission_controller,
+    deadline_from_timeout_header,
+    rate_limiter,
+)
+from src.inbound_queue import QUEUED_MESSAGE, inbound_queue
+from src.answer_cache import answer_cache
+from src.traffic_capture import traffic_recorder
 
 app = FastAPI(title="Expense Tracker Bot Service")
 
@@ -30,10 +47,37 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start background maintenance jobs."""
+    asyncio.create_task(partition_maintenance.run_forever())
+    asyncio.create_task(report_scheduler.run_forever())
+    if inbound_queue.enabled:
+        asyncio.create_task(inbound_queue.run_forever())
+    
+    from src.database import db
+    if db.replicas.enabled:
+        asyncio.create_task(db.replicas.run_forever(settings.replica_health_interval_seconds))
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "bot-service"}
+    from src.database import db
+    response = {"status": "healthy", "service": "bot-service", "admission": admission_controller.status()}
+    if db.replicas.enabled:
+        response["replicas"] = db.replicas.status()
+    if inbound_queue.enabled:
+        response["inbound_queue"] = inbound_queue.status()
+    if answer_cache.enabled:
+        response["answer_cache"] = answer_cache.status()
+    return response
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process metrics (LLM turns, latencies...) and the users spending the most tokens."""
+    return {**metrics.snapshot(), "llm_top_users": user_token_usage.top()}
 
 
 @app.post(
@@ -48,6 +92,14 @@ async def health_check():
                 }
             }
         },
+        202: {
+            "description": "Message queued for later processing (inbound queue enabled, reply sent on Telegram)",
+            "content": {
+                "application/json": {
+                    "example": {"success": True, "message": QUEUED_MESSAGE}
+                }
+            }
+        },
         403: {
             "description": "User not authorized (not in whitelist)",
             "content": {
@@ -56,6 +108,14 @@ async def health_check():
                 }
             }
         },
+        429: {
+            "description": "Too many messages from this user (see Retry-After)",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many messages"}
+                }
+            }
+        },
         500: {
             "description": "Internal server error (failed to save expense)",
             "content": {
@@ -63,19 +123,78 @@ async def health_check():
                     "example": {"detail": "Failed to save expense"}
                 }
             }
+        },
+        503: {
+            "description": "Service overloaded, request shed (see Retry-After)",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Service overloaded"}
+                }
+            }
+        },
+        504: {
+            "description": "Request deadline exceeded",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Deadline exceeded"}
+                }
+            }
         }
     }
 )
-async def process_message(request: MessageRequest):
+async def process_message(
+    request: MessageRequest,
+    response: Response,
+    x_request_timeout_ms: Optional[str] = Header(default=None),
+    x_replay_id: Optional[str] = Header(default=None)
+):
     """
     Process an incoming message from a Telegram user.
     
     This endpoint:
     1. Checks user authorization
-    2. Routes the message to the appropriate handler (expense or query)
-    3. Delegates processing to the corresponding service
+    2. Applies the per-user rate limit and the in-flight limit
+    3. Classifies the message and delegates it to the expense or query service
     4. Returns the response
+    
+    X-Request-Timeout-Ms carries the caller's remaining time budget; work still
+    running when it expires is stopped at its next LLM call.
+    
+    With the inbound queue enabled the message is persisted first. If it cannot
+    be processed now (LLM unavailable, overloaded, deadline) it stays queued and
+    a 202 acknowledgement is returned instead of an error.
+    
+    With traffic capture enabled the request is recorded (see src/traffic_capture.py);
+    X-Replay-Id links a replayed request to its original.
     """
+    capture = traffic_recorder.start(x_replay_id)
+    if capture is None:
+        return await _process_message(request, x_request_timeout_ms)
+    
+    try:
+        result = await _process_message(request, x_request_timeout_ms)
+    except HTTPException as e:
+        headers = traffic_recorder.finish(
+            capture, request.telegram_id, request.message, e.status_code, str(e.detail), x_replay_id
+        )
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={**(e.headers or {}), **headers})
+    
+    if isinstance(result, JSONResponse):
+        body = MessageResponse.model_validate_json(result.body)
+        headers = traffic_recorder.finish(
+            capture, request.telegram_id, request.message, result.status_code, body.message, x_replay_id
+        )
+        result.headers.update(headers)
+        return result
+    headers = traffic_recorder.finish(capture, request.telegram_id, request.message, 200, result.message, x_replay_id)
+    response.headers.update(headers)
+    return result
+
+
+async def _process_message(request: MessageRequest, x_request_timeout_ms: Optional[str]):
+    """Body of process_message (returns a MessageResponse or JSONResponse, or raises HTTPException)."""
+    deadline = deadline_from_timeout_header(x_request_timeout_ms)
+    
     # 1. Check if user is whitelisted FIRST (before any processing)
     from src.database import db
     user_id = db.get_user_id(request.telegram_id)
@@ -83,30 +202,43 @@ async def process_message(request: MessageRequest):
         # User not whitelisted - return 403 Forbidden
         raise HTTPException(status_code=403, detail="User not authorized")
     
-    # 2. Classify the message type
-    message_type = message_router.classify(request.message)
-    
-    # 3. Route to appropriate service
-    if message_type == "expense":
-        # Handle expense reporting
-        success, message, status_code = expense_service.process_message(
-            telegram_id=request.telegram_id,
-            message=request.message
+    # 2. Admission control
+    retry_after = rate_limiter.acquire(user_id)
+    if retry_after:
+        metrics.increment("requests_shed", reason="rate_limit")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages",
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))}
         )
     
-    elif message_type == "query":
-        # Handle expense queries
-        success, message, status_code = query_service.process_query(
-            telegram_id=request.telegram_id,
-            message=request.message
-        )
+    queue_id = None
+    if inbound_queue.enabled:
+        queue_id = inbound_queue.enqueue(user_id, request.telegram_id, request.message)
     
-    else:
-        # Handle other messages (greetings, etc.)
-        return MessageResponse(
-            success=False,
-            message="I can help you track expenses and answer questions about your spending. Try: 'Pizza 20 bucks' or 'How much did I spend on food?'"
+    # 3. Classify and process the message
+    try:
+        ticket = admission_controller.admit()
+        success, message, status_code = await admission_controller.run(
+            ticket, deadline, handle_message, request, user_id, queue_id is not None
         )
+    except (Overloaded, DeadlineExceeded, LLMUnavailable) as e:
+        if queue_id is not None:
+            if isinstance(e, DeadlineExceeded):
+                # Still running: its result completes the message (retrying could save an expense twice)
+                inbound_queue.defer_running(queue_id, request.telegram_id, e.work)
+            else:
+                inbound_queue.defer(queue_id, type(e).__name__)
+            return JSONResponse(
+                status_code=202,
+                content=MessageResponse(success=True, message=QUEUED_MESSAGE).model_dump()
+            )
+        if isinstance(e, Overloaded):
+            raise HTTPException(status_code=503, detail="Service overloaded", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=504, detail="Deadline exceeded")
+    
+    if queue_id is not None:
+        inbound_queue.complete(queue_id, message)
     
     # 4. Handle HTTP errors
     if status_code:
@@ -116,6 +248,17 @@ async def process_message(request: MessageRequest):
     return MessageResponse(success=success, message=message)
 
 
+def handle_message(ticket: Ticket, request: MessageRequest, user_id: int, strict: bool):
+    """Classify and process a message (blocking; runs on the admission controller's pool)."""
+    return message_service.process_message(
+        telegram_id=request.telegram_id,
+        user_id=user_id,
+        message=request.message,
+        ticket=ticket,
+        strict=strict
+    )
+
+
 if __name__ == "__main__":
     settings = get_settings()
     uvicorn.run(
@@ -1,24 +1,51 @@
 """Message router to classify incoming messages."""
-from typing import Literal
+from typing import Literal, Optional
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.utils.function_calling import convert_to_openai_function
+from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
+from pydantic import BaseModel
 import json
 from src.config import get_settings
+from src.llm_usage import TokenUsageCallback
+from src.traffic_capture import traffic_recorder
+from src.admission import DeadlineCallback, DeadlineExceeded, LLMUnavailable
+from src.query_intents import query_intent_matcher
 
 
 MessageType = Literal["expense", "query", "other"]
 
 
+class MessageClassification(BaseModel):
+    """Classify a chat message sent to an expense tracking bot."""
+    message_type: MessageType
+
+
+COMPACT_SYSTEM_PROMPT = """Classify messages sent to an expense tracking bot:
+expense = reports money spent ("Pizza 20 bucks", "Uber al trabajo $15")
+query = asks about their own spending ("How much did I spend on food?", "¿Cuánto gasté este mes?")
+other = anything else (greetings, help, unrelated)"""
+
+
 class MessageRouter:
     """Routes messages to appropriate handlers based on content."""
     
-    def __init__(self):
+    def __init__(self, compact: Optional[bool] = None):
+        """
+        Initialize the message router.
+        
+        Args:
+            compact: Use the trimmed prompt with function-calling output
+                (defaults to the LLM_COMPACT_PROMPTS setting)
+        """
         settings = get_settings()
+        self.compact = settings.llm_compact_prompts if compact is None else compact
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            **traffic_recorder.llm_client_kwargs()
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -40,21 +67,46 @@ Respond with ONLY a JSON object: {{"message_type": "expense|query|other"}}
 IMPORTANT: Return ONLY the JSON object, no additional text."""),
             ("user", "{message}")
         ])
+        
+        self.compact_prompt = ChatPromptTemplate.from_messages([
+            ("system", COMPACT_SYSTEM_PROMPT),
+            ("user", "{message}")
+        ])
+        classification_function = convert_to_openai_function(MessageClassification)
+        self.compact_llm = self.llm.bind(
+            functions=[classification_function],
+            function_call={"name": classification_function["name"]}
+        )
     
-    def classify(self, message: str) -> MessageType:
+    def _invoke(self, message: str, user_id: Optional[int]) -> dict:
+        """Run the LLM classification and return the parsed JSON."""
+        config = {"callbacks": [TokenUsageCallback("router", user_id), DeadlineCallback()]}
+        if self.compact:
+            chain = self.compact_prompt | self.compact_llm | JsonOutputFunctionsParser()
+            return chain.invoke({"message": message}, config=config)
+        
+        chain = self.prompt | self.llm | StrOutputParser()
+        response_str = chain.invoke({"message": message}, config=config)
+        return json.loads(response_str.strip())
+    
+    def classify(self, message: str, user_id: Optional[int] = None, strict: bool = False) -> MessageType:
         """
         Classify a message into expense, query, or other.
         
         Args:
             message: The message text to classify
+            user_id: The user's database ID (for token accounting)
+            strict: Raise LLMUnavailable on LLM errors instead of returning "other"
             
         Returns:
             MessageType: "expense", "query", or "other"
         """
+        # Common spending questions are recognized without the LLM
+        if query_intent_matcher.match(message):
+            return "query"
+        
         try:
-            chain = self.prompt | self.llm | StrOutputParser()
-            response_str = chain.invoke({"message": message})
-            response_data = json.loads(response_str.strip())
+            response_data = self._invoke(message, user_id)
             
             message_type = response_data.get("message_type", "other")
             
@@ -65,8 +117,12 @@ IMPORTANT: Return ONLY the JSON object, no additional text."""),
             
             return message_type
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error classifying message: {e}")
+            if strict:
+                raise LLMUnavailable(str(e)) from e
             # Default to "other" on error to fail gracefully
             return "other"
 
@@ -0,0 +1,59 @@
+"""In-process metrics registry exposed through the /metrics endpoint."""
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    """Build a metric key like 'name{a=1,b=2}'."""
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class Metrics:
+    """Thread-safe counters and summaries (count/sum/min/max/avg)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record an observation (latency, turn count, tokens...)."""
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict:
+        """Return a copy of all metrics."""
+        with self._lock:
+            summaries = {
+                key: {**summary, "avg": summary["sum"] / summary["count"]}
+                for key, summary in self._summaries.items()
+            }
+            return {"counters": dict(self._counters), "summaries": summaries}
+
+    def reset(self) -> None:
+        """Clear all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+# Singleton instance
+metrics = Metrics()
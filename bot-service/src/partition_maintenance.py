@@ -0,0 +1,46 @@
+"""Periodic maintenance of the monthly expense partitions."""
+import asyncio
+from src.database import Database
+from src.config import get_settings
+
+
+class PartitionMaintenance:
+    """Creates upcoming expense partitions and archives old ones."""
+    
+    def __init__(self, database: Database):
+        """
+        Initialize the partition maintenance job.
+        
+        Args:
+            database: Database instance for data operations
+        """
+        settings = get_settings()
+        self.db = database
+        self.months_ahead = settings.expense_partitions_months_ahead
+        self.archive_after_months = settings.expense_archive_after_months
+        self.interval_seconds = settings.partition_maintenance_interval_hours * 3600
+    
+    def run_once(self) -> None:
+        """Run one maintenance pass."""
+        created = self.db.ensure_expense_partitions(self.months_ahead)
+        if created:
+            print(f"[PARTITIONS] Created {created} expense partition(s)")
+        
+        if self.archive_after_months > 0:
+            archived = self.db.archive_expense_partitions(self.archive_after_months)
+            if archived:
+                print(f"[PARTITIONS] Archived {', '.join(archived)}")
+    
+    async def run_forever(self) -> None:
+        """Run maintenance at startup and then every configured interval."""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Error running partition maintenance: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+# Singleton instance
+from src.database import db
+partition_maintenance = PartitionMaintenance(db)
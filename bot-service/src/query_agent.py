@@ -1,11 +1,25 @@
 """Query agent for answering expense-related questions using tools."""
-from typing import Optional
+import contextvars
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 from langchain.agents import create_openai_tools_agent, AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.pydantic_v1 import PrivateAttr
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools import tool
+from langchain_core.callbacks import BaseCallbackHandler
 from src.database import Database
 from src.config import get_settings
+from src.metrics import metrics
+from src.llm_usage import TokenUsageCallback
+from src.traffic_capture import traffic_recorder
+from src.admission import DeadlineCallback, DeadlineExceeded
+from src.query_intents import CATEGORY_NAMES_ES, QueryIntent, query_intent_matcher
+from src.reports import period_start, render_report
+from src.analytics import ExpenseAnalytics
 
 
 def parse_money(value) -> float:
@@ -16,8 +30,80 @@ def parse_money(value) -> float:
     return float(str(value).replace('$', '').replace(',', ''))
 
 
-def create_expense_tools(db: Database, user_id: int):
-    """Create tools for the expense query agent."""
+def render_intent_answer(db: Database, user_id: int, intent: QueryIntent) -> str:
+    """
+    Answer a matched QueryIntent straight from the database with a templated response.
+    
+    Args:
+        db: Database instance for data operations
+        user_id: The user's database ID
+        intent: The matched intent
+        
+    Returns:
+        The response in the intent's language
+    """
+    spanish = intent.language == "es"
+    
+    if intent.kind == "summary":
+        start = period_start(intent.period, db.get_current_date(), offset=intent.offset)
+        report = db.get_spending_report(user_id, intent.period, start)
+        return render_report(report, intent.period, intent.language, offset=intent.offset)
+    
+    if intent.kind == "total":
+        total = parse_money(db.get_total_by_category(user_id, intent.category, intent.days))
+        if spanish:
+            if intent.category:
+                category = CATEGORY_NAMES_ES.get(intent.category, intent.category)
+                return f"Total gastado en {category} en los últimos {intent.days} días: ${total:.2f}"
+            return f"Total gastado en todas las categorías en los últimos {intent.days} días: ${total:.2f}"
+        if intent.category:
+            return f"Total spent on {intent.category} in the last {intent.days} days: ${total:.2f}"
+        return f"Total spent across all categories in the last {intent.days} days: ${total:.2f}"
+    
+    if intent.kind == "breakdown":
+        breakdown = db.get_category_breakdown(user_id, intent.days)
+        if not breakdown:
+            if spanish:
+                return f"No se encontraron gastos en los últimos {intent.days} días."
+            return f"No expenses found in the last {intent.days} days."
+        
+        if spanish:
+            lines = [f"Desglose de gastos de los últimos {intent.days} días:\n"]
+        else:
+            lines = [f"Spending breakdown for the last {intent.days} days:\n"]
+        for item in breakdown:
+            total = parse_money(item['total'])
+            count = item['count']
+            if spanish:
+                category = CATEGORY_NAMES_ES.get(item['category'], item['category'])
+                lines.append(f"- {category.capitalize()}: ${total:.2f} ({count} gastos)")
+            else:
+                lines.append(f"- {item['category']}: ${total:.2f} ({count} expenses)")
+        return "\n".join(lines)
+    
+    expenses = db.get_recent_expenses(user_id, intent.limit)
+    if not expenses:
+        return "No se encontraron gastos." if spanish else "No expenses found."
+    
+    if spanish:
+        lines = [f"Tus {len(expenses)} gastos más recientes:\n"]
+    else:
+        lines = [f"Your {len(expenses)} most recent expenses:\n"]
+    for exp in expenses:
+        desc = exp['description']
+        amount = parse_money(exp['amount'])
+        category = exp['category']
+        added_on = exp['added_at'].strftime('%Y-%m-%d')
+        if spanish:
+            category = CATEGORY_NAMES_ES.get(category, category)
+            lines.append(f"- {desc}: ${amount:.2f} ({category}) el {added_on}")
+        else:
+            lines.append(f"- {desc}: ${amount:.2f} ({category}) on {added_on}")
+    return "\n".join(lines)
+
+
+def create_expense_tools(db: Database, user_id: int, analytics: Optional[ExpenseAnalytics] = None):
+    """Create tools for the expense query agent (plus the analytics tools when `analytics` is given)."""
     
     @tool
     def get_total_spending(category: Optional[str] = None, days: int = 30) -> str:
@@ -144,79 +230,385 @@ def create_expense_tools(db: Database, user_id: int):
         
         return "\n".join(lines)
     
-    return [
+    tools = [
         get_total_spending,
         get_spending_breakdown,
         get_recent_expenses_list,
         search_expenses_by_keyword,
         get_expenses_by_category
     ]
+    if analytics is None:
+        return tools
+    
+    def invalid_days(days: int) -> Optional[str]:
+        """Message for the agent if `days` is outside the loaded history, else None."""
+        if 1 <= days <= analytics.history_days:
+            return None
+        return f"Invalid days={days}: use a number of days between 1 and {analytics.history_days}."
+    
+    @tool
+    def get_spending_trend(category: Optional[str] = None, days: int = 30) -> str:
+        """
+        Compare recent spending with the user's usual spending, and get daily averages.
+        Use it for questions like "am I spending more on food than usual?" or "what's my daily average?".
+        
+        Args:
+            category: Category name. If None, covers all categories.
+            days: Length of the recent period in days (default 30); it is compared
+                  with the three periods of the same length before it
+        
+        Returns:
+            A string with the recent total, the usual total, the change and daily averages
+        """
+        error = invalid_days(days)
+        if error:
+            return error
+        trend = analytics.trend(user_id, category, days)
+        label = f"on {category}" if category else "overall"
+        if trend is None:
+            return "No expenses found."
+        
+        lines = [
+            f"Spent {label} in the last {days} days: ${trend['current_total']:.2f} "
+            f"(daily average ${trend['current_daily_average']:.2f})"
+        ]
+        if trend["usual_total"] is None:
+            lines.append(f"Not enough history to compare with earlier {days}-day periods.")
+        else:
+            previous = ", ".join(f"${total:.2f}" for total in trend["previous_totals"])
+            lines.append(
+                f"Usual {days}-day spending {label}: ${trend['usual_total']:.2f} "
+                f"(daily average ${trend['usual_daily_average']:.2f}; earlier periods, oldest first: {previous})"
+            )
+            change = f"{'+' if trend['change'] >= 0 else '-'}${abs(trend['change']):.2f}"
+            if trend["percent_change"] is not None:
+                change += f" ({trend['percent_change']:+.0f}%)"
+            lines.append(f"Change vs usual: {change}")
+        if days >= 7:
+            lines.append(
+                f"7-day rolling daily average: ${trend['rolling_7d_average']:.2f} now, "
+                f"highest in the period ${trend['rolling_7d_max']:.2f}"
+            )
+        return "\n".join(lines)
+    
+    @tool
+    def get_expense_percentiles(category: Optional[str] = None, days: int = 90) -> str:
+        """
+        Get the distribution of individual expense amounts: typical (median), percentiles and largest.
+        Use it for questions like "how much do I usually spend per meal?" or "is $50 a lot for me?".
+        
+        Args:
+            category: Category name. If None, covers all categories.
+            days: Number of days to look back (default 90)
+        
+        Returns:
+            A string with count, mean, 25th/50th/75th/90th percentiles and maximum
+        """
+        error = invalid_days(days)
+        if error:
+            return error
+        stats = analytics.percentiles(user_id, category, days)
+        label = f"{category} expenses" if category else "expenses"
+        if stats is None:
+            return f"No {label} found in the last {days} days."
+        return (
+            f"{stats['count']} {label} in the last {days} days: mean ${stats['mean']:.2f}, "
+            f"median ${stats['median']:.2f}, 25th percentile ${stats['p25']:.2f}, "
+            f"75th percentile ${stats['p75']:.2f}, 90th percentile ${stats['p90']:.2f}, "
+            f"largest ${stats['max']:.2f}"
+        )
+    
+    @tool
+    def find_unusual_expenses(category: Optional[str] = None, days: int = 30) -> str:
+        """
+        Find recent expenses that are unusually large compared with the user's history in the same category.
+        
+        Args:
+            category: Category name. If None, checks all categories.
+            days: Number of days to look back (default 30)
+        
+        Returns:
+            A formatted string listing the unusual expenses and their category's typical amount
+        """
+        error = invalid_days(days)
+        if error:
+            return error
+        outliers = analytics.outliers(user_id, category, days)
+        if not outliers:
+            return f"No unusual expenses found in the last {days} days."
+        
+        lines = [f"{len(outliers)} unusual expenses in the last {days} days:\n"]
+        for item in outliers:
+            lines.append(
+                f"- {item['description']}: ${item['amount']:.2f} ({item['category']}) on {item['date']}, "
+                f"typical {item['category']} expense ${item['median']:.2f}"
+            )
+        return "\n".join(lines)
+    
+    return tools + [get_spending_trend, get_expense_percentiles, find_unusual_expenses]
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Callback handler that counts LLM completions (agent turns)."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+    
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.calls += 1
+
+
+# Shared by all agent runs, so concurrent queries cannot open unbounded DB connections
+TOOL_POOL = ThreadPoolExecutor(
+    max_workers=get_settings().query_tool_max_workers,
+    thread_name_prefix="query-tool"
+)
+
+
+class ParallelToolsAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the tool calls of one agent step concurrently on TOOL_POOL.
+    
+    AgentExecutor yields every action of a step before performing them one by
+    one. The first _perform_agent_action call of a step with several actions
+    submits all of them, and each call then waits for its own result, so a step
+    costs about its slowest tool.
+    """
+    
+    _step_actions: List[AgentAction] = PrivateAttr(default_factory=list)
+    _step_futures: Dict[int, Future] = PrivateAttr(default_factory=dict)
+    _step_started: Optional[float] = PrivateAttr(default=None)
+    
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        self._step_actions, self._step_futures, self._step_started = [], {}, None
+        for item in super()._iter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(item, AgentAction):
+                self._step_actions.append(item)
+            yield item
+        
+        if self._step_started is not None:
+            elapsed_ms = (time.perf_counter() - self._step_started) * 1000
+            mode = "parallel" if self._step_futures else "single"
+            print(f"[QUERY_AGENT] {len(self._step_actions)} tool call(s) ({mode}) in {elapsed_ms:.0f} ms")
+            metrics.observe("query_tool_step_ms", elapsed_ms, mode=mode)
+    
+    def _perform_timed(self, name_to_tool_map, color_mapping, agent_action, run_manager) -> AgentStep:
+        start = time.perf_counter()
+        try:
+            return AgentExecutor._perform_agent_action(
+                self, name_to_tool_map, color_mapping, agent_action, run_manager
+            )
+        finally:
+            metrics.observe("query_tool_ms", (time.perf_counter() - start) * 1000, tool=agent_action.tool)
+    
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        if self._step_started is None:
+            self._step_started = time.perf_counter()
+        if len(self._step_actions) < 2:
+            return self._perform_timed(name_to_tool_map, color_mapping, agent_action, run_manager)
+        
+        if not self._step_futures:
+            for action in self._step_actions:
+                # Copy the context so the request deadline applies in the pool threads
+                context = contextvars.copy_context()
+                self._step_futures[id(action)] = TOOL_POOL.submit(
+                    context.run, self._perform_timed, name_to_tool_map, color_mapping, action, run_manager
+                )
+        return self._step_futures[id(agent_action)].result()
+
+
+def render_snapshot(snapshot: Dict) -> str:
+    """
+    Render a spending snapshot as compact text for the prompt.
+    
+    Args:
+        snapshot: Result of Database.get_spending_snapshot
+        
+    Returns:
+        A compact multi-line summary
+    """
+    lines = [f"Today: {date.today().isoformat()}"]
+    
+    categories = snapshot.get("categories") or []
+    if categories:
+        lines.append("Totals by category (last 7d | 30d | 90d, count in parentheses):")
+        sums = {"7d": 0.0, "30d": 0.0, "90d": 0.0}
+        for item in categories:
+            cells = []
+            for window in ("7d", "30d", "90d"):
+                total = float(item[f"total_{window}"])
+                sums[window] += total
+                cells.append(f"${total:.2f} ({item[f'count_{window}']})")
+            lines.append(f"- {item['category']}: " + " | ".join(cells))
+        lines.append(
+            f"- ALL: ${sums['7d']:.2f} | ${sums['30d']:.2f} | ${sums['90d']:.2f}"
+        )
+    else:
+        lines.append("No expenses in the last 90 days.")
+    
+    recent = snapshot.get("recent") or []
+    if recent:
+        lines.append(f"{len(recent)} most recent expenses:")
+        for exp in recent:
+            lines.append(
+                f"- {str(exp['added_at'])[:10]} {exp['description']}: "
+                f"${float(exp['amount']):.2f} ({exp['category']})"
+            )
+    
+    return "\n".join(lines)
+
+
+TOOLS_SYSTEM_PROMPT = """You are a helpful expense tracking assistant. 
+            
+You have access to tools that can query the user's expense data. Use these tools to answer their questions accurately.
+
+When the user asks about spending, categories, or expenses:
+1. Use the appropriate tool(s) to get the data
+2. Provide a clear, natural language response
+3. Include specific numbers and details from the tools
+
+Valid expense categories are: Housing, Transportation, Food, Utilities, Insurance, Medical/Healthcare, Savings, Debt, Education, Entertainment, Other
+
+Be concise but informative. Format currency as $XX.XX."""
+
+SNAPSHOT_SYSTEM_PROMPT = """You are a helpful expense tracking assistant.
+
+The next message is a snapshot of the user's spending data. Answer directly from the snapshot whenever it contains the answer.
+Only call a tool when the snapshot is not enough (e.g. keyword searches, expenses older than the recent list, periods other than 7/30/90 days, trends compared with usual spending, daily averages, typical amounts or unusual expenses).
+
+Valid expense categories are: Housing, Transportation, Food, Utilities, Insurance, Medical/Healthcare, Savings, Debt, Education, Entertainment, Other
+
+Be concise but informative. Answer in the same language as the user. Format currency as $XX.XX."""
+
+COMPACT_TOOLS_SYSTEM_PROMPT = """Expense tracking assistant. Use the tools to get the user's data, then answer concisely with the numbers, in the user's language. Currency: $XX.XX."""
+
+COMPACT_SNAPSHOT_SYSTEM_PROMPT = """Expense tracking assistant. The next message is the user's spending snapshot; answer from it, and call a tool only if it lacks the data. Be concise, use the user's language. Currency: $XX.XX."""
+
+# Per-user data goes after the static system prompt so the prompt prefix
+# (tools + system prompt) is identical across calls and hits the provider prompt cache
+SNAPSHOT_MESSAGE = """Spending snapshot:
+{snapshot}"""
 
 
 class QueryAgent:
     """Agent for answering expense-related queries."""
     
-    def __init__(self, database: Database):
+    def __init__(
+        self,
+        database: Database,
+        snapshot_mode: Optional[bool] = None,
+        compact: Optional[bool] = None,
+        analytics: Optional[ExpenseAnalytics] = None
+    ):
         """
         Initialize the query agent.
         
         Args:
             database: Database instance for data operations
+            snapshot_mode: Put a precomputed spending snapshot in the prompt
+                (defaults to the QUERY_SNAPSHOT_MODE setting)
+            compact: Use the trimmed system prompts
+                (defaults to the LLM_COMPACT_PROMPTS setting)
+            analytics: ExpenseAnalytics for the trend, percentile and outlier tools
+                (without it the agent only gets the SQL tools)
         """
         settings = get_settings()
         self.db = database
+        self.analytics = analytics
+        self.snapshot_mode = settings.query_snapshot_mode if snapshot_mode is None else snapshot_mode
+        self.compact = settings.llm_compact_prompts if compact is None else compact
+        self.snapshot_recent_limit = settings.query_snapshot_recent_limit
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0,
-            openai_api_key=settings.openai_api_key
+            openai_api_key=settings.openai_api_key,
+            **traffic_recorder.llm_client_kwargs()
         )
     
-    def query(self, user_id: int, message: str) -> str:
+    def query(self, user_id: int, message: str) -> Tuple[bool, str]:
         """
         Process a query from a user.
         
+        Common questions (totals, breakdown, recent expenses) are answered
+        directly from the database; everything else goes to the agent.
+        
         Args:
             user_id: The user's database ID
             message: The query message
             
         Returns:
-            The agent's response as a string
+            Tuple of (answered, response): answered is False when the response
+            is an apology for an error (not an answer worth caching)
         """
+        # Fast path: deterministic answer for common questions
+        intent = query_intent_matcher.match(message)
+        if intent:
+            try:
+                start = time.perf_counter()
+                answer = render_intent_answer(self.db, user_id, intent)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                print(f"[FAST_PATH] Answered '{intent.kind}' intent in {elapsed_ms:.1f} ms")
+                metrics.observe("query_llm_turns", 0, mode="fast_path")
+                metrics.observe("query_latency_ms", elapsed_ms, mode="fast_path")
+                return True, answer
+            except Exception as e:
+                print(f"Error answering fast path intent, falling back to agent: {e}")
+        
         # Create tools for this specific user
-        tools = create_expense_tools(self.db, user_id)
+        tools = create_expense_tools(self.db, user_id, self.analytics)
         
         # Create prompt
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful expense tracking assistant. 
-            
-You have access to tools that can query the user's expense data. Use these tools to answer their questions accurately.
-
-When the user asks about spending, categories, or expenses:
-1. Use the appropriate tool(s) to get the data
-2. Provide a clear, natural language response
-3. Include specific numbers and details from the tools
-
-Valid expense categories are: Housing, Transportation, Food, Utilities, Insurance, Medical/Healthcare, Savings, Debt, Education, Entertainment, Other
-
-Be concise but informative. Format currency as $XX.XX."""),
+        inputs = {"input": message}
+        mode = "tools"
+        messages = [("system", COMPACT_TOOLS_SYSTEM_PROMPT if self.compact else TOOLS_SYSTEM_PROMPT)]
+        if self.snapshot_mode:
+            try:
+                snapshot = self.db.get_spending_snapshot(user_id, self.snapshot_recent_limit)
+                inputs["snapshot"] = render_snapshot(snapshot)
+                messages = [
+                    ("system", COMPACT_SNAPSHOT_SYSTEM_PROMPT if self.compact else SNAPSHOT_SYSTEM_PROMPT),
+                    ("system", SNAPSHOT_MESSAGE),
+                ]
+                mode = "snapshot"
+            except Exception as e:
+                print(f"Error building spending snapshot, using tools only: {e}")
+        
+        prompt = ChatPromptTemplate.from_messages(messages + [
             ("user", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
         
         # Create agent
         agent = create_openai_tools_agent(self.llm, tools, prompt)
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+        agent_executor = ParallelToolsAgentExecutor(agent=agent, tools=tools, verbose=True)
         
         # Execute query
+        counter = LLMCallCounter()
+        start = time.perf_counter()
         try:
-            result = agent_executor.invoke({"input": message})
-            return result["output"]
+            result = agent_executor.invoke(
+                inputs,
+                config={"callbacks": [counter, TokenUsageCallback("query_agent", user_id), DeadlineCallback()]}
+            )
+            return True, result["output"]
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error executing query agent: {e}")
-            return "Sorry, I encountered an error processing your query. Please try again."
+            return False, "Sorry, I encountered an error processing your query. Please try again."
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"[QUERY_AGENT] mode={mode} llm_turns={counter.calls} latency={elapsed_ms:.0f} ms")
+            metrics.observe("query_llm_turns", counter.calls, mode=mode)
+            metrics.observe("query_latency_ms", elapsed_ms, mode=mode)
 
 
 # Singleton instance
 from src.database import db
-query_agent = QueryAgent(db)
-
+from src.analytics import expense_analytics
+query_agent = QueryAgent(db, analytics=expense_analytics)
@@ -0,0 +1,68 @@
+"""Per-request count of executed database queries (for traffic capture and replays)."""
+import contextvars
+import threading
+from typing import Dict, Optional, Type
+import psycopg2.extensions
+
+
+class QueryCount:
+    """Thread-safe counter shared by every thread working on one request."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def increment(self) -> None:
+        with self._lock:
+            self.value += 1
+
+
+# Counter of the request being processed (None = not counting)
+_query_count: contextvars.ContextVar[Optional[QueryCount]] = contextvars.ContextVar("query_count", default=None)
+
+
+def start_query_count() -> QueryCount:
+    """Count the queries run from the current context (and contexts copied from it)."""
+    count = QueryCount()
+    _query_count.set(count)
+    return count
+
+
+class _CountingCursorMixin:
+    def execute(self, query, vars=None):
+        count = _query_count.get()
+        if count is not None:
+            count.increment()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        count = _query_count.get()
+        if count is not None:
+            count.increment()
+        return super().executemany(query, vars_list)
+
+
+_cursor_classes: Dict[type, Type] = {}
+
+
+def _counting_cursor(factory: type) -> Type:
+    cls = _cursor_classes.get(factory)
+    if cls is None:
+        cls = type(f"Counting{factory.__name__}", (_CountingCursorMixin, factory), {})
+        _cursor_classes[factory] = cls
+    return cls
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection whose cursors (of any cursor_factory) count their queries.
+
+    Pass it as connection_factory; queries are only counted while a
+    start_query_count() counter is active, otherwise the overhead is one
+    context variable lookup per query.
+    """
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _counting_cursor(factory)
+        return super().cursor(*args, **kwargs)
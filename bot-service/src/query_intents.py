@@ -0,0 +1,211 @@
+"""Deterministic matcher for common spending questions (English and Spanish)."""
+import re
+import unicodedata
+from typing import Literal, Optional, List, Tuple
+from pydantic import BaseModel
+
+
+IntentKind = Literal["total", "breakdown", "recent", "summary"]
+Language = Literal["en", "es"]
+
+
+class QueryIntent(BaseModel):
+    """A spending question that can be answered without the LLM agent."""
+    kind: IntentKind
+    language: Language
+    category: Optional[str] = None
+    days: int = 30
+    limit: int = 10
+    period: Literal["week", "month"] = "month"
+    offset: int = 0  # summary: 0 = current period, 1 = previous one
+
+
+# Aliases (normalized: lowercase, no accents) mapped to the valid categories
+CATEGORY_ALIASES = {
+    "housing": "Housing", "rent": "Housing", "home": "Housing",
+    "vivienda": "Housing", "alquiler": "Housing", "casa": "Housing",
+    "transportation": "Transportation", "transport": "Transportation",
+    "transporte": "Transportation",
+    "food": "Food", "comida": "Food", "comidas": "Food", "alimentos": "Food",
+    "utilities": "Utilities", "servicios": "Utilities",
+    "insurance": "Insurance", "seguro": "Insurance", "seguros": "Insurance",
+    "medical": "Medical/Healthcare", "healthcare": "Medical/Healthcare",
+    "health": "Medical/Healthcare", "medical/healthcare": "Medical/Healthcare",
+    "salud": "Medical/Healthcare", "medico": "Medical/Healthcare",
+    "savings": "Savings", "ahorro": "Savings", "ahorros": "Savings",
+    "debt": "Debt", "deuda": "Debt", "deudas": "Debt",
+    "education": "Education", "educacion": "Education",
+    "entertainment": "Entertainment", "entretenimiento": "Entertainment",
+    "ocio": "Entertainment",
+    "other": "Other", "otros": "Other", "otro": "Other",
+}
+
+# Spanish display names of the valid categories
+CATEGORY_NAMES_ES = {
+    "Housing": "vivienda",
+    "Transportation": "transporte",
+    "Food": "comida",
+    "Utilities": "servicios",
+    "Insurance": "seguros",
+    "Medical/Healthcare": "salud",
+    "Savings": "ahorros",
+    "Debt": "deudas",
+    "Education": "educación",
+    "Entertainment": "entretenimiento",
+    "Other": "otros",
+}
+
+UNIT_DAYS = {
+    "day": 1, "week": 7, "month": 30, "year": 365,
+    "dia": 1, "semana": 7, "mes": 30, "ano": 365,
+}
+
+MAX_RECENT_LIMIT = 50
+
+# Optional "n" group is a count (1 without it: "last week" is the last 7 days), "unit" a key of UNIT_DAYS
+PERIOD_PATTERNS: List[re.Pattern] = [
+    re.compile(r"\b(?:(?:in|during|over|for) )?(?:the )?(?:last|past) (?:(?P<n>\d+) )?(?P<unit>day|week|month|year)s?\b"),
+    re.compile(r"\b(?:(?:in|during|for) )?(?:this|the current) (?P<unit>week|month|year)\b"),
+    re.compile(r"\btoday\b"),
+    re.compile(r"\b(?:en )?(?:los |las |la |el )?ultim[oa]s? (?:(?P<n>\d+) )?(?P<unit>dia|semana|mes|ano)(?:es|s)?\b"),
+    re.compile(r"\b(?:en )?(?:la |el )?(?P<unit>semana|mes|ano) pasad[oa]\b"),
+    re.compile(r"\b(?:en )?(?:esta|este) (?P<unit>semana|mes|ano)\b"),
+    re.compile(r"\bhoy\b"),
+]
+
+_CAT = r"(?P<cat>[a-z/ ]+?)"
+
+TOTAL_PATTERNS: List[Tuple[re.Pattern, Language]] = [
+    (re.compile(rf"^how much (?:did|have|do) i (?:spend|spent)(?: in total)?(?: (?:on|for) {_CAT})?$"), "en"),
+    (re.compile(rf"^how much (?:on|for) {_CAT}$"), "en"),
+    (re.compile(rf"^(?:whats |what is )?my total(?: spending| spent| expenses)?(?: (?:on|for) {_CAT})?$"), "en"),
+    (re.compile(rf"^total(?: spending| spent| expenses)?(?: (?:on|for) {_CAT})?$"), "en"),
+    (re.compile(rf"^cuanto (?:me gaste|gaste|he gastado|llevo gastado|gasto)(?: en total)?(?: en {_CAT})?$"), "es"),
+    (re.compile(rf"^cuanto (?:en|de) {_CAT}$"), "es"),
+    (re.compile(rf"^(?:cual es )?mi (?:gasto )?total(?: de gastos)?(?: en {_CAT})?$"), "es"),
+    (re.compile(rf"^total(?: de gastos| gastado)?(?: en {_CAT})?$"), "es"),
+]
+
+BREAKDOWN_PATTERNS: List[Tuple[re.Pattern, Language]] = [
+    (re.compile(r"^(?:(?:show|give|get)(?: me)? )?(?:my |a |the )?(?:spending |expense |expenses )?breakdown(?: by category)?$"), "en"),
+    (re.compile(r"^(?:(?:show|list)(?: me)? )?(?:my )?(?:spending|expenses) (?:by|per) category$"), "en"),
+    (re.compile(r"^(?:(?:muestrame|dame|ver) )?(?:mi |el |un )?desglose(?: de (?:mis )?gastos)?(?: por categoria)?$"), "es"),
+    (re.compile(r"^(?:(?:muestrame|dame|ver) )?(?:mis )?gastos por categoria$"), "es"),
+]
+
+RECENT_PATTERNS: List[Tuple[re.Pattern, Language]] = [
+    (re.compile(r"^(?:(?:(?:show|list|get|give)(?: me)?|what are) )?(?:my |the )?(?:last|latest|recent|most recent) (?:(?P<n>\d+) )?(?:expenses|purchases|transactions)$"), "en"),
+    (re.compile(r"^(?:(?:show|list)(?: me)? )?my recent (?:expenses|purchases|transactions)$"), "en"),
+    (re.compile(r"^(?:(?:muestrame|dame|lista|ver|cuales son) )?(?:mis |los )?(?:ultimos|recientes) (?:(?P<n>\d+) )?gastos(?: recientes)?$"), "es"),
+    (re.compile(r"^(?:(?:muestrame|dame|ver) )?mis gastos recientes$"), "es"),
+]
+
+# Summary requests: "unit" is a key of SUMMARY_UNITS, "when" of SUMMARY_PREVIOUS (if previous period)
+SUMMARY_PATTERNS: List[Tuple[re.Pattern, Language]] = [
+    (re.compile(r"^(?:(?:show|give|get|send)(?: me)? )?(?:my |the |a )?(?:(?P<when>this|last|previous) )?(?P<unit>week|month)(?:s|ly)? (?:summary|report|recap)$"), "en"),
+    (re.compile(r"^(?:(?:show|give|get|send)(?: me)? )?(?:my |the |a )?(?:summary|report|recap) (?:for|of) (?:the )?(?:(?P<when>this|last|previous) )?(?P<unit>week|month)$"), "en"),
+    (re.compile(r"^(?:(?:muestrame|dame|ver|mandame) )?(?:mi |el |un )?(?:resumen|reporte|informe) (?P<unit>semanal|mensual)$"), "es"),
+    (re.compile(r"^(?:(?:muestrame|dame|ver|mandame) )?(?:mi |el |un )?(?:resumen|reporte|informe) (?:del|de (?:la|este|esta)) (?P<unit>semana|mes)(?: (?P<when>pasad[oa]|anterior))?$"), "es"),
+]
+
+SUMMARY_UNITS = {
+    "week": "week", "month": "month",
+    "semana": "week", "semanal": "week", "mes": "month", "mensual": "month",
+}
+SUMMARY_PREVIOUS = {"last", "previous", "pasado", "pasada", "anterior"}
+
+
+def normalize_text(message: str) -> str:
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s/]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class QueryIntentMatcher:
+    """Maps common spending questions to a QueryIntent without calling an LLM."""
+
+    def _extract_period(self, text: str) -> Tuple[str, Optional[int]]:
+        """Remove a time-period expression from the text and return its length in days."""
+        for pattern in PERIOD_PATTERNS:
+            match = pattern.search(text)
+            if not match:
+                continue
+            groups = match.groupdict()
+            unit_days = UNIT_DAYS[groups["unit"]] if groups.get("unit") else 1
+            count = int(groups["n"]) if groups.get("n") else 1
+            remaining = (text[:match.start()] + " " + text[match.end():]).strip()
+            return re.sub(r"\s+", " ", remaining), unit_days * count
+        return text, None
+
+    def _resolve_category(self, raw: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Resolve a captured category phrase. Returns (recognized, category)."""
+        if not raw:
+            return True, None
+        raw = re.sub(r"^(?:the|my|la|el|los|las|mi|mis) ", "", raw.strip())
+        category = CATEGORY_ALIASES.get(raw)
+        return category is not None, category
+
+    def match(self, message: str) -> Optional[QueryIntent]:
+        """
+        Match a message against the known spending question patterns.
+
+        Args:
+            message: The raw user message
+
+        Returns:
+            QueryIntent if the question is a common one, None if it needs the agent
+        """
+        normalized = normalize_text(message)
+        for pattern, language in SUMMARY_PATTERNS:
+            match = pattern.match(normalized)
+            if match:
+                return QueryIntent(
+                    kind="summary",
+                    language=language,
+                    period=SUMMARY_UNITS[match.group("unit")],
+                    offset=1 if match.groupdict().get("when") in SUMMARY_PREVIOUS else 0
+                )
+        
+        text, days = self._extract_period(normalized)
+        if not text:
+            return None
+
+        for pattern, language in TOTAL_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                recognized, category = self._resolve_category(match.groupdict().get("cat"))
+                if not recognized:
+                    # Probably a keyword ("pizza"), leave it to the agent
+                    return None
+                return QueryIntent(
+                    kind="total",
+                    language=language,
+                    category=category,
+                    days=days or 30
+                )
+
+        for pattern, language in BREAKDOWN_PATTERNS:
+            if pattern.match(text):
+                return QueryIntent(kind="breakdown", language=language, days=days or 30)
+
+        if days is not None:
+            # Recent expenses are not time-bounded
+            return None
+
+        for pattern, language in RECENT_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                limit = int(match.group("n")) if match.groupdict().get("n") else 10
+                return QueryIntent(
+                    kind="recent",
+                    language=language,
+                    limit=max(1, min(limit, MAX_RECENT_LIMIT))
+                )
+
+        return None
+
+
+# Singleton instance
+query_intent_matcher = QueryIntentMatcher()
@@ -0,0 +1,190 @@
+"""Read-replica selection with health checks and read-your-writes tracking."""
+import asyncio
+import itertools
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import psycopg2
+from src.query_counter import CountingConnection
+
+
+class Replica:
+    """A read replica and its health state."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.healthy = True
+        self.retry_at = 0.0
+        self.lag_seconds: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        """DSN without credentials, for logging."""
+        if "@" in self.dsn:
+            return self.dsn.split("@")[-1]
+        return re.sub(r"password=\S+\s*", "", self.dsn).strip()
+
+
+class ReplicaRouter:
+    """
+    Picks a healthy replica (round-robin) for read-only queries.
+
+    A replica that fails to connect, or lags more than max_lag_seconds, is taken
+    out of rotation for retry_seconds. After a user writes, their reads only go
+    to a replica whose replay LSN has reached the write's LSN; otherwise they
+    fall back to the primary.
+
+    Write LSNs are kept in this process's memory only: a read served by another
+    process (another uvicorn worker or service instance, or its inbound queue
+    worker) doesn't know about the write and may use a replica that has not
+    replayed it yet. Route a user's requests to one process when that matters.
+    """
+
+    def __init__(
+        self,
+        dsns: List[str],
+        max_lag_seconds: float = 10.0,
+        retry_seconds: float = 30.0,
+        read_your_writes_seconds: float = 30.0,
+        catchup_timeout_ms: int = 200
+    ):
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self.max_lag_seconds = max_lag_seconds
+        self.retry_seconds = retry_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.catchup_timeout_ms = catchup_timeout_ms
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        # user_id -> (write LSN, monotonic time of the write), oldest write first
+        self._pending_writes: Dict[int, Tuple[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def record_write(self, user_id: int, lsn: str) -> None:
+        """Remember the LSN of a user's last write, forgetting writes older than the window."""
+        now = time.monotonic()
+        with self._lock:
+            # Re-inserted so the dict stays ordered by write time
+            self._pending_writes.pop(user_id, None)
+            self._pending_writes[user_id] = (lsn, now)
+            for expired_user, (_, written_at) in list(self._pending_writes.items()):
+                if now - written_at <= self.read_your_writes_seconds:
+                    break
+                del self._pending_writes[expired_user]
+
+    def pending_write_lsn(self, user_id: Optional[int]) -> Optional[str]:
+        """LSN a replica must have replayed before serving this user, if any."""
+        if user_id is None:
+            return None
+        with self._lock:
+            pending = self._pending_writes.get(user_id)
+            if not pending:
+                return None
+            lsn, written_at = pending
+            if time.monotonic() - written_at > self.read_your_writes_seconds:
+                del self._pending_writes[user_id]
+                return None
+            return lsn
+
+    def mark_down(self, replica: Replica, reason: str) -> None:
+        """Take a replica out of rotation for retry_seconds."""
+        with self._lock:
+            replica.healthy = False
+            replica.retry_at = time.monotonic() + self.retry_seconds
+        print(f"[REPLICAS] {replica.name} marked down: {reason}")
+
+    def candidates(self) -> List[Replica]:
+        """Healthy replicas in round-robin order (empty if none)."""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._cycle)
+            ordered = self.replicas[start:] + self.replicas[:start]
+            return [r for r in ordered if r.healthy or now >= r.retry_at]
+
+    def connect(self, user_id: Optional[int] = None):
+        """
+        Open a connection to a suitable replica.
+
+        Args:
+            user_id: User the read is for (enables read-your-writes checks)
+
+        Returns:
+            A psycopg2 connection, or None if the primary should be used
+        """
+        required_lsn = self.pending_write_lsn(user_id)
+        for replica in self.candidates():
+            try:
+                conn = psycopg2.connect(replica.dsn, connect_timeout=2, connection_factory=CountingConnection)
+            except psycopg2.Error as e:
+                self.mark_down(replica, str(e).strip())
+                continue
+
+            replica.healthy = True
+            if required_lsn and not self._wait_for_lsn(conn, required_lsn):
+                conn.close()
+                continue
+            return conn
+        return None
+
+    def _wait_for_lsn(self, conn, lsn: str) -> bool:
+        """Wait up to catchup_timeout_ms for the replica to replay the given LSN."""
+        deadline = time.monotonic() + self.catchup_timeout_ms / 1000
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    "SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, FALSE)",
+                    (lsn,)
+                )
+                caught_up = cursor.fetchone()[0]
+                conn.rollback()
+                if caught_up or time.monotonic() >= deadline:
+                    return caught_up
+                time.sleep(0.02)
+
+    def check_health(self) -> None:
+        """Actively check every replica's availability and replication lag."""
+        for replica in self.replicas:
+            try:
+                conn = psycopg2.connect(replica.dsn, connect_timeout=2, connection_factory=CountingConnection)
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            """
+                            SELECT CASE
+                                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+                            END
+                            """
+                        )
+                        replica.lag_seconds = float(cursor.fetchone()[0])
+                finally:
+                    conn.close()
+            except psycopg2.Error as e:
+                self.mark_down(replica, str(e).strip())
+                continue
+
+            if replica.lag_seconds > self.max_lag_seconds:
+                self.mark_down(replica, f"lag {replica.lag_seconds:.1f}s")
+            else:
+                replica.healthy = True
+
+    async def run_forever(self, interval_seconds: int) -> None:
+        """Run check_health every interval_seconds."""
+        while True:
+            try:
+                await asyncio.to_thread(self.check_health)
+            except Exception as e:
+                print(f"Error checking replica health: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def status(self) -> List[Dict]:
+        """Health summary for each replica."""
+        return [
+            {"replica": r.name, "healthy": r.healthy, "lag_seconds": r.lag_seconds}
+            for r in self.replicas
+        ]
@@ -0,0 +1,204 @@
+"""Precomputed weekly/monthly spending reports: scheduling, rendering and Telegram push."""
+import asyncio
+import threading
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+from src.database import Database, REPORT_PERIODS
+from src.config import get_settings
+from src.metrics import metrics
+from src.query_intents import CATEGORY_NAMES_ES
+from src.telegram import send_telegram_message, telegram_enabled
+
+
+PERIOD_LABELS = {
+    "en": {
+        "week": ("this week", "last week", "previous week"),
+        "month": ("this month", "last month", "previous month"),
+    },
+    "es": {
+        "week": ("esta semana", "la semana pasada", "la semana anterior"),
+        "month": ("este mes", "el mes pasado", "el mes anterior"),
+    },
+}
+
+
+def period_start(period: str, day: date, offset: int = 0) -> date:
+    """
+    First day of the week (Monday) or month containing a day.
+
+    Args:
+        period: "week" or "month"
+        day: Reference day
+        offset: Number of periods to go back (1 = the previous period)
+    """
+    if period == "week":
+        return day - timedelta(days=day.weekday() + 7 * offset)
+    month_index = day.year * 12 + day.month - 1 - offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def render_report(report: Optional[Dict], period: str, language: str = "en", offset: int = 0) -> str:
+    """
+    Render a spending report as a templated message.
+
+    Args:
+        report: Report dict from Database.get_spending_report (or None)
+        period: "week" or "month"
+        language: "en" or "es"
+        offset: 0 for the current period, 1 for the previous one (used in the title)
+    """
+    spanish = language == "es"
+    labels = PERIOD_LABELS[language][period]
+    label, previous_label = labels[offset], labels[2]
+
+    if not report or not report["expense_count"]:
+        if spanish:
+            return f"No se encontraron gastos en {label}."
+        return f"No expenses found {label}."
+
+    total = float(report["total"])
+    previous_total = float(report["previous_total"])
+    start = report["period_start"].strftime("%Y-%m-%d")
+    end = report["period_end"].strftime("%Y-%m-%d")
+
+    if spanish:
+        # "de el mes" contracts to "del mes"
+        title = f"de {label}".replace("de el ", "del ")
+        lines = [f"Reporte de gastos {title} ({start} a {end}):\n"]
+        lines.append(f"Total: ${total:.2f} ({report['expense_count']} gastos)")
+    else:
+        lines = [f"Spending report for {label} ({start} to {end}):\n"]
+        lines.append(f"Total: ${total:.2f} ({report['expense_count']} expenses)")
+
+    if previous_total > 0:
+        delta = total - previous_total
+        percent = delta / previous_total * 100
+        if spanish:
+            direction = "más" if delta >= 0 else "menos"
+            lines.append(f"${abs(delta):.2f} {direction} que {previous_label} ({percent:+.0f}%)")
+        else:
+            direction = "up" if delta >= 0 else "down"
+            lines.append(f"{direction} ${abs(delta):.2f} from the {previous_label} ({percent:+.0f}%)")
+
+    lines.append("\nPor categoría:" if spanish else "\nBy category:")
+    for item in report["categories"]:
+        category = item["category"]
+        if spanish:
+            category = CATEGORY_NAMES_ES.get(category, category).capitalize()
+        lines.append(f"- {category}: ${float(item['total']):.2f} ({item['count']})")
+
+    lines.append("\nGastos más grandes:" if spanish else "\nTop expenses:")
+    for item in report["top_items"]:
+        category = item["category"]
+        if spanish:
+            category = CATEGORY_NAMES_ES.get(category, category)
+        lines.append(f"- {item['description']}: ${float(item['amount']):.2f} ({category})")
+    return "\n".join(lines)
+
+
+class ReportScheduler:
+    """
+    Keeps the spending_reports table up to date.
+
+    At startup and whenever a week or month boundary is crossed, the reports of
+    the period that just closed and the new current period are regenerated for
+    all users in one set-based pass per database. In between, users who added
+    expenses are marked dirty and their current-period reports are refreshed
+    in one batch every interval. Finished-period reports can optionally be
+    pushed to users on Telegram, once per boundary: the last pushed period is
+    kept in report_pushes, so a restart mid-period doesn't push again.
+
+    Periods follow the database's clock (Database.get_current_date), like the
+    expense timestamps the reports are computed from.
+    """
+
+    def __init__(self, database: Database):
+        """
+        Initialize the report scheduler.
+
+        Args:
+            database: Database instance for data operations
+        """
+        settings = get_settings()
+        self.db = database
+        self.interval_seconds = settings.report_refresh_interval_seconds
+        self.top_items = settings.report_top_items
+        self.push_enabled = settings.report_push_enabled and telegram_enabled()
+        self._current: Dict[str, date] = {}
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def mark_dirty(self, user_id: int) -> None:
+        """Schedule a refresh of a user's current reports (call after adding an expense)."""
+        with self._lock:
+            self._dirty.add(user_id)
+
+    def run_once(self, today: Optional[date] = None) -> None:
+        """Generate reports for new periods, then refresh dirty users."""
+        today = today or self.db.get_current_date()
+        for period in REPORT_PERIODS:
+            start = period_start(period, today)
+            if self._current.get(period) == start:
+                continue
+            previous = period_start(period, today, offset=1)
+            written = 0
+            for day in (previous, start):
+                written += self.db.refresh_spending_reports(period, day, top_items=self.top_items)
+            print(f"[REPORTS] Generated {written} {period}ly report(s) for {previous} and {start}")
+            self._current[period] = start
+            if self.push_enabled and self.db.claim_report_push(period, previous):
+                self.push_reports(period, previous)
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        try:
+            for period, start in self._current.items():
+                self.db.refresh_spending_reports(period, start, user_ids=sorted(dirty), top_items=self.top_items)
+            metrics.increment("reports_refreshed", len(dirty))
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+
+    def push_reports(self, period: str, start: date) -> int:
+        """
+        Send the finished reports of a period that were not sent yet to their users on Telegram.
+
+        Returns:
+            Number of messages sent
+        """
+        reports = self.db.claim_unsent_reports(period, start)
+        if not reports:
+            return 0
+        telegram_ids = self.db.get_telegram_ids([report["user_id"] for report in reports])
+
+        sent = 0
+        for report in reports:
+            telegram_id = telegram_ids.get(report["user_id"])
+            if not telegram_id:
+                continue
+            try:
+                send_telegram_message(telegram_id, render_report(report, period, offset=1))
+                sent += 1
+            except Exception as e:
+                print(f"Error pushing report to user {report['user_id']}: {e}")
+
+        print(f"[REPORTS] Pushed {sent}/{len(reports)} {period}ly report(s) for {start}")
+        metrics.increment("reports_pushed", sent, period=period)
+        return sent
+
+    async def run_forever(self) -> None:
+        """Run at startup and then every configured interval."""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Error refreshing spending reports: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+# Singleton instance
+from src.database import db
+report_scheduler = ReportScheduler(db)
@@ -2,26 +2,44 @@
 from typing import Tuple, Optional
 from src.database import Database
 from src.expense_parser import ExpenseParser, ExpenseInfo
+from src.category_predictor import CategoryPredictor
+from src.reports import ReportScheduler
+from src.analytics import ExpenseAnalytics
+from src.admission import check_deadline
 
 
 class ExpenseService:
     """Service for handling expense-related business logic."""
     
-    def __init__(self, database: Database, parser: ExpenseParser):
+    def __init__(
+        self,
+        database: Database,
+        parser: ExpenseParser,
+        predictor: CategoryPredictor,
+        reports: ReportScheduler,
+        analytics: ExpenseAnalytics
+    ):
         """
         Initialize the expense service.
         
         Args:
             database: Database instance for data operations
             parser: ExpenseParser instance for message parsing
+            predictor: CategoryPredictor updated with each saved expense
+            reports: ReportScheduler notified of each saved expense
+            analytics: ExpenseAnalytics updated with each saved expense
         """
         self.db = database
         self.parser = parser
+        self.predictor = predictor
+        self.reports = reports
+        self.analytics = analytics
     
     def process_message(
         self, 
         telegram_id: str, 
-        message: str
+        message: str,
+        strict: bool = False
     ) -> Tuple[bool, str, Optional[int]]:
         """
         Process a message from a Telegram user.
@@ -34,6 +52,7 @@ class ExpenseService:
         Args:
             telegram_id: The Telegram user ID
             message: The message text to process
+            strict: Raise LLMUnavailable when the parser's LLM call fails
         
         Returns:
             Tuple of (success, message, http_status_code)
@@ -47,22 +66,28 @@ class ExpenseService:
             return False, "User not authorized", 403
         
         # 2. Parse the message
-        expense_info = self.parser.parse_message(message)
+        expense_info = self.parser.parse_message(message, user_id=user_id, strict=strict)
         
         if not expense_info:
             # Not an expense message - this is OK, just return success=false
             return False, "Not an expense message", None
         
-        # 3. Save to database
+        # 3. Save to database (unless the caller has already given up)
+        check_deadline()
         try:
-            success = self.db.add_expense(
+            version = self.db.add_expense(
                 user_id=user_id,
                 description=expense_info.description,
                 amount=expense_info.amount,
                 category=expense_info.category
             )
             
-            if success:
+            if version is not None:
+                self.predictor.learn(user_id, expense_info.description, expense_info.category)
+                self.reports.mark_dirty(user_id)
+                self.analytics.record(
+                    user_id, version, expense_info.amount, expense_info.category, expense_info.description
+                )
                 return True, expense_info.confirmation_message, None
             else:
                 return False, "Failed to save expense", 500
@@ -75,6 +100,9 @@ class ExpenseService:
 # Singleton instance
 from src.database import db
 from src.expense_parser import expense_parser
+from src.category_predictor import category_predictor
+from src.reports import report_scheduler
+from src.analytics import expense_analytics
 
-expense_service = ExpenseService(db, expense_parser)
+expense_service = ExpenseService(db, expense_parser, category_predictor, report_scheduler, expense_analytics)
 
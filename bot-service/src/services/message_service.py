@@ -0,0 +1,83 @@
+"""Business logic for routing an incoming message to the right service."""
+from typing import Tuple, Optional
+from src.message_router import MessageRouter
+from src.services.expense_service import ExpenseService
+from src.services.query_service import QueryService
+from src.admission import Ticket, check_deadline
+
+
+HELP_MESSAGE = (
+    "I can help you track expenses and answer questions about your spending. "
+    "Try: 'Pizza 20 bucks' or 'How much did I spend on food?'"
+)
+
+
+class MessageService:
+    """Service that classifies a message and delegates it to the expense or query service."""
+
+    def __init__(self, router: MessageRouter, expenses: ExpenseService, queries: QueryService):
+        """
+        Initialize the message service.
+
+        Args:
+            router: MessageRouter instance for classification
+            expenses: ExpenseService instance for expense messages
+            queries: QueryService instance for queries
+        """
+        self.router = router
+        self.expenses = expenses
+        self.queries = queries
+
+    def process_message(
+        self,
+        telegram_id: str,
+        user_id: int,
+        message: str,
+        ticket: Optional[Ticket] = None,
+        strict: bool = False
+    ) -> Tuple[bool, str, Optional[int]]:
+        """
+        Classify a message and process it (blocking).
+
+        Args:
+            telegram_id: The Telegram user ID
+            user_id: The user's database ID
+            message: The message text
+            ticket: Admission ticket, promoted once the message is classified
+            strict: Raise LLMUnavailable when an LLM call fails (so the message can be retried)
+
+        Returns:
+            Tuple of (success, response_message, http_status_code)
+        """
+        # 1. Classify the message type
+        message_type = self.router.classify(message, user_id=user_id, strict=strict)
+        check_deadline()
+
+        # Expenses keep the slot they were admitted with; queries may be shed here
+        if ticket is not None:
+            ticket.promote(message_type)
+
+        # 2. Route to appropriate service
+        if message_type == "expense":
+            return self.expenses.process_message(
+                telegram_id=telegram_id,
+                message=message,
+                strict=strict
+            )
+
+        if message_type == "query":
+            return self.queries.process_query(
+                telegram_id=telegram_id,
+                message=message
+            )
+
+        # Other messages (greetings, etc.)
+        return False, HELP_MESSAGE, None
+
+
+# Singleton instance
+from src.message_router import message_router
+from src.services.expense_service import expense_service
+from src.services.query_service import query_service
+
+message_service = MessageService(message_router, expense_service, query_service)
@@ -2,21 +2,25 @@
 from typing import Tuple, Optional
 from src.database import Database
 from src.query_agent import QueryAgent
+from src.answer_cache import AnswerCache
+from src.admission import DeadlineExceeded
 
 
 class QueryService:
     """Service for handling query-related business logic."""
     
-    def __init__(self, database: Database, agent: QueryAgent):
+    def __init__(self, database: Database, agent: QueryAgent, cache: AnswerCache):
         """
         Initialize the query service.
         
         Args:
             database: Database instance for data operations
             agent: QueryAgent instance for processing queries
+            cache: AnswerCache for repeated questions
         """
         self.db = database
         self.agent = agent
+        self.cache = cache
     
     def process_query(
         self, 
@@ -38,11 +42,22 @@ class QueryService:
         if not user_id:
             return False, "User not authorized", 403
         
-        # 2. Process query with agent
+        # 2. Process query with agent, unless the same question was answered since the last expense
         try:
-            response = self.agent.query(user_id, message)
+            key = self.cache.key(user_id, message) if self.cache.enabled else None
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return True, cached, None
+            
+            answered, response = self.agent.query(user_id, message)
+            if answered and key is not None:
+                # Error apologies are not cached, so the question is tried again
+                self.cache.put(key, response)
             return True, response, None
         
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error processing query: {e}")
             return False, "Sorry, I encountered an error processing your query.", 500
@@ -51,6 +66,7 @@ class QueryService:
 # Singleton instance
 from src.database import db
 from src.query_agent import query_agent
+from src.answer_cache import answer_cache
 
-query_service = QueryService(db, query_agent)
+query_service = QueryService(db, query_agent, answer_cache)
 
@@ -0,0 +1,170 @@
+"""User-sharded expense storage: consistent-hash placement, directory and per-shard pools."""
+import bisect
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from psycopg2.pool import ThreadedConnectionPool
+from src.query_counter import CountingConnection
+
+
+class ConsistentHashRing:
+    """Consistent-hash ring mapping user IDs to shard IDs."""
+
+    def __init__(self, shard_ids: List[int], vnodes: int = 100):
+        self._ring: List[Tuple[int, int]] = sorted(
+            (self._hash(f"shard-{shard_id}-{vnode}"), shard_id)
+            for shard_id in shard_ids
+            for vnode in range(vnodes)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def shard_for(self, user_id: int) -> int:
+        """Shard a user is placed on by default."""
+        index = bisect.bisect(self._keys, self._hash(f"user-{user_id}")) % len(self._ring)
+        return self._ring[index][1]
+
+
+class TTLCache:
+    """Small thread-safe dict with per-entry expiry."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._data: Dict = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Sentinel cached for telegram IDs that are not whitelisted
+NOT_WHITELISTED = -1
+
+
+class ShardRouter:
+    """
+    Routes a user's expense queries to the shard that stores them.
+
+    Shard IDs are positions in DATABASE_SHARD_URLS, so the list must only be
+    appended to. The user_shards directory table on the primary is the source
+    of truth; users without an entry are placed with the consistent-hash ring
+    and recorded on first access. Directory lookups are cached.
+    """
+
+    def __init__(
+        self,
+        dsns: List[str],
+        pool_min_connections: int = 1,
+        pool_max_connections: int = 10,
+        directory_ttl_seconds: float = 300.0
+    ):
+        self.dsns = dsns
+        self.ring = ConsistentHashRing(list(range(len(dsns)))) if dsns else None
+        self.pool_min_connections = pool_min_connections
+        self.pool_max_connections = pool_max_connections
+        self.directory = TTLCache(directory_ttl_seconds)
+        self._pools: Dict[int, ThreadedConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.dsns)
+
+    @property
+    def shard_ids(self) -> List[int]:
+        return list(range(len(self.dsns)))
+
+    def _pool(self, shard_id: int) -> ThreadedConnectionPool:
+        """Connection pool of a shard (created on first use)."""
+        pool = self._pools.get(shard_id)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(shard_id)
+                if pool is None:
+                    pool = ThreadedConnectionPool(
+                        self.pool_min_connections,
+                        self.pool_max_connections,
+                        self.dsns[shard_id],
+                        connection_factory=CountingConnection
+                    )
+                    self._pools[shard_id] = pool
+        return pool
+
+    @contextmanager
+    def connection(self, shard_id: int):
+        """Context manager for a pooled shard connection."""
+        pool = self._pool(shard_id)
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            if not conn.closed:
+                conn.rollback()
+            raise e
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def resolve(self, user_id: int, primary_connection) -> int:
+        """
+        Shard ID of a user, from the directory cache, the directory table, or the ring.
+
+        Args:
+            user_id: User ID
+            primary_connection: Callable returning a context manager for a primary connection
+
+        Returns:
+            The user's shard ID
+        """
+        shard_id = self.directory.get(user_id)
+        if shard_id is not None:
+            return shard_id
+
+        with primary_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO user_shards (user_id, shard_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+                    RETURNING shard_id
+                    """,
+                    (user_id, self.ring.shard_for(user_id))
+                )
+                shard_id = cursor.fetchone()[0]
+
+        self.directory.set(user_id, shard_id)
+        return shard_id
+
+    def close(self) -> None:
+        """Close all shard pools."""
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.closeall()
+            self._pools.clear()
@@ -0,0 +1,27 @@
+"""Outgoing Telegram messages (replies sent outside of a /process-message response)."""
+import httpx
+from src.config import get_settings
+
+
+def telegram_enabled() -> bool:
+    """Whether TELEGRAM_BOT_TOKEN is configured."""
+    return bool(get_settings().telegram_bot_token)
+
+
+def send_telegram_message(chat_id: str, text: str) -> None:
+    """
+    Send a message through the Telegram Bot API.
+
+    Args:
+        chat_id: Chat ID (the user's Telegram ID for private chats)
+        text: Message text
+
+    Raises:
+        httpx.HTTPError: If the request fails
+    """
+    response = httpx.post(
+        f"https://api.telegram.org/bot{get_settings().telegram_bot_token}/sendMessage",
+        json={"chat_id": chat_id, "text": text},
+        timeout=10
+    )
+    response.raise_for_status()
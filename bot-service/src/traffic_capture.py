@@ -0,0 +1,210 @@
+"""Opt-in capture of /process-message traffic (PII-scrubbed) with LLM responses and timing, for replays."""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+import httpx
+import openai
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from src.config import get_settings
+from src.llm_usage import token_usage
+from src.query_counter import QueryCount, start_query_count
+from src.traffic_format import llm_call_key, pseudonym, scrub
+
+
+def _role(message: BaseMessage) -> str:
+    if isinstance(message, SystemMessage):
+        return "system"
+    if isinstance(message, HumanMessage):
+        return "user"
+    if isinstance(message, AIMessage):
+        return "assistant"
+    return message.type
+
+
+def _scrub_arguments(call: Dict) -> Dict:
+    return {**call, "arguments": scrub(call.get("arguments"))}
+
+
+class Capture:
+    """What is recorded about one request while it is processed."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.time = time.time()
+        self.started = time.perf_counter()
+        self.queries: QueryCount = start_query_count()
+        self.llm_calls: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_llm_call(self, call: Dict) -> None:
+        with self._lock:
+            self.llm_calls.append(call)
+
+
+class LLMCaptureCallback(BaseCallbackHandler):
+    """Records the key, latency, response and token usage of every chat model call of a request."""
+
+    def __init__(self, capture: Capture):
+        self.capture = capture
+        self._pending: Dict[UUID, Tuple[str, float, List[BaseMessage], Optional[Dict]]] = {}
+
+    def on_chat_model_start(self, serialized, messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any) -> None:
+        pairs = [(_role(message), message.content) for message in messages[0]]
+        self._pending[run_id] = (
+            llm_call_key(pairs), time.perf_counter(), messages[0], kwargs.get("invocation_params")
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        key, started, prompt, invocation_params = pending
+        message = response.generations[0][0].message
+        recorded = {"role": "assistant", "content": scrub(message.content) or None}
+        if message.additional_kwargs.get("tool_calls"):
+            recorded["tool_calls"] = [
+                {**call, "function": _scrub_arguments(call["function"])}
+                for call in message.additional_kwargs["tool_calls"]
+            ]
+        if message.additional_kwargs.get("function_call"):
+            recorded["function_call"] = _scrub_arguments(message.additional_kwargs["function_call"])
+        self.capture.add_llm_call({
+            "key": key,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "message": recorded,
+            # Counted locally for streamed calls, which report none (see llm_usage.token_usage)
+            "usage": token_usage(response, prompt, invocation_params),
+        })
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._pending.pop(run_id, None)
+
+
+# Added by LangChain to every run started while set (see register_configure_hook)
+_llm_capture: contextvars.ContextVar[Optional[LLMCaptureCallback]] = contextvars.ContextVar(
+    "llm_capture", default=None
+)
+register_configure_hook(_llm_capture, inheritable=True)
+
+# X-Replay-Id of the request being replayed (replay mode), forwarded to the LLM stub
+_replay_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("replay_id", default=None)
+
+
+def _forward_replay_id(request: httpx.Request) -> None:
+    replay_id = _replay_id.get()
+    if replay_id:
+        request.headers["X-Replay-Id"] = replay_id
+
+
+class TrafficRecorder:
+    """
+    Captures /process-message requests to a JSONL file for scripts/replay_traffic.py.
+
+    With TRAFFIC_CAPTURE_PATH set, a TRAFFIC_CAPTURE_SAMPLE_RATE share of the
+    requests is appended to the file: pseudonymous user, scrubbed message and
+    response, status, latency, database query count and every LLM call (key,
+    latency, scrubbed response, token usage). Prompts are not stored.
+    Capture stays off unless TRAFFIC_CAPTURE_SALT is set: without a secret salt
+    the pseudonyms could be reversed by hashing every possible Telegram ID.
+
+    Scrubbing (src/traffic_format.scrub) is pattern-based: it replaces emails,
+    URLs, @handles, phone and card numbers (9+ digits) and dot-separated IDs
+    ("30.123.456"). Free text is kept as is, so names, addresses and numbers
+    without separators (a 7-8 digit ID written "30123456") still end up in the
+    capture; treat capture files as personal data.
+
+    TRAFFIC_REPLAY_MODE (for the local bot-service a replay runs against)
+    measures every request and returns the measurements in response headers,
+    and forwards the request's X-Replay-Id on its LLM calls so the stub answers
+    with the calls recorded for that very request.
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.path = settings.traffic_capture_path
+        self.sample_rate = settings.traffic_capture_sample_rate
+        self.salt = settings.traffic_capture_salt
+        self.replay_mode = settings.traffic_replay_mode
+        self._lock = threading.Lock()
+        if self.path and not self.salt:
+            print("[TRAFFIC_CAPTURE] TRAFFIC_CAPTURE_SALT is not set: capture disabled")
+            self.path = ""
+
+    def start(self, replay_id: Optional[str] = None) -> Optional[Capture]:
+        """Start measuring the current request, or return None if it is not captured."""
+        if not self.replay_mode and (not self.path or random.random() >= self.sample_rate):
+            return None
+        if self.replay_mode:
+            _replay_id.set(replay_id)
+        capture = Capture()
+        _llm_capture.set(LLMCaptureCallback(capture))
+        return capture
+
+    def llm_client_kwargs(self) -> Dict[str, Any]:
+        """Extra ChatOpenAI arguments: in replay mode, a client that forwards X-Replay-Id."""
+        if not self.replay_mode:
+            return {}
+        # Only the sync client (all LLM calls are made from worker threads); ChatOpenAI builds the async one
+        client = openai.OpenAI(
+            api_key=get_settings().openai_api_key,
+            base_url=os.getenv("OPENAI_API_BASE"),
+            http_client=httpx.Client(event_hooks={"request": [_forward_replay_id]})
+        )
+        return {"client": client.chat.completions}
+
+    def finish(
+        self,
+        capture: Capture,
+        telegram_id: str,
+        message: str,
+        status_code: int,
+        response: Optional[str],
+        replay_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Record a finished request.
+
+        Returns:
+            Headers to add to the response (replay mode only)
+        """
+        latency_ms = round((time.perf_counter() - capture.started) * 1000, 1)
+        if self.path:
+            record = {
+                "id": capture.id,
+                "replay_id": replay_id,
+                "time": capture.time,
+                "user": pseudonym(telegram_id, self.salt),
+                "message": scrub(message),
+                "status": status_code,
+                "response": scrub(response),
+                "latency_ms": latency_ms,
+                "db_queries": capture.queries.value,
+                "llm_calls": capture.llm_calls,
+            }
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            try:
+                with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error writing traffic capture: {e}")
+
+        if not self.replay_mode:
+            return {}
+        return {
+            "X-DB-Queries": str(capture.queries.value),
+            "X-LLM-Calls": str(len(capture.llm_calls)),
+            "X-Server-Time-Ms": str(latency_ms),
+        }
+
+
+# Singleton instance
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,66 @@
+"""Scrubbing and LLM call keys shared by traffic capture and the replay tools (no settings needed)."""
+import hashlib
+import json
+import re
+from typing import Optional, Sequence, Tuple
+
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+HANDLE_PATTERN = re.compile(r"(?<!\w)@\w{3,}")
+# Digit runs with separators; long enough ones are phone or card numbers, not amounts
+NUMBER_PATTERN = re.compile(r"(?<![\w.,])\+?\d[\d .()-]{6,}\d(?![\w])")
+# 7-8 digits in dot-separated groups: national IDs ("DNI 30.123.456")
+DOTTED_ID_PATTERN = re.compile(r"\d{1,2}\.\d{3}\.\d{3}")
+
+
+def _scrub_number(match: re.Match) -> str:
+    digits = sum(ch.isdigit() for ch in match.group())
+    if digits >= 13:
+        return "<card>"
+    if digits >= 9:
+        return "<phone>"
+    if DOTTED_ID_PATTERN.fullmatch(match.group()):
+        return "<id>"
+    return match.group()
+
+
+def scrub(text: Optional[str]) -> Optional[str]:
+    """Replace emails, URLs, @handles and phone/card/ID numbers with placeholders (idempotent)."""
+    if not text:
+        return text
+    text = EMAIL_PATTERN.sub("<email>", text)
+    text = URL_PATTERN.sub("<url>", text)
+    text = HANDLE_PATTERN.sub("<handle>", text)
+    return NUMBER_PATTERN.sub(_scrub_number, text)
+
+
+def pseudonym(telegram_id: str, salt: str) -> str:
+    """
+    Stable pseudonymous user ID.
+
+    Raises:
+        ValueError: If the salt is empty (Telegram IDs are short enough to brute-force)
+    """
+    if not salt:
+        raise ValueError("A pseudonym needs a secret salt")
+    return "u-" + hashlib.sha256(f"{salt}:{telegram_id}".encode()).hexdigest()[:12]
+
+
+def llm_call_key(messages: Sequence[Tuple[str, str]]) -> str:
+    """
+    Key of an LLM call, used to serve recorded responses in replays.
+
+    Built from the first system message (the static prompt), the last user
+    message (scrubbed) and the number of assistant turns since it, so it does
+    not depend on per-request data such as the spending snapshot or tool results.
+
+    Args:
+        messages: (role, content) pairs with OpenAI roles
+    """
+    system = next((content for role, content in messages if role == "system"), "")
+    last_user = max((i for i, (role, _) in enumerate(messages) if role == "user"), default=-1)
+    user = messages[last_user][1] if last_user >= 0 else ""
+    turn = sum(1 for role, _ in messages[last_user + 1:] if role == "assistant")
+    key = [hashlib.sha256((system or "").encode()).hexdigest(), scrub(user or ""), turn]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
@@ -0,0 +1,18 @@
+"""Test setup: settings that the modules under test read at import time (no database or OpenAI calls are made)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "DATABASE_HOST": "localhost",
+    "DATABASE_NAME": "expense_tracker_test",
+    "DATABASE_USER": "test",
+    "DATABASE_PASSWORD": "test",
+    "OPENAI_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+# Optional features that would touch the network or the filesystem at import time
+for name in ("DATABASE_REPLICA_URLS", "DATABASE_SHARD_URLS", "TRAFFIC_CAPTURE_PATH", "TRAFFIC_REPLAY_MODE"):
+    os.environ.pop(name, None)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.admission import AdmissionController, DeadlineExceeded, Overloaded, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("src.admission.time.monotonic", clock)
+    return clock
+
+
+def test_rate_limiter_allows_a_burst_then_refills(clock):
+    limiter = RateLimiter(per_minute=60, burst=3)
+    assert [limiter.acquire(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert limiter.acquire(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.acquire(1) == 0.0
+
+
+def test_rate_limiter_is_per_user(clock):
+    limiter = RateLimiter(per_minute=60, burst=1)
+    assert limiter.acquire(1) == 0.0
+    assert limiter.acquire(1) > 0
+    assert limiter.acquire(2) == 0.0
+
+
+def test_rate_limiter_disabled(clock):
+    limiter = RateLimiter(per_minute=0, burst=1)
+    assert [limiter.acquire(1) for _ in range(10)] == [0.0] * 10
+
+
+def test_rate_limiter_forgets_least_recent_users(clock):
+    limiter = RateLimiter(per_minute=60, burst=1, max_users=2)
+    for user_id in (1, 2, 3):
+        limiter.acquire(user_id)
+    # User 1 was evicted and starts with a full bucket again
+    assert limiter.acquire(1) == 0.0
+    assert limiter.acquire(3) > 0
+
+
+def test_admit_sheds_when_full():
+    controller = AdmissionController(max_in_flight=2, max_in_flight_queries=1)
+    first, second = controller.admit(), controller.admit()
+    with pytest.raises(Overloaded):
+        controller.admit()
+    first.release()
+    assert controller.admit() is not None
+    second.release()
+
+
+def test_promote_limits_queries_only():
+    controller = AdmissionController(max_in_flight=3, max_in_flight_queries=1)
+    query, other_query, expense = controller.admit(), controller.admit(), controller.admit()
+    query.promote("query")
+    with pytest.raises(Overloaded):
+        other_query.promote("query")
+    expense.promote("expense")
+    assert controller.status()["in_flight"] == 3
+    assert controller.status()["in_flight_queries"] == 1
+
+    query.release()
+    assert controller.status()["in_flight_queries"] == 0
+    other_query.promote("query")
+    assert controller.status()["in_flight_queries"] == 1
+
+
+def test_release_is_idempotent():
+    controller = AdmissionController(max_in_flight=2, max_in_flight_queries=2)
+    ticket = controller.admit()
+    ticket.promote("query")
+    ticket.release()
+    ticket.release()
+    assert controller.status()["in_flight"] == 0
+    assert controller.status()["in_flight_queries"] == 0
+
+
+def test_query_limit_is_capped_by_in_flight_limit():
+    assert AdmissionController(max_in_flight=2, max_in_flight_queries=10).max_in_flight_queries == 2
+
+
+def test_run_releases_the_ticket():
+    controller = AdmissionController(max_in_flight=1, max_in_flight_queries=1)
+    ticket = controller.admit()
+    result = asyncio.run(controller.run(ticket, None, lambda ticket, x: x * 2, 21))
+    assert result == 42
+    assert controller.status()["in_flight"] == 0
+
+
+def test_run_past_the_deadline_keeps_the_slot_until_the_work_finishes():
+    controller = AdmissionController(max_in_flight=1, max_in_flight_queries=1)
+    finish = threading.Event()
+
+    def slow(ticket):
+        finish.wait(5)
+        return "late"
+
+    async def scenario():
+        ticket = controller.admit()
+        with pytest.raises(DeadlineExceeded) as raised:
+            await controller.run(ticket, time.monotonic() + 0.05, slow)
+        assert controller.status()["in_flight"] == 1
+        finish.set()
+        assert await raised.value.work == "late"
+        assert controller.status()["in_flight"] == 0
+
+    asyncio.run(scenario())
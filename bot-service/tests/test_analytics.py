@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+import pytest
+from src.analytics import SECONDS_PER_DAY, UserSeries, day_index
+
+
+TODAY = date(2026, 10, 19)
+
+
+def row(days_ago, amount, category="Food", description="Lunch"):
+    """A get_expense_series row for an expense at noon `days_ago` days before TODAY."""
+    return (day_index(TODAY - timedelta(days=days_ago)) * SECONDS_PER_DAY + 43200, amount, category, description)
+
+
+def series_of(rows, history_start=None):
+    return UserSeries.from_rows(1, sorted(rows), history_start=history_start)
+
+
+def test_trend_compares_with_previous_windows():
+    rows = [row(days_ago, 10) for days_ago in range(30, 120)] + [row(days_ago, 20) for days_ago in range(30)]
+    trend = series_of(rows).trend(TODAY, days=30, periods=3)
+    assert trend["current_total"] == 600
+    assert trend["usual_total"] == 300
+    assert trend["previous_totals"] == [300, 300, 300]
+    assert trend["percent_change"] == pytest.approx(100)
+    assert trend["current_daily_average"] == 20
+    assert trend["rolling_7d_average"] == pytest.approx(20)
+
+
+def test_trend_ignores_windows_before_the_first_expense():
+    # 41 flat days: only the current window is fully covered
+    trend = series_of([row(days_ago, 10) for days_ago in range(41)]).trend(TODAY, days=30, periods=3)
+    assert trend["current_total"] == 300
+    assert trend["usual_total"] is None
+    assert trend["percent_change"] is None
+    assert trend["previous_totals"] == []
+
+
+def test_trend_ignores_windows_before_the_loaded_history():
+    rows = [row(days_ago, 10) for days_ago in range(120)]
+    history_start = day_index(TODAY) - 70
+    trend = series_of(rows, history_start=history_start).trend(TODAY, days=30, periods=3)
+    assert trend["previous_totals"] == [300]
+
+
+def test_trend_by_category():
+    rows = [row(days_ago, 10) for days_ago in range(60)] + [row(days_ago, 5, "Transportation") for days_ago in range(60)]
+    trend = series_of(rows).trend(TODAY, category="transportation", days=30, periods=1)
+    assert trend["current_total"] == 150
+    assert trend["usual_total"] == 150
+
+
+def test_trend_without_history():
+    assert series_of([]).trend(TODAY) is None
+
+
+def test_percentiles():
+    rows = [row(days_ago % 60, float(amount)) for days_ago, amount in enumerate(range(1, 101))]
+    rows.append(row(200, 1000.0))  # outside the window
+    result = series_of(rows).percentiles(TODAY, days=90)
+    assert result["count"] == 100
+    assert result["median"] == pytest.approx(50.5)
+    assert result["p90"] == pytest.approx(90.1)
+    assert result["max"] == 100
+
+
+def test_percentiles_of_an_unknown_category():
+    assert series_of([row(1, 10)]).percentiles(TODAY, category="Housing") is None
+
+
+def test_outliers():
+    rows = [row(days_ago, amount) for days_ago, amount in zip(range(40, 10, -5), [10, 11, 12, 10, 11, 12])]
+    rows.append(row(2, 200, description="Wedding dinner"))
+    rows += [row(3, 500, "Housing", "Rent")]  # too little history to score
+    outliers = series_of(rows).outliers(TODAY, days=30)
+    assert [(item["description"], item["amount"], item["category"]) for item in outliers] == [
+        ("Wedding dinner", 200, "Food")
+    ]
+    assert outliers[0]["median"] == 11
+    assert outliers[0]["date"] == TODAY - timedelta(days=2)
+
+
+def test_outliers_outside_the_window_are_not_reported():
+    rows = [row(days_ago, 10 + days_ago % 3) for days_ago in range(5, 15)] + [row(60, 300)]
+    assert series_of(rows).outliers(TODAY, days=30) == []
+
+
+def test_outliers_with_mostly_equal_amounts():
+    rows = [row(days_ago, 10) for days_ago in range(5, 15)] + [row(1, 50)]
+    assert [item["amount"] for item in series_of(rows).outliers(TODAY, days=30)] == [50]
+
+
+def test_append_only_applies_to_the_next_version():
+    series = series_of([row(5, 10)])
+    assert series.append(2, row(0, 20)[0], 20, "Food", "Dinner")
+    assert not series.append(2, row(0, 30)[0], 30, "Food", "Dinner")
+    assert not series.append(4, row(0, 30)[0], 30, "Food", "Dinner")
+    assert series.size == 2
+    assert series.version == 2
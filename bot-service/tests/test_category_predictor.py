@@ -0,0 +1,121 @@
+import threading
+import pytest
+from src.category_predictor import CategoryPredictor, detect_language, tokenize
+
+
+HISTORY = [
+    ("Uber to airport", "Transportation"),
+    ("Uber", "Transportation"),
+    ("Uber home", "Transportation"),
+    ("Netflix", "Entertainment"),
+    ("Netflix", "Entertainment"),
+    ("Pizza", "Food"),
+    ("Pizza", "Food"),
+    ("Pizza night", "Food"),
+]
+
+
+class FakeDatabase:
+    """get_category_history returns newest first, like Database."""
+
+    def __init__(self, history, loaded=None, release=None):
+        self.history = history
+        self.loads = 0
+        self.loaded = loaded
+        self.release = release
+
+    def get_category_history(self, user_id, limit):
+        self.loads += 1
+        if self.loaded:
+            self.loaded.set()
+            self.release.wait(5)
+        return list(reversed(self.history))[:limit]
+
+
+@pytest.fixture
+def predictor():
+    return CategoryPredictor(FakeDatabase(HISTORY))
+
+
+def test_tokenize_drops_stopwords_numbers_and_currency():
+    assert tokenize("Paid the Uber to airport 15 dollars") == ["uber", "airport", "uber airport"]
+
+
+def test_predict(predictor):
+    prediction = predictor.predict(1, "uber to the office")
+    assert prediction.category == "Transportation"
+    assert prediction.confidence == 1.0
+    assert prediction.support == 3
+    assert prediction.coverage == 0.5
+    assert predictor.predict(1, "groceries") is None
+
+
+@pytest.mark.parametrize("message, description, amount, category", [
+    ("Uber 15", "Uber", 15.0, "Transportation"),
+    ("Uber to airport 23.40", "Uber to airport", 23.4, "Transportation"),
+    ("pizza 20 bucks", "Pizza", 20.0, "Food"),
+    ("$15 pizza", "Pizza", 15.0, "Food"),
+    ("Netflix 2024.50", "Netflix", 2024.5, "Entertainment"),
+])
+def test_quick_parse(predictor, message, description, amount, category):
+    quick = predictor.quick_parse(1, message)
+    assert quick is not None
+    assert (quick.description, quick.amount, quick.category) == (description, amount, category)
+
+
+@pytest.mark.parametrize("message", [
+    "Netflix 2024",  # a year
+    "pizza for 2",  # description ends in a stopword
+    "uber 7 days",  # a count
+    "pizza x 2",
+    "Netflix refund 15",  # not money spent
+    "15 pizza",  # unmarked amount before the description
+    "Uber to mall 12",  # "mall" was never used
+    "Uber 15 and pizza 10",  # two amounts
+    "Uber 0",
+    "How much was the Uber 15?",
+    "Groceries 30",
+])
+def test_quick_parse_leaves_ambiguous_messages_to_the_llm(predictor, message):
+    assert predictor.quick_parse(1, message) is None
+
+
+def test_quick_parse_needs_support():
+    predictor = CategoryPredictor(FakeDatabase([("Uber", "Transportation")]))
+    assert predictor.quick_parse(1, "Uber 15") is None
+
+
+def test_quick_parse_confirmation_language(predictor):
+    assert predictor.quick_parse(1, "Pizza 12,50 dólares").confirmation_message == "Gasto de comida agregado ✅"
+    assert predictor.quick_parse(1, "Pizza 12.50").confirmation_message == "Food expense added ✅"
+
+
+def test_detect_language():
+    assert detect_language("Pagué el alquiler") == "es"
+    assert detect_language("¿Cuánto?") == "es"
+    assert detect_language("Paid the rent") == "en"
+
+
+def test_learn_updates_a_loaded_index(predictor):
+    predictor.predict(1, "uber")
+    predictor.learn(1, "Spotify", "Entertainment")
+    assert predictor.predict(1, "spotify").category == "Entertainment"
+
+
+def test_learn_during_load_is_kept():
+    loaded, release = threading.Event(), threading.Event()
+    database = FakeDatabase(HISTORY, loaded, release)
+    predictor = CategoryPredictor(database)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(predictor.predict(1, "uber"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert loaded.wait(5)
+    predictor.learn(1, "Spotify", "Entertainment")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert database.loads == 1
+    assert [result.category for result in results] == ["Transportation"] * 3
+    assert predictor.predict(1, "spotify").category == "Entertainment"
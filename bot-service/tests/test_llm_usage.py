@@ -0,0 +1,66 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from src.llm_usage import UserTokenUsage, token_usage
+
+
+def test_user_token_usage_totals():
+    usage = UserTokenUsage(capacity=3)
+    usage.add(1, 100, 20)
+    usage.add(1, 50, 10)
+    usage.add(2, 10, 5)
+    assert usage.top() == [
+        {"user_id": 1, "tokens": 180, "prompt_tokens": 150, "completion_tokens": 30, "error": 0},
+        {"user_id": 2, "tokens": 15, "prompt_tokens": 10, "completion_tokens": 5, "error": 0},
+    ]
+
+
+def test_user_token_usage_evicts_the_lightest_user():
+    usage = UserTokenUsage(capacity=2)
+    usage.add(1, 100, 0)
+    usage.add(2, 10, 0)
+    usage.add(3, 5, 0)
+
+    top = {entry["user_id"]: entry for entry in usage.top()}
+    assert set(top) == {1, 3}
+    # The new user inherits the evicted total as its overcount bound
+    assert top[3]["tokens"] == 15
+    assert top[3]["error"] == 10
+    assert top[3]["prompt_tokens"] == 5
+
+
+def test_user_token_usage_keeps_heavy_hitters():
+    usage = UserTokenUsage(capacity=5)
+    for user_id in range(100, 200):
+        usage.add(user_id, 1, 0)
+        usage.add(1, 10, 0)
+        usage.add(2, 5, 0)
+    assert [entry["user_id"] for entry in usage.top(2)] == [1, 2]
+    assert len(usage.top()) == 5
+
+
+def test_user_token_usage_disabled():
+    usage = UserTokenUsage(capacity=0)
+    usage.add(1, 100, 0)
+    assert usage.top() == []
+
+
+def test_token_usage_reported():
+    response = LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="hi"))]],
+        llm_output={"token_usage": {
+            "prompt_tokens": 30, "completion_tokens": 5, "total_tokens": 35,
+            "prompt_tokens_details": {"cached_tokens": 20},
+        }},
+    )
+    assert token_usage(response) == {
+        "prompt_tokens": 30, "completion_tokens": 5, "total_tokens": 35, "cached_tokens": 20, "estimated": False,
+    }
+
+
+def test_token_usage_counted_when_not_reported():
+    response = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="You spent $20 on food."))]])
+    usage = token_usage(response, [HumanMessage(content="How much did I spend on food?")])
+    assert usage["estimated"] is True
+    assert usage["prompt_tokens"] > 0
+    assert usage["completion_tokens"] > 0
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
@@ -0,0 +1,75 @@
+import pytest
+from src.query_intents import QueryIntentMatcher
+
+
+@pytest.fixture
+def matcher():
+    return QueryIntentMatcher()
+
+
+@pytest.mark.parametrize("message, language, category, days", [
+    ("How much did I spend on food this week?", "en", "Food", 7),
+    ("how much did i spend", "en", None, 30),
+    ("What's my total for transport?", "en", "Transportation", 30),
+    ("How much did I spend on food in the last 2 weeks?", "en", "Food", 14),
+    ("How much did I spend last week?", "en", None, 7),
+    ("How much did I spend over the past month?", "en", None, 30),
+    ("¿Cuánto gasté en comida este mes?", "es", "Food", 30),
+    ("¿Cuánto gasté en comida en los últimos 15 días?", "es", "Food", 15),
+    ("¿Cuánto gasté la semana pasada?", "es", None, 7),
+    ("cuanto gaste en comida la ultima semana", "es", "Food", 7),
+])
+def test_total(matcher, message, language, category, days):
+    intent = matcher.match(message)
+    assert intent is not None
+    assert (intent.kind, intent.language, intent.category, intent.days) == ("total", language, category, days)
+
+
+@pytest.mark.parametrize("message, language, days", [
+    ("Show me my spending breakdown", "en", 30),
+    ("breakdown last week", "en", 7),
+    ("Desglose por categoría este mes", "es", 30),
+    ("gastos por categoria", "es", 30),
+])
+def test_breakdown(matcher, message, language, days):
+    intent = matcher.match(message)
+    assert intent is not None
+    assert (intent.kind, intent.language, intent.days) == ("breakdown", language, days)
+
+
+@pytest.mark.parametrize("message, language, limit", [
+    ("What are my last 5 expenses?", "en", 5),
+    ("show my recent expenses", "en", 10),
+    ("my last 500 purchases", "en", 50),
+    ("Últimos 5 gastos", "es", 5),
+    ("mis gastos recientes", "es", 10),
+])
+def test_recent(matcher, message, language, limit):
+    intent = matcher.match(message)
+    assert intent is not None
+    assert (intent.kind, intent.language, intent.limit) == ("recent", language, limit)
+
+
+@pytest.mark.parametrize("message, language, period, offset", [
+    ("This month's summary", "en", "month", 0),
+    ("last week summary", "en", "week", 1),
+    ("Give me the report for the previous month", "en", "month", 1),
+    ("Resumen de la semana pasada", "es", "week", 1),
+    ("resumen mensual", "es", "month", 0),
+])
+def test_summary(matcher, message, language, period, offset):
+    intent = matcher.match(message)
+    assert intent is not None
+    assert (intent.kind, intent.language, intent.period, intent.offset) == ("summary", language, period, offset)
+
+
+@pytest.mark.parametrize("message", [
+    "How much did I spend on pizza?",  # a keyword, not a category
+    "Am I spending more on food than usual?",
+    "show my expenses from last week",  # recent expenses are not time-bounded
+    "Pizza 20 bucks",
+    "hola",
+    "",
+])
+def test_left_to_the_agent(matcher, message):
+    assert matcher.match(message) is None
@@ -0,0 +1,73 @@
+from datetime import date
+from decimal import Decimal
+import pytest
+from src.reports import period_start, render_report
+
+
+@pytest.mark.parametrize("period, day, offset, expected", [
+    ("week", date(2026, 10, 19), 0, date(2026, 10, 19)),  # a Monday
+    ("week", date(2026, 10, 25), 0, date(2026, 10, 19)),  # a Sunday
+    ("week", date(2026, 10, 22), 1, date(2026, 10, 12)),
+    ("week", date(2026, 1, 1), 0, date(2025, 12, 29)),
+    ("month", date(2026, 10, 19), 0, date(2026, 10, 1)),
+    ("month", date(2026, 10, 19), 1, date(2026, 9, 1)),
+    ("month", date(2026, 1, 31), 1, date(2025, 12, 1)),
+    ("month", date(2026, 3, 15), 14, date(2025, 1, 1)),
+])
+def test_period_start(period, day, offset, expected):
+    assert period_start(period, day, offset) == expected
+
+
+REPORT = {
+    "period_start": date(2026, 9, 1),
+    "period_end": date(2026, 9, 30),
+    "total": Decimal("150.00"),
+    "expense_count": 3,
+    "previous_total": Decimal("100.00"),
+    "categories": [
+        {"category": "Food", "total": 100, "count": 2},
+        {"category": "Transportation", "total": 50, "count": 1},
+    ],
+    "top_items": [
+        {"description": "Dinner", "amount": 80, "category": "Food"},
+        {"description": "Uber", "amount": 50, "category": "Transportation"},
+    ],
+}
+
+
+def test_render_report_english():
+    assert render_report(REPORT, "month", offset=1) == "\n".join([
+        "Spending report for last month (2026-09-01 to 2026-09-30):\n",
+        "Total: $150.00 (3 expenses)",
+        "up $50.00 from the previous month (+50%)",
+        "\nBy category:",
+        "- Food: $100.00 (2)",
+        "- Transportation: $50.00 (1)",
+        "\nTop expenses:",
+        "- Dinner: $80.00 (Food)",
+        "- Uber: $50.00 (Transportation)",
+    ])
+
+
+def test_render_report_spanish():
+    text = render_report({**REPORT, "previous_total": Decimal("200")}, "month", language="es", offset=0)
+    assert text.startswith("Reporte de gastos de este mes (2026-09-01 a 2026-09-30):\n")
+    assert "$50.00 menos que el mes anterior (-25%)" in text
+    assert "- Comida: $100.00 (2)" in text
+    assert "- Uber: $50.00 (transporte)" in text
+
+
+def test_render_report_spanish_contracts_del():
+    text = render_report(REPORT, "month", language="es", offset=1)
+    assert text.startswith("Reporte de gastos del mes pasado")
+
+
+def test_render_report_without_previous_total():
+    text = render_report({**REPORT, "previous_total": 0}, "week")
+    assert "from the" not in text
+
+
+@pytest.mark.parametrize("report", [None, {**REPORT, "expense_count": 0}])
+def test_render_empty_report(report):
+    assert render_report(report, "week") == "No expenses found this week."
+    assert render_report(report, "week", language="es", offset=1) == "No se encontraron gastos en la semana pasada."
@@ -0,0 +1,79 @@
+from collections import Counter
+import pytest
+from src.sharding import ConsistentHashRing, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("src.sharding.time.monotonic", clock)
+    return clock
+
+
+def test_ring_is_deterministic():
+    assert [ConsistentHashRing([0, 1, 2]).shard_for(user_id) for user_id in range(100)] == \
+        [ConsistentHashRing([0, 1, 2]).shard_for(user_id) for user_id in range(100)]
+
+
+def test_ring_spreads_users():
+    counts = Counter(ConsistentHashRing([0, 1, 2]).shard_for(user_id) for user_id in range(3000))
+    assert set(counts) == {0, 1, 2}
+    assert min(counts.values()) > 600
+
+
+def test_ring_moves_only_users_of_the_new_shard():
+    before = ConsistentHashRing([0, 1, 2])
+    after = ConsistentHashRing([0, 1, 2, 3])
+    moved = [user_id for user_id in range(3000) if before.shard_for(user_id) != after.shard_for(user_id)]
+    assert all(after.shard_for(user_id) == 3 for user_id in moved)
+    assert 400 < len(moved) < 1200
+
+
+def test_single_shard_ring():
+    ring = ConsistentHashRing([5])
+    assert {ring.shard_for(user_id) for user_id in range(50)} == {5}
+
+
+def test_ttl_cache_expires(clock):
+    cache = TTLCache(10)
+    cache.set("a", 1)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.get("a", "missing") == "missing"
+
+
+def test_ttl_cache_per_entry_ttl(clock):
+    cache = TTLCache(10)
+    cache.set("short", 1, ttl_seconds=1)
+    cache.set("long", 2)
+    clock.now += 5
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_ttl_cache_keeps_falsy_values(clock):
+    cache = TTLCache(10)
+    cache.set("zero", 0)
+    assert cache.get("zero", "missing") == 0
+
+
+def test_ttl_cache_delete_and_clear(clock):
+    cache = TTLCache(10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    cache.delete("unknown")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.clear()
+    assert cache.get("b") is None
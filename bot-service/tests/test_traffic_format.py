@@ -0,0 +1,59 @@
+import pytest
+from src.traffic_format import llm_call_key, pseudonym, scrub
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("mail me at ana.perez+bot@example.com", "mail me at <email>"),
+    ("see https://example.com/a?b=1 now", "see <url> now"),
+    ("ask @ana_perez", "ask <handle>"),
+    ("call +54 11 4123-4567", "call <phone>"),
+    ("card 4111 1111 1111 1111", "card <card>"),
+    ("Pagué 15 con DNI 30.123.456", "Pagué 15 con DNI <id>"),
+    ("dni 1.234.567.", "dni <id>."),
+    ("Pizza 20 bucks", "Pizza 20 bucks"),
+    ("pagué 1.500 pesos", "pagué 1.500 pesos"),
+    ("Uber 15.50 on 2024-05-01", "Uber 15.50 on 2024-05-01"),
+])
+def test_scrub(text, expected):
+    assert scrub(text) == expected
+
+
+def test_scrub_is_idempotent():
+    text = "DNI 30.123.456, +54 11 4123-4567, ana@example.com"
+    assert scrub(scrub(text)) == scrub(text)
+
+
+@pytest.mark.parametrize("text", [None, ""])
+def test_scrub_empty(text):
+    assert scrub(text) == text
+
+
+def test_pseudonym():
+    assert pseudonym("123456789", "salt") == pseudonym("123456789", "salt")
+    assert pseudonym("123456789", "salt") != pseudonym("123456789", "other")
+    assert pseudonym("123456789", "salt").startswith("u-")
+
+
+def test_pseudonym_needs_a_salt():
+    with pytest.raises(ValueError):
+        pseudonym("123456789", "")
+
+
+def test_llm_call_key_ignores_per_request_data():
+    first = [("system", "Classify"), ("user", "Pizza 20"), ("assistant", "..."), ("function", "snapshot A")]
+    second = [("system", "Classify"), ("user", "Pizza 20"), ("assistant", "..."), ("function", "snapshot B")]
+    assert llm_call_key(first) == llm_call_key(second)
+
+
+def test_llm_call_key_depends_on_prompt_message_and_turn():
+    base = [("system", "Classify"), ("user", "Pizza 20")]
+    key = llm_call_key(base)
+    assert llm_call_key([("system", "Extract"), ("user", "Pizza 20")]) != key
+    assert llm_call_key([("system", "Classify"), ("user", "Pizza 25")]) != key
+    assert llm_call_key(base + [("assistant", "tool call"), ("tool", "result")]) != key
+
+
+def test_llm_call_key_matches_scrubbed_messages():
+    raw = [("system", "Classify"), ("user", "write to ana@example.com")]
+    captured = [("system", "Classify"), ("user", "write to <email>")]
+    assert llm_call_key(raw) == llm_call_key(captured)
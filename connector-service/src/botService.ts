@@ -2,6 +2,17 @@ import axios, { AxiosError } from 'axios';
 import { config } from './config.js';
 import type { MessageRequest, MessageResponse } from './types.js';
 
+const REQUEST_TIMEOUT_MS = 30000;
+// Budget sent to the Bot Service, so it gives up before we do
+const DEADLINE_MARGIN_MS = 2000;
+
+// Replies for requests the Bot Service sheds under load
+const SHED_MESSAGES: Record<number, string> = {
+  429: "You're sending messages too fast. Please wait a few seconds and try again.",
+  503: "I'm a bit busy right now. Please try again in a moment.",
+  504: 'That took longer than expected. Please try again in a moment.',
+};
+
 /**
  * Send a message to the Bot Service for processing
  */
@@ -25,8 +36,9 @@ export async function processMessage(
       {
         headers: {
           'Content-Type': 'application/json',
+          'X-Request-Timeout-Ms': String(REQUEST_TIMEOUT_MS - DEADLINE_MARGIN_MS),
         },
-        timeout: 30000, // 30 seconds timeout
+        timeout: REQUEST_TIMEOUT_MS,
       }
     );
 
@@ -44,6 +56,15 @@ export async function processMessage(
           message: 'User not authorized',
         };
       }
+
+      // Rate limited, overloaded or past the deadline: reply instead of failing silently
+      if (status && SHED_MESSAGES[status]) {
+        console.log(`[BOT_SERVICE] Request from ${telegramId} shed (${status}, retry after ${error.response?.headers['retry-after'] ?? '-'}s)`);
+        return {
+          success: false,
+          message: SHED_MESSAGES[status],
+        };
+      }
       
       // Unexpected errors
       console.error('[BOT_SERVICE] Error communicating with Bot Service:');
@@ -10,20 +10,199 @@ CREATE TABLE users (
   "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Tabla de gastos
+-- Directorio de shards: en qué base de datos viven los gastos de cada usuario
+-- (sólo se usa cuando DATABASE_SHARD_URLS está configurado)
+CREATE TABLE user_shards (
+  "user_id" INTEGER PRIMARY KEY REFERENCES users("id") ON DELETE CASCADE,
+  "shard_id" INTEGER NOT NULL,
+  "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_user_shards_shard_id ON user_shards("shard_id");
+
+-- Cola de mensajes entrantes (INBOUND_QUEUE_ENABLED): cada mensaje se guarda antes de
+-- procesarlo; los que no se pudieron procesar (LLM caído, sobrecarga) se reintentan
+-- en segundo plano con SELECT ... FOR UPDATE SKIP LOCKED.
+CREATE TABLE inbound_messages (
+  "id" BIGSERIAL PRIMARY KEY,
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "telegram_id" TEXT NOT NULL,
+  "message" TEXT NOT NULL,
+  "status" TEXT NOT NULL DEFAULT 'pending' CHECK ("status" IN ('pending', 'processing', 'done', 'failed')),
+  "attempts" INTEGER NOT NULL DEFAULT 0,
+  "available_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "locked_until" TIMESTAMP,
+  "last_error" TEXT,
+  "response" TEXT,
+  "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "processed_at" TIMESTAMP
+);
+CREATE INDEX idx_inbound_messages_due ON inbound_messages("available_at")
+  WHERE "status" IN ('pending', 'processing');
+
+-- Caché compartida de respuestas a consultas (ANSWER_CACHE_SHARED): clave
+-- (usuario, pregunta normalizada, versión de datos, día). Al guardar una respuesta
+-- se borran las del mismo usuario con versión o día anteriores.
+CREATE TABLE answer_cache (
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "question" TEXT NOT NULL,
+  "data_version" BIGINT NOT NULL,
+  "bucket" DATE NOT NULL,
+  "answer" TEXT NOT NULL,
+  "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY ("user_id", "question", "data_version", "bucket")
+);
+
+-- Tabla de gastos, particionada por mes sobre added_at
+-- (las consultas de los últimos N días sólo tocan una o dos particiones)
 CREATE TABLE expenses (
-  "id" SERIAL PRIMARY KEY,
+  "id" SERIAL,
   "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
   "description" TEXT NOT NULL,
   "amount" MONEY NOT NULL,
   "category" TEXT NOT NULL,
-  "added_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+  "added_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY ("id", "added_at")
+) PARTITION BY RANGE ("added_at");
+
+-- Partición por defecto: recibe filas fuera de las particiones mensuales
+CREATE TABLE expenses_default PARTITION OF expenses DEFAULT;
 
--- Índices para mejorar rendimiento
-CREATE INDEX idx_expenses_user_id ON expenses("user_id");
-CREATE INDEX idx_expenses_added_at ON expenses("added_at");
+-- Archivo: particiones viejas desacopladas de expenses, consultables bajo demanda
+CREATE TABLE expenses_archive (LIKE expenses INCLUDING DEFAULTS)
+  PARTITION BY RANGE ("added_at");
+ALTER TABLE expenses_archive ADD PRIMARY KEY ("id", "added_at");
+
+-- Índices para mejorar rendimiento (se propagan a cada partición)
+CREATE INDEX idx_expenses_user_added_at ON expenses("user_id", "added_at");
 CREATE INDEX idx_expenses_category ON expenses("category");
+CREATE INDEX idx_expenses_archive_user_added_at ON expenses_archive("user_id", "added_at");
+
+-- Crea la partición mensual que contiene p_month (si no existe).
+-- Las filas de ese mes que hayan caído en expenses_default se mueven a la nueva partición.
+CREATE OR REPLACE FUNCTION create_expense_partition(p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+  start_ts TIMESTAMP := date_trunc('month', p_month);
+  end_ts TIMESTAMP := date_trunc('month', p_month) + INTERVAL '1 month';
+  part_name TEXT := format('expenses_%s', to_char(p_month, 'YYYY_MM'));
+BEGIN
+  IF to_regclass(part_name) IS NOT NULL THEN
+    RETURN FALSE;
+  END IF;
+
+  EXECUTE format('CREATE TABLE %I (LIKE expenses INCLUDING DEFAULTS)', part_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM expenses_default WHERE added_at >= %L AND added_at < %L RETURNING *)
+     INSERT INTO %I SELECT * FROM moved',
+    start_ts, end_ts, part_name
+  );
+  EXECUTE format(
+    'ALTER TABLE expenses ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+    part_name, start_ts, end_ts
+  );
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Asegura particiones desde el mes actual hasta p_months_ahead meses adelante.
+-- Devuelve la cantidad de particiones creadas.
+CREATE OR REPLACE FUNCTION ensure_expense_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start DATE;
+  created INTEGER := 0;
+BEGIN
+  FOR month_start IN
+    SELECT generate_series(
+      date_trunc('month', LOCALTIMESTAMP),
+      date_trunc('month', LOCALTIMESTAMP) + make_interval(months => p_months_ahead),
+      INTERVAL '1 month'
+    )::DATE
+  LOOP
+    IF create_expense_partition(month_start) THEN
+      created := created + 1;
+    END IF;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mueve a expenses_archive las particiones mensuales que terminan antes de
+-- (mes actual - p_keep_months). Devuelve los nombres de las particiones archivadas.
+CREATE OR REPLACE FUNCTION archive_expense_partitions(p_keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+  cutoff TIMESTAMP := date_trunc('month', LOCALTIMESTAMP) - make_interval(months => p_keep_months);
+  part RECORD;
+  start_ts TIMESTAMP;
+BEGIN
+  FOR part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'expenses'::regclass
+      AND c.relname ~ '^expenses_[0-9]{4}_[0-9]{2}$'
+    ORDER BY c.relname
+  LOOP
+    start_ts := to_date(substr(part.relname, 10), 'YYYY_MM')::TIMESTAMP;
+    CONTINUE WHEN start_ts + INTERVAL '1 month' > cutoff;
+
+    EXECUTE format('ALTER TABLE expenses DETACH PARTITION %I', part.relname);
+    EXECUTE format(
+      'ALTER TABLE expenses_archive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+      part.relname, start_ts, start_ts + INTERVAL '1 month'
+    );
+    RETURN NEXT part.relname;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reportes semanales/mensuales precalculados por usuario (bot-service/src/reports.py).
+-- period_end es el último día del período; previous_total es el total del período anterior.
+CREATE TABLE spending_reports (
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "period" TEXT NOT NULL CHECK ("period" IN ('week', 'month')),
+  "period_start" DATE NOT NULL,
+  "period_end" DATE NOT NULL,
+  "total" NUMERIC(12, 2) NOT NULL,
+  "expense_count" INTEGER NOT NULL,
+  "previous_total" NUMERIC(12, 2) NOT NULL,
+  "categories" JSONB NOT NULL,
+  "top_items" JSONB NOT NULL,
+  "generated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "sent_at" TIMESTAMP,
+  PRIMARY KEY ("user_id", "period", "period_start")
+);
+CREATE INDEX idx_spending_reports_period ON spending_reports("period", "period_start");
+
+-- Último período cuyos reportes se enviaron por Telegram (REPORT_PUSH_ENABLED), uno
+-- por tipo de período: un reinicio a mitad de período no vuelve a enviarlos.
+CREATE TABLE report_pushes (
+  "period" TEXT PRIMARY KEY CHECK ("period" IN ('week', 'month')),
+  "period_start" DATE NOT NULL,
+  "pushed_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Versión de los datos de cada usuario: se incrementa en la misma transacción que
+-- cada gasto agregado. La caché de respuestas (bot-service/src/answer_cache.py) la
+-- usa en sus claves, así una respuesta cacheada nunca sobrevive a un gasto nuevo.
+CREATE TABLE user_data_versions (
+  "user_id" INTEGER PRIMARY KEY REFERENCES users("id") ON DELETE CASCADE,
+  "version" BIGINT NOT NULL DEFAULT 0,
+  "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Usuarios que se mudaron de este shard (scripts/shards.py move/rebalance). Los
+-- workers con el directorio cacheado todavía pueden escribir aquí: add_expense toma
+-- el lock de mudanza del usuario y, si encuentra la fila, escribe en shard_id.
+CREATE TABLE moved_users (
+  "user_id" INTEGER PRIMARY KEY,
+  "shard_id" INTEGER NOT NULL,
+  "moved_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Particiones iniciales
+SELECT ensure_expense_partitions(3);
 
 -- Insertar usuarios de prueba (whitelist)
 INSERT INTO users (telegram_id, username) VALUES 
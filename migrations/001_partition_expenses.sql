@@ -0,0 +1,140 @@
+-- migrations/001_partition_expenses.sql
+-- Convierte una tabla expenses existente (no particionada) en la tabla
+-- particionada por mes de init.sql, conservando ids y la secuencia.
+--
+-- Uso: psql -d expense_tracker -f migrations/001_partition_expenses.sql
+-- Se ejecuta en una sola transacción: bloquea expenses mientras copia los datos.
+
+BEGIN;
+
+LOCK TABLE expenses IN ACCESS EXCLUSIVE MODE;
+
+-- Renombrar la tabla vieja y los objetos cuyos nombres se reutilizan
+ALTER TABLE expenses RENAME TO expenses_legacy;
+ALTER TABLE expenses_legacy RENAME CONSTRAINT expenses_pkey TO expenses_legacy_pkey;
+ALTER TABLE expenses_legacy RENAME CONSTRAINT expenses_user_id_fkey TO expenses_legacy_user_id_fkey;
+DROP INDEX IF EXISTS idx_expenses_user_id;
+DROP INDEX IF EXISTS idx_expenses_added_at;
+DROP INDEX IF EXISTS idx_expenses_category;
+
+-- Tabla de gastos particionada (misma definición que init.sql, reutilizando la secuencia)
+CREATE TABLE expenses (
+  "id" INTEGER NOT NULL DEFAULT nextval('expenses_id_seq'),
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "description" TEXT NOT NULL,
+  "amount" MONEY NOT NULL,
+  "category" TEXT NOT NULL,
+  "added_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY ("id", "added_at")
+) PARTITION BY RANGE ("added_at");
+ALTER SEQUENCE expenses_id_seq OWNED BY expenses."id";
+
+CREATE TABLE expenses_default PARTITION OF expenses DEFAULT;
+
+CREATE TABLE expenses_archive (LIKE expenses INCLUDING DEFAULTS)
+  PARTITION BY RANGE ("added_at");
+ALTER TABLE expenses_archive ADD PRIMARY KEY ("id", "added_at");
+
+CREATE INDEX idx_expenses_user_added_at ON expenses("user_id", "added_at");
+CREATE INDEX idx_expenses_category ON expenses("category");
+CREATE INDEX idx_expenses_archive_user_added_at ON expenses_archive("user_id", "added_at");
+
+-- Crea la partición mensual que contiene p_month (si no existe).
+-- Las filas de ese mes que hayan caído en expenses_default se mueven a la nueva partición.
+CREATE OR REPLACE FUNCTION create_expense_partition(p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+  start_ts TIMESTAMP := date_trunc('month', p_month);
+  end_ts TIMESTAMP := date_trunc('month', p_month) + INTERVAL '1 month';
+  part_name TEXT := format('expenses_%s', to_char(p_month, 'YYYY_MM'));
+BEGIN
+  IF to_regclass(part_name) IS NOT NULL THEN
+    RETURN FALSE;
+  END IF;
+
+  EXECUTE format('CREATE TABLE %I (LIKE expenses INCLUDING DEFAULTS)', part_name);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM expenses_default WHERE added_at >= %L AND added_at < %L RETURNING *)
+     INSERT INTO %I SELECT * FROM moved',
+    start_ts, end_ts, part_name
+  );
+  EXECUTE format(
+    'ALTER TABLE expenses ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+    part_name, start_ts, end_ts
+  );
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Asegura particiones desde el mes actual hasta p_months_ahead meses adelante.
+-- Devuelve la cantidad de particiones creadas.
+CREATE OR REPLACE FUNCTION ensure_expense_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+  month_start DATE;
+  created INTEGER := 0;
+BEGIN
+  FOR month_start IN
+    SELECT generate_series(
+      date_trunc('month', LOCALTIMESTAMP),
+      date_trunc('month', LOCALTIMESTAMP) + make_interval(months => p_months_ahead),
+      INTERVAL '1 month'
+    )::DATE
+  LOOP
+    IF create_expense_partition(month_start) THEN
+      created := created + 1;
+    END IF;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mueve a expenses_archive las particiones mensuales que terminan antes de
+-- (mes actual - p_keep_months). Devuelve los nombres de las particiones archivadas.
+CREATE OR REPLACE FUNCTION archive_expense_partitions(p_keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+  cutoff TIMESTAMP := date_trunc('month', LOCALTIMESTAMP) - make_interval(months => p_keep_months);
+  part RECORD;
+  start_ts TIMESTAMP;
+BEGIN
+  FOR part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'expenses'::regclass
+      AND c.relname ~ '^expenses_[0-9]{4}_[0-9]{2}$'
+    ORDER BY c.relname
+  LOOP
+    start_ts := to_date(substr(part.relname, 10), 'YYYY_MM')::TIMESTAMP;
+    CONTINUE WHEN start_ts + INTERVAL '1 month' > cutoff;
+
+    EXECUTE format('ALTER TABLE expenses DETACH PARTITION %I', part.relname);
+    EXECUTE format(
+      'ALTER TABLE expenses_archive ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+      part.relname, start_ts, start_ts + INTERVAL '1 month'
+    );
+    RETURN NEXT part.relname;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Particiones para todos los meses con datos, más los próximos meses
+SELECT COUNT(*) FILTER (WHERE create_expense_partition(month_start::DATE)) AS partitions_created
+FROM generate_series(
+  (SELECT date_trunc('month', MIN(added_at)) FROM expenses_legacy),
+  date_trunc('month', LOCALTIMESTAMP),
+  INTERVAL '1 month'
+) AS month_start;
+SELECT ensure_expense_partitions(3);
+
+-- Copiar los datos
+INSERT INTO expenses ("id", "user_id", "description", "amount", "category", "added_at")
+SELECT "id", "user_id", "description", "amount", "category", "added_at"
+FROM expenses_legacy;
+
+DROP TABLE expenses_legacy;
+
+COMMIT;
+
+ANALYZE expenses;
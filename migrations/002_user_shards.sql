@@ -0,0 +1,22 @@
+-- migrations/002_user_shards.sql
+-- Agrega el directorio de shards a una base principal existente.
+--
+-- Uso: psql -d expense_tracker -f migrations/002_user_shards.sql
+-- Los usuarios existentes se asignan al shard 0 (la base principal pasa a ser el
+-- primer shard: su URL debe ir primera en DATABASE_SHARD_URLS). Después se pueden
+-- redistribuir con: python -m scripts.shards rebalance
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_shards (
+  "user_id" INTEGER PRIMARY KEY REFERENCES users("id") ON DELETE CASCADE,
+  "shard_id" INTEGER NOT NULL,
+  "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_user_shards_shard_id ON user_shards("shard_id");
+
+INSERT INTO user_shards (user_id, shard_id)
+SELECT id, 0 FROM users
+ON CONFLICT (user_id) DO NOTHING;
+
+COMMIT;
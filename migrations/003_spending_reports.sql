@@ -0,0 +1,26 @@
+-- migrations/003_spending_reports.sql
+-- Agrega la tabla de reportes precalculados a una base existente.
+--
+-- Uso: psql -d expense_tracker -f migrations/003_spending_reports.sql
+-- Con sharding, correrla también en cada shard (ahí sin la FK a users, que vive
+-- en la base principal). Los reportes se generan al iniciar el bot-service.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS spending_reports (
+  "user_id" INTEGER NOT NULL,
+  "period" TEXT NOT NULL CHECK ("period" IN ('week', 'month')),
+  "period_start" DATE NOT NULL,
+  "period_end" DATE NOT NULL,
+  "total" NUMERIC(12, 2) NOT NULL,
+  "expense_count" INTEGER NOT NULL,
+  "previous_total" NUMERIC(12, 2) NOT NULL,
+  "categories" JSONB NOT NULL,
+  "top_items" JSONB NOT NULL,
+  "generated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "sent_at" TIMESTAMP,
+  PRIMARY KEY ("user_id", "period", "period_start")
+);
+CREATE INDEX IF NOT EXISTS idx_spending_reports_period ON spending_reports("period", "period_start");
+
+COMMIT;
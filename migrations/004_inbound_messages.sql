@@ -0,0 +1,28 @@
+-- migrations/004_inbound_messages.sql
+-- Agrega la cola de mensajes entrantes a una base principal existente.
+--
+-- Uso: psql -d expense_tracker -f migrations/004_inbound_messages.sql
+
+BEGIN;
+
+-- Cola de mensajes entrantes (INBOUND_QUEUE_ENABLED): cada mensaje se guarda antes de
+-- procesarlo; los que no se pudieron procesar (LLM caído, sobrecarga) se reintentan
+-- en segundo plano con SELECT ... FOR UPDATE SKIP LOCKED.
+CREATE TABLE IF NOT EXISTS inbound_messages (
+  "id" BIGSERIAL PRIMARY KEY,
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "telegram_id" TEXT NOT NULL,
+  "message" TEXT NOT NULL,
+  "status" TEXT NOT NULL DEFAULT 'pending' CHECK ("status" IN ('pending', 'processing', 'done', 'failed')),
+  "attempts" INTEGER NOT NULL DEFAULT 0,
+  "available_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "locked_until" TIMESTAMP,
+  "last_error" TEXT,
+  "response" TEXT,
+  "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "processed_at" TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_inbound_messages_due ON inbound_messages("available_at")
+  WHERE "status" IN ('pending', 'processing');
+
+COMMIT;
@@ -0,0 +1,34 @@
+-- migrations/005_answer_cache.sql
+-- Agrega las versiones de datos por usuario y la caché compartida de respuestas
+-- a una base principal existente.
+--
+-- Uso: psql -d expense_tracker -f migrations/005_answer_cache.sql
+-- Con sharding, crear también user_data_versions en cada shard (sin la FK a users,
+-- que vive en la base principal); answer_cache sólo va en la base principal.
+-- Los usuarios sin fila tienen versión 0.
+
+BEGIN;
+
+-- Versión de los datos de cada usuario: se incrementa en la misma transacción que
+-- cada gasto agregado. La caché de respuestas (bot-service/src/answer_cache.py) la
+-- usa en sus claves, así una respuesta cacheada nunca sobrevive a un gasto nuevo.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+  "user_id" INTEGER PRIMARY KEY REFERENCES users("id") ON DELETE CASCADE,
+  "version" BIGINT NOT NULL DEFAULT 0,
+  "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Caché compartida de respuestas a consultas (ANSWER_CACHE_SHARED): clave
+-- (usuario, pregunta normalizada, versión de datos, día). Al guardar una respuesta
+-- se borran las del mismo usuario con versión o día anteriores.
+CREATE TABLE IF NOT EXISTS answer_cache (
+  "user_id" INTEGER NOT NULL REFERENCES users("id") ON DELETE CASCADE,
+  "question" TEXT NOT NULL,
+  "data_version" BIGINT NOT NULL,
+  "bucket" DATE NOT NULL,
+  "answer" TEXT NOT NULL,
+  "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY ("user_id", "question", "data_version", "bucket")
+);
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- migrations/006_moved_users.sql
+-- Agrega la tabla de usuarios mudados a cada base que guarda gastos (la principal
+-- si es el shard 0 y cada shard), antes de mover usuarios con scripts/shards.py.
+--
+-- Uso: psql -d expense_shard_0 -f migrations/006_moved_users.sql
+
+BEGIN;
+
+-- Usuarios que se mudaron de este shard (scripts/shards.py move/rebalance). Los
+-- workers con el directorio cacheado todavía pueden escribir aquí: add_expense toma
+-- el lock de mudanza del usuario y, si encuentra la fila, escribe en shard_id.
+CREATE TABLE IF NOT EXISTS moved_users (
+  "user_id" INTEGER PRIMARY KEY,
+  "shard_id" INTEGER NOT NULL,
+  "moved_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- migrations/007_report_pushes.sql
+-- Agrega el registro de envíos de reportes a una base principal existente.
+--
+-- Uso: psql -d expense_tracker -f migrations/007_report_pushes.sql
+
+BEGIN;
+
+-- Último período cuyos reportes se enviaron por Telegram (REPORT_PUSH_ENABLED), uno
+-- por tipo de período: un reinicio a mitad de período no vuelve a enviarlos.
+CREATE TABLE IF NOT EXISTS report_pushes (
+  "period" TEXT PRIMARY KEY CHECK ("period" IN ('week', 'month')),
+  "period_start" DATE NOT NULL,
+  "pushed_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMIT;